@@ -0,0 +1,104 @@
+"""Loading of the annotator view data for a given file"""
+from django.db.models import Prefetch, Q, QuerySet
+
+from backend.api.models import (
+    AnnotationCampaignPhase,
+    AnnotationComment,
+    AnnotationResult,
+    AnnotationResultValidation,
+    AnnotationTask,
+    DatasetFile,
+    Phase,
+)
+from backend.aplose.models import User
+from backend.api.serializers import AnnotationResultSerializer
+from backend.api.serializers.annotation.comment import AnnotationCommentSerializer
+from backend.api.serializers.data.file import DatasetFileSerializer
+
+RESULT_RELATED = (
+    "label",
+    "confidence_indicator",
+    "detector_configuration",
+    "detector_configuration__detector",
+    "acoustic_features",
+)
+
+
+def get_annotator_results(
+    phase: AnnotationCampaignPhase, file_id: int, user: User
+) -> QuerySet[AnnotationResult]:
+    """Get the results the user works on for the file, with all serialized relations"""
+    results = AnnotationResult.objects.filter(
+        is_update_of__isnull=True,
+        dataset_file_id=file_id,
+    )
+    if phase.phase == Phase.VERIFICATION:
+        results = results.filter(
+            annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id
+        ).filter(
+            Q(annotator=user, annotation_campaign_phase__phase=Phase.VERIFICATION)
+            | (
+                ~Q(annotator=user)
+                & Q(annotation_campaign_phase__phase=Phase.ANNOTATION)
+            )
+        )
+    else:
+        results = results.filter(annotation_campaign_phase=phase, annotator=user)
+
+    return (
+        results.select_related(*RESULT_RELATED)
+        .prefetch_related(
+            "comments",
+            Prefetch(
+                "validations",
+                queryset=AnnotationResultValidation.objects.filter(
+                    annotator_id=user.id
+                ),
+            ),
+            Prefetch(
+                "updated_to",
+                queryset=AnnotationResult.objects.filter(annotator_id=user.id)
+                .select_related(*RESULT_RELATED)
+                .prefetch_related("comments", "validations", "updated_to"),
+            ),
+        )
+        .order_by("id")
+    )
+
+
+def load_annotator_file(
+    phase: AnnotationCampaignPhase,
+    file: DatasetFile,
+    user: User,
+    with_annotations: bool = True,
+) -> dict:
+    """Get the file, the user results and task comments and the submission state
+
+    It runs a fixed number of queries, whatever the number of results
+    """
+    results = []
+    task_comments = []
+    if with_annotations:
+        results = AnnotationResultSerializer(
+            get_annotator_results(phase, file.id, user), many=True
+        ).data
+        task_comments = AnnotationCommentSerializer(
+            AnnotationComment.objects.filter(
+                annotation_campaign_phase_id=phase.id,
+                dataset_file_id=file.id,
+                author_id=user.id,
+                annotation_result__isnull=True,
+            ).order_by("id"),
+            many=True,
+        ).data
+    return {
+        "file": DatasetFileSerializer(file).data,
+        "results": results,
+        "task_comments": task_comments,
+        "is_submitted": AnnotationTask.objects.filter(
+            annotation_campaign_phase_id=phase.id,
+            dataset_file_id=file.id,
+            annotator_id=user.id,
+            status=AnnotationTask.Status.FINISHED,
+        ).exists(),
+    }
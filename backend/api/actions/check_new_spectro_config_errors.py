@@ -1,8 +1,7 @@
 """Check for new spectro configs on all datasets present in CSV"""
 # pylint: disable=duplicate-code
-import csv
-import os
 import re
+from typing import Union
 
 from django.conf import settings
 
@@ -11,25 +10,143 @@ from backend.api.models import (
     SpectrogramConfiguration,
     WindowType,
 )
+from backend.utils.datawork import read_spectro_csvs
 
+SPECTRO_CONFIG_FIELDS = [
+    "nfft",
+    "window_size",
+    "overlap",
+    "zoom_level",
+    "spectro_normalization",
+    "data_normalization",
+    "hp_filter_min_freq",
+    "colormap",
+    "dynamic_min",
+    "dynamic_max",
+    "window_type",
+    "frequency_resolution",
+    "temporal_resolution",
+    "spectro_duration",
+    "audio_file_dataset_overlap",
+]
 
-def check_new_spectro_config_errors():
-    """Check for new spectro configs on all datasets present in CSV"""
-    # pylint: disable=too-many-locals
+
+def _get_spectro_name(spectro: dict) -> str:
+    name = f"{spectro['nfft']}_{spectro['window_size']}_{spectro['overlap']}"
+    if (
+        "custom_frequency_scale" in spectro
+        and spectro["custom_frequency_scale"]
+        and spectro["custom_frequency_scale"] != "linear"
+    ):
+        name = f"{name}_{spectro['custom_frequency_scale']}"
+    return name
+
+
+def reconcile_spectro_configs(datasets_spectros: list[tuple[Dataset, list[dict]]]):
+    """Create or update the spectrogram configurations of the datasets from their CSV rows
+
+    Existing configurations are loaded in one query and compared in memory: only the
+    new and changed ones are written.
+    Return the change report:
+    {"created": [{"dataset", "name"}], "updated": [{"dataset", "name", "fields"}], "unchanged": int}
+    """
+    window_types = {
+        window_type.name: window_type
+        for window_type in WindowType.objects.filter(
+            name__in={
+                spectro["window_type"]
+                for _, spectros in datasets_spectros
+                for spectro in spectros
+            }
+        )
+    }
+    existing: dict[tuple[int, str], SpectrogramConfiguration] = {}
+    for config in SpectrogramConfiguration.objects.filter(
+        dataset_id__in=[dataset.id for dataset, _ in datasets_spectros]
+    ).order_by("-id"):
+        existing[(config.dataset_id, config.name)] = config
+
+    meta = SpectrogramConfiguration._meta  # pylint: disable=protected-access
+    # Last row wins for each configuration name
+    matched: set[tuple[int, str]] = set()
+    to_create: dict[tuple[int, str], SpectrogramConfiguration] = {}
+    to_update: dict[tuple[int, str], set[str]] = {}
+    for dataset, spectros in datasets_spectros:
+        for spectro in spectros:
+            key = (dataset.id, _get_spectro_name(spectro))
+            values = {
+                field: spectro[field]
+                for field in SPECTRO_CONFIG_FIELDS
+                if field in spectro
+            }
+            if "window_type" in values:
+                values["window_type"] = window_types.get(values["window_type"])
+
+            if key in existing:
+                matched.add(key)
+            config = existing.get(key) or to_create.get(key)
+            if config is None:
+                to_create[key] = SpectrogramConfiguration(
+                    name=key[1], dataset=dataset, **values
+                )
+                continue
+            for field, value in values.items():
+                model_field = meta.get_field(field)
+                if model_field.is_relation:
+                    field = model_field.attname
+                    value = value.pk if value is not None else None
+                else:
+                    value = model_field.to_python(value)
+                if getattr(config, field) != value:
+                    setattr(config, field, value)
+                    if key in existing:
+                        to_update.setdefault(key, set()).add(model_field.name)
+
+    SpectrogramConfiguration.objects.bulk_create(to_create.values())
+    if to_update:
+        SpectrogramConfiguration.objects.bulk_update(
+            [existing[key] for key in to_update],
+            fields=set().union(*to_update.values()),
+        )
+
+    dataset_names = {dataset.id: dataset.name for dataset, _ in datasets_spectros}
+    return {
+        "created": [
+            {"dataset": dataset_names[dataset_id], "name": name}
+            for dataset_id, name in to_create
+        ],
+        "updated": [
+            {
+                "dataset": dataset_names[dataset_id],
+                "name": name,
+                "fields": sorted(fields),
+            }
+            for (dataset_id, name), fields in to_update.items()
+        ],
+        "unchanged": len(matched) - len(to_update),
+    }
+
+
+def check_new_spectro_config_errors(
+    datawork_datasets: list[dict],
+) -> tuple[Union[dict, list], dict]:
+    """Check for new spectro configs on all datasets present in CSV
+
+    datawork_datasets are the rows of the datawork datasets CSV.
+    Return the errors and the change report of reconcile_spectro_configs
+    """
+    check_error = []
+    datasets_spectros: list[tuple[Dataset, list[dict]]] = []
     try:
-        check_error = []
         csv_dataset_names = []
         # Check for new datasets
-        with open(
-            settings.DATASET_IMPORT_FOLDER / settings.DATASET_FILE, encoding="utf-8"
-        ) as csvfile:
-            new_dataset: dict
-            for new_dataset in csv.DictReader(csvfile):
-                new_dataset[
-                    "name"
-                ] = f"{new_dataset['dataset']} ({new_dataset['spectro_duration']}_{new_dataset['dataset_sr']})"
-                dname = new_dataset["name"]
-                csv_dataset_names.append(dname)
+        new_dataset: dict
+        for new_dataset in datawork_datasets:
+            new_dataset[
+                "name"
+            ] = f"{new_dataset['dataset']} ({new_dataset['spectro_duration']}_{new_dataset['dataset_sr']})"
+            dname = new_dataset["name"]
+            csv_dataset_names.append(dname)
 
         # Check for new spectro configs on all datasets present in CSV
         datasets_to_check: list[Dataset] = Dataset.objects.filter(
@@ -37,7 +154,6 @@ def check_new_spectro_config_errors():
         )
 
         for dataset in datasets_to_check:
-            dataset_spectros = []
             dataset_folder = dataset.dataset_path.split("datawork/dataset/")[1]
             conf_folder = dataset.dataset_conf or ""
             conf_folder_path = (
@@ -46,54 +162,7 @@ def check_new_spectro_config_errors():
                 / settings.DATASET_SPECTRO_FOLDER
                 / conf_folder
             )
-
-            # Search all sub folder, each sub folder have one metadata.csv
-            for one_spectro_folder in os.scandir(conf_folder_path):
-                if one_spectro_folder.is_dir():
-                    spectro_csv_path = f"{one_spectro_folder.path}/metadata.csv"
-                    with open(spectro_csv_path, encoding="utf-8") as csvfile:
-                        spectro: dict
-                        for spectro in csv.DictReader(csvfile):
-                            name = f"{spectro['nfft']}_{spectro['window_size']}_{spectro['overlap']}"
-                            if (
-                                "custom_frequency_scale" in spectro
-                                and spectro["custom_frequency_scale"]
-                                and spectro["custom_frequency_scale"] != "linear"
-                            ):
-                                name = f"{name}_{spectro['custom_frequency_scale']}"
-
-                            window_type = WindowType.objects.filter(
-                                name=spectro["window_type"]
-                            ).first()
-                            spectro["window_type"] = window_type
-
-                            spectro_needed = {
-                                key: value
-                                for (key, value) in spectro.items()
-                                if key
-                                in [
-                                    "nfft",
-                                    "window_size",
-                                    "overlap",
-                                    "zoom_level",
-                                    "spectro_normalization",
-                                    "data_normalization",
-                                    "hp_filter_min_freq",
-                                    "colormap",
-                                    "dynamic_min",
-                                    "dynamic_max",
-                                    "window_type",
-                                    "frequency_resolution",
-                                    "temporal_resolution",
-                                    "spectro_duration",
-                                    "audio_file_dataset_overlap",
-                                ]
-                            }
-                            dataset_spectros.append(
-                                SpectrogramConfiguration.objects.update_or_create(
-                                    name=name, defaults=spectro_needed, dataset=dataset
-                                )[0]
-                            )
+            datasets_spectros.append((dataset, read_spectro_csvs(conf_folder_path)))
 
     except FileNotFoundError as error:
         regex = "dataset/(.*)/processed"
@@ -107,4 +176,6 @@ def check_new_spectro_config_errors():
             ]
         }
 
-    return check_error
+    # The datasets read before an error are still updated
+    report = reconcile_spectro_configs(datasets_spectros)
+    return check_error, report
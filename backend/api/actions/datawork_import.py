@@ -1,202 +1,452 @@
 """Python file for datawork_import function that imports datasets from datawork"""
-
 import csv
-import os
+import io
+import multiprocessing
 from ast import literal_eval
-from datetime import timedelta
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional
+from uuid import uuid4
 
 from django.conf import settings
-from django.db import transaction
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from sentry_sdk import capture_exception
 
+from backend.api.actions.check_new_spectro_config_errors import (
+    check_new_spectro_config_errors,
+)
 from backend.api.actions.frequency_scales import get_frequency_scales
 from backend.api.models import (
     Dataset,
     AudioMetadatum,
     DatasetFile,
+    DatasetImportJob,
     SpectrogramConfiguration,
     WindowType,
     MultiLinearScale,
     LinearScale,
 )
 from backend.api.models.metadata import FileSubtype
+from backend.utils.datawork import (
+    iter_dataset_files,
+    read_dataset_csvs,
+    read_datasets_csv,
+    refresh_catalog,
+)
+from backend.utils.executors import get_executor as get_thread_pool
 
+DATASET_FILES_BATCH_SIZE = 10_000  # Number of files inserted by query, without COPY
+COPY_BUFFER_SIZE = 1024 * 1024  # Size of the data sent to COPY at once
+DATAWORK_CATALOG_KEY = "datawork_catalog_generation"
 
-@transaction.atomic
-def datawork_import(*, wanted_datasets, importer):
-    """This function will import Datasets from datawork folder with importer user as owner"""
-    # TODO : break up this process to remove code smell and in order to help with unit testing
-    # pylint: disable=too-many-locals, duplicate-code
-    current_dataset_names = Dataset.objects.values_list("name", flat=True)
-    wanted_dataset_names = [dataset["name"] for dataset in wanted_datasets]
-    csv_dataset_names = []
-    new_datasets = []
-
-    # Check for new datasets
-    with open(
-        settings.DATASET_IMPORT_FOLDER / settings.DATASET_FILE, encoding="utf-8"
-    ) as csvfile:
-        dataset: dict
-        for dataset in csv.DictReader(csvfile):
-            dataset["name"] = dataset["dataset"]
-            csv_dataset_names.append(dataset["name"])
-            if (
-                dataset["name"] in wanted_dataset_names
-                and dataset["name"] not in current_dataset_names
-            ):
-                new_datasets.append(dataset)
-
-    created_datasets = []
-    for dataset in new_datasets:
-        # Create dataset metadata
-        conf_folder = f"{dataset['spectro_duration']}_{dataset['dataset_sr']}"
-
-        # Audio
-        audio_folder = (
-            settings.DATASET_IMPORT_FOLDER
-            / dataset["path"]
-            / settings.DATASET_FILES_FOLDER
-            / conf_folder
-        )
-        with open(audio_folder / "metadata.csv", encoding="utf-8") as csvfile:
-            audio_raw = list(csv.DictReader(csvfile))[0]
-        audio_metadatum = AudioMetadatum.objects.create(
-            channel_count=audio_raw["channel_count"],
-            dataset_sr=audio_raw["dataset_sr"],
-            start=parse_datetime(audio_raw["start_date"].strip()),
-            end=parse_datetime(audio_raw["end_date"].strip()),
-            audio_file_count=audio_raw["audio_file_count"]
-            if "audio_file_count" in audio_raw
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the import job thread, it is created on first use
+
+    Jobs run one after another so that a dataset cannot be imported twice
+    """
+    return get_thread_pool("datawork_import", 1)
+
+
+def sync_datawork_catalog():
+    """Forget the datawork files read in this process before the last explicit refresh"""
+    shared_cache = caches["shared"]
+    generation = shared_cache.get(DATAWORK_CATALOG_KEY)
+    if generation is None:
+        shared_cache.add(DATAWORK_CATALOG_KEY, uuid4().hex, timeout=None)
+        generation = shared_cache.get(DATAWORK_CATALOG_KEY)
+    refresh_catalog(generation)
+
+
+def refresh_datawork_catalog():
+    """Read again all datawork files on next use, in all processes"""
+    caches["shared"].set(DATAWORK_CATALOG_KEY, uuid4().hex, timeout=None)
+    sync_datawork_catalog()
+
+
+def get_datawork_datasets() -> list[dict]:
+    """Get the datasets listed in datasets.csv"""
+    sync_datawork_catalog()
+    return read_datasets_csv(settings.DATASET_IMPORT_FOLDER / settings.DATASET_FILE)
+
+
+def get_new_datasets(wanted_dataset_names: list[str]) -> list[dict]:
+    """Get the wanted datasets of datasets.csv which are not imported yet"""
+    current_dataset_names = set(Dataset.objects.values_list("name", flat=True))
+    return [
+        dataset
+        for dataset in get_datawork_datasets()
+        if dataset["name"] in wanted_dataset_names
+        and dataset["name"] not in current_dataset_names
+    ]
+
+
+def read_dataset(dataset: dict) -> dict:
+    """Read the CSV files of the dataset with the current settings"""
+    return read_dataset_csvs(
+        dataset,
+        import_folder=settings.DATASET_IMPORT_FOLDER,
+        export_path=settings.DATASET_EXPORT_PATH,
+        files_folder=settings.DATASET_FILES_FOLDER,
+        spectro_folder=settings.DATASET_SPECTRO_FOLDER,
+    )
+
+
+def create_spectro_configs(
+    dataset: Dataset, audio_metadatum: AudioMetadatum, spectros: list[dict]
+) -> list[SpectrogramConfiguration]:
+    """Create the spectrogram configurations of a new dataset, with one query for all of them"""
+    window_types: dict[str, WindowType] = {}
+    frequency_scales: dict[
+        str, tuple[Optional[LinearScale], Optional[MultiLinearScale]]
+    ] = {}
+    configurations: dict[tuple, SpectrogramConfiguration] = {}
+    spectro: dict
+    for spectro in spectros:
+        name = f"{spectro['nfft']}_{spectro['window_size']}_{spectro['overlap']}"
+
+        is_instrument_normalization = spectro["data_normalization"] == "instrument"
+        is_zscore_normalization = spectro["data_normalization"] == "zscore"
+
+        custom_frequency_scale: (
+            Optional[LinearScale],
+            Optional[MultiLinearScale],
+        ) = (None, None)
+        if "custom_frequency_scale" in spectro:
+            scale_name = spectro["custom_frequency_scale"]
+            if scale_name not in frequency_scales:
+                frequency_scales[scale_name] = get_frequency_scales(
+                    scale_name, int(audio_metadatum.dataset_sr)
+                )
+            custom_frequency_scale = frequency_scales[scale_name]
+            if scale_name:
+                name = f"{name}_{scale_name}"
+        if spectro["window_type"] not in window_types:
+            window_types[spectro["window_type"]] = WindowType.objects.get_or_create(
+                name=spectro["window_type"]
+            )[0]
+        fields = {
+            "name": name,
+            "nfft": spectro["nfft"],
+            "window_size": spectro["window_size"],
+            "overlap": spectro["overlap"],
+            "zoom_level": spectro["zoom_level"],
+            "spectro_normalization": spectro["spectro_normalization"],
+            "data_normalization": spectro["data_normalization"],
+            "hp_filter_min_freq": spectro["hp_filter_min_freq"],
+            "colormap": spectro["colormap"],
+            "dynamic_min": spectro["dynamic_min"],
+            "dynamic_max": spectro["dynamic_max"],
+            "window_type": window_types[spectro["window_type"]],
+            "frequency_resolution": spectro["frequency_resolution"],
+            "temporal_resolution": spectro["temporal_resolution"]
+            if "temporal_resolution" in spectro
             else None,
-            audio_file_dataset_duration=audio_raw["audio_file_dataset_duration"]
-            if "audio_file_dataset_duration" in audio_raw
+            "spectro_duration": spectro["spectro_duration"]
+            if "spectro_duration" in spectro
             else None,
+            "audio_file_dataset_overlap": spectro["audio_file_dataset_overlap"]
+            if "audio_file_dataset_overlap" in spectro
+            else None,
+            "zscore_duration": spectro["zscore_duration"]
+            if is_zscore_normalization
+            else None,
+            "sensitivity_dB": spectro["sensitivity_dB"]
+            if is_instrument_normalization and "sensitivity_dB" in spectro
+            else None,
+            "peak_voltage": spectro["peak_voltage"]
+            if is_instrument_normalization and "peak_voltage" in spectro
+            else None,
+            "gain_dB": spectro["gain_dB"]
+            if is_instrument_normalization and "gain_dB" in spectro
+            else None,
+            "linear_frequency_scale": custom_frequency_scale[0],
+            "multi_linear_frequency_scale": custom_frequency_scale[1],
+        }
+        # Identical rows describe the same configuration
+        key = tuple(
+            (field, value.pk if hasattr(value, "pk") else value)
+            for field, value in fields.items()
         )
-        for subtype in literal_eval(audio_raw["sample_bits"]):
-            file_subtype, _ = FileSubtype.objects.get_or_create(name=subtype)
-            audio_metadatum.files_subtypes.add(file_subtype)
-
-        dataset_path = settings.DATASET_EXPORT_PATH / dataset["path"]
-        dataset_path = dataset_path.as_posix()
-        # Create dataset
-        curr_dataset = Dataset.objects.create(
-            name=dataset["name"],
-            dataset_path=dataset_path,
-            status=1,
-            files_type=dataset["file_type"],
-            dataset_conf=conf_folder,
-            start_date=audio_metadatum.start.date(),
-            end_date=audio_metadatum.end.date(),
-            audio_metadatum=audio_metadatum,
-            owner=importer,
-        )
-        created_datasets.append(curr_dataset.id)
+        if key not in configurations:
+            configurations[key] = SpectrogramConfiguration(dataset=dataset, **fields)
+    return SpectrogramConfiguration.objects.bulk_create(configurations.values())
+
+
+@transaction.atomic
+def import_dataset(data: dict, importer) -> tuple[Dataset, int]:
+    """Create a dataset with its metadata and files from its read CSV files
+
+    Return the dataset and its number of files
+    """
+    dataset = data["dataset"]
+    conf_folder = data["conf_folder"]
+    audio_raw = data["audio"]
+
+    # Create dataset metadata
+    audio_metadatum = AudioMetadatum.objects.create(
+        channel_count=audio_raw["channel_count"],
+        dataset_sr=audio_raw["dataset_sr"],
+        start=parse_datetime(audio_raw["start_date"].strip()),
+        end=parse_datetime(audio_raw["end_date"].strip()),
+        audio_file_count=audio_raw["audio_file_count"]
+        if "audio_file_count" in audio_raw
+        else None,
+        audio_file_dataset_duration=audio_raw["audio_file_dataset_duration"]
+        if "audio_file_dataset_duration" in audio_raw
+        else None,
+    )
+    audio_metadatum.files_subtypes.add(
+        *[
+            FileSubtype.objects.get_or_create(name=subtype)[0]
+            for subtype in set(literal_eval(audio_raw["sample_bits"]))
+        ]
+    )
+
+    # Create dataset
+    curr_dataset = Dataset.objects.create(
+        name=dataset["name"],
+        dataset_path=data["dataset_path"],
+        status=1,
+        files_type=dataset["file_type"],
+        dataset_conf=conf_folder,
+        start_date=audio_metadatum.start.date(),
+        end_date=audio_metadatum.end.date(),
+        audio_metadatum=audio_metadatum,
+        owner=importer,
+    )
+    create_spectro_configs(curr_dataset, audio_metadatum, data["spectros"])
+
+    files_count = load_dataset_files(
+        curr_dataset,
+        (
+            (
+                filename,
+                settings.DATASET_FILES_FOLDER / conf_folder / filename,
+                start,
+                end,
+            )
+            for filename, start, end in iter_dataset_files(
+                data["timestamps_path"], audio_raw
+            )
+        ),
+    )
+    curr_dataset.files_count = files_count
+    Dataset.objects.filter(pk=curr_dataset.pk).update(files_count=files_count)
+    return curr_dataset, files_count
+
+
+class _CSVStream:
+    """File-like object writing the rows as CSV while COPY reads it"""
+
+    def __init__(self, rows: Iterator[tuple]):
+        self.rows = rows
+        self.count = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
 
-        # Add Spectro Config
-        dataset_folder = dataset_path.split("datawork/dataset/")[1]
+    def read(self, size: int = -1) -> str:
+        """Get at least size characters, all remaining ones if size is negative"""
+        for row in self.rows:
+            self._writer.writerow(row)
+            self.count += 1
+            if 0 <= size <= self._buffer.tell():
+                break
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
 
-        conf_folder_path = (
-            settings.DATASET_IMPORT_FOLDER
-            / dataset_folder
-            / settings.DATASET_SPECTRO_FOLDER
-            / conf_folder
+
+def load_dataset_files(
+    dataset: Dataset, files: Iterator[tuple[str, Path, datetime, datetime]]
+) -> int:
+    """Insert the (filename, filepath, start, end) files of the dataset, return their count
+
+    On PostgreSQL, rows are streamed with COPY without creating model instances
+    """
+    if connection.vendor != "postgresql":
+        count = 0
+        while batch := [
+            DatasetFile(
+                dataset=dataset,
+                filename=filename,
+                filepath=filepath,
+                size=0,
+                start=start,
+                end=end,
+            )
+            for filename, filepath, start, end in islice(
+                files, DATASET_FILES_BATCH_SIZE
+            )
+        ]:
+            DatasetFile.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    stream = _CSVStream(
+        (filename, filepath, 0, dataset.id, start.isoformat(), end.isoformat())
+        for filename, filepath, start, end in files
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {DatasetFile._meta.db_table} "  # pylint: disable=protected-access
+            '(filename, filepath, size, dataset_id, start, "end") '
+            "FROM STDIN WITH (FORMAT csv)",
+            stream,
+            size=COPY_BUFFER_SIZE,
         )
+    # Model signals are not sent for copied rows
+    DatasetFile.objects.invalidate_time_index(dataset.id)
+    return stream.count
 
-        # Search all sub folder, each sub folder have one metadata.csv
-        for one_spectro_folder in os.scandir(conf_folder_path):
-            if one_spectro_folder.is_dir():
-                spectro_csv_path = f"{one_spectro_folder.path}/metadata.csv"
-            else:
-                continue
-
-            with open(spectro_csv_path, encoding="utf-8") as csvfile:
-                spectro: dict
-                for spectro in csv.DictReader(csvfile):
-                    name = f"{spectro['nfft']}_{spectro['window_size']}_{spectro['overlap']}"
-
-                    is_instrument_normalization = (
-                        spectro["data_normalization"] == "instrument"
-                    )
-                    is_zscore_normalization = spectro["data_normalization"] == "zscore"
-
-                    custom_frequency_scale: (
-                        Optional[LinearScale],
-                        Optional[MultiLinearScale],
-                    ) = (None, None)
-                    if "custom_frequency_scale" in spectro:
-                        custom_frequency_scale = get_frequency_scales(
-                            spectro["custom_frequency_scale"],
-                            int(audio_metadatum.dataset_sr),
-                        )
-                        if spectro["custom_frequency_scale"]:
-                            name = f"{name}_{spectro['custom_frequency_scale']}"
-                    new_spectro = SpectrogramConfiguration.objects.update_or_create(
-                        name=name,
-                        dataset=curr_dataset,
-                        nfft=spectro["nfft"],
-                        window_size=spectro["window_size"],
-                        overlap=spectro["overlap"],
-                        zoom_level=spectro["zoom_level"],
-                        spectro_normalization=spectro["spectro_normalization"],
-                        data_normalization=spectro["data_normalization"],
-                        hp_filter_min_freq=spectro["hp_filter_min_freq"],
-                        colormap=spectro["colormap"],
-                        dynamic_min=spectro["dynamic_min"],
-                        dynamic_max=spectro["dynamic_max"],
-                        window_type=WindowType.objects.get_or_create(
-                            name=spectro["window_type"]
-                        )[0],
-                        frequency_resolution=spectro["frequency_resolution"],
-                        temporal_resolution=spectro["temporal_resolution"]
-                        if "temporal_resolution" in spectro
-                        else None,
-                        spectro_duration=spectro["spectro_duration"]
-                        if "spectro_duration" in spectro
-                        else None,
-                        audio_file_dataset_overlap=spectro["audio_file_dataset_overlap"]
-                        if "audio_file_dataset_overlap" in spectro
-                        else None,
-                        zscore_duration=spectro["zscore_duration"]
-                        if is_zscore_normalization
-                        else None,
-                        sensitivity_dB=spectro["sensitivity_dB"]
-                        if is_instrument_normalization and "sensitivity_dB" in spectro
-                        else None,
-                        peak_voltage=spectro["peak_voltage"]
-                        if is_instrument_normalization and "peak_voltage" in spectro
-                        else None,
-                        gain_dB=spectro["gain_dB"]
-                        if is_instrument_normalization and "gain_dB" in spectro
-                        else None,
-                        linear_frequency_scale=custom_frequency_scale[0],
-                        multi_linear_frequency_scale=custom_frequency_scale[1],
-                    )[0]
-                    new_spectro.save()
-
-        dataset_files = []
-        # Create dataset_files
-        with open(audio_folder / "timestamp.csv", encoding="utf-8") as csvfile:
-            timestamp_data: dict
-            for timestamp_data in csv.DictReader(csvfile):
-                start = parse_datetime(timestamp_data["timestamp"])
-                dataset_files.append(
-                    DatasetFile(
-                        dataset=curr_dataset,
-                        filename=timestamp_data["filename"],
-                        filepath=settings.DATASET_FILES_FOLDER
-                        / conf_folder
-                        / timestamp_data["filename"],
-                        size=0,
-                        start=start,
-                        end=(
-                            start
-                            + timedelta(
-                                seconds=float(audio_raw["audio_file_dataset_duration"])
-                            )
-                        ),
-                    )
-                )
-        curr_dataset.files.bulk_create(dataset_files)
 
+@transaction.atomic
+def datawork_import(*, wanted_datasets, importer):
+    """This function will import Datasets from datawork folder with importer user as owner"""
+    created_datasets = [
+        import_dataset(read_dataset(dataset), importer)[0].id
+        for dataset in get_new_datasets(
+            [dataset["name"] for dataset in wanted_datasets]
+        )
+    ]
     return Dataset.objects.filter(id__in=created_datasets)
+
+
+def fail_stale_datawork_import_jobs():
+    """Jobs not finished after DATAWORK_IMPORT_JOB_TIMEOUT are failed
+
+    Their thread may have been stopped with its web worker
+    """
+    for job in DatasetImportJob.objects.filter(
+        status__in=[DatasetImportJob.Status.PENDING, DatasetImportJob.Status.RUNNING],
+        created_at__lt=timezone.now()
+        - timedelta(seconds=settings.DATAWORK_IMPORT_JOB_TIMEOUT),
+    ):
+        job.status = DatasetImportJob.Status.FAILED
+        job.errors = [*job.errors, {"dataset": None, "error": "Timed out"}]
+        job.finished_at = timezone.now()
+        job.save()
+
+
+def request_datawork_import_job(wanted_datasets, importer) -> DatasetImportJob:
+    """Start the background import of the wanted datasets"""
+    fail_stale_datawork_import_jobs()
+    job = DatasetImportJob.objects.create(
+        wanted_datasets=[dataset["name"] for dataset in wanted_datasets],
+        created_by=importer,
+    )
+    if settings.DATAWORK_IMPORT_WORKERS > 0:
+        job_id = job.id
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job_id))
+    else:
+        run_datawork_import_job(job.id)
+        job.refresh_from_db()
+    return job
+
+
+def _run_in_worker(job_id: int):
+    try:
+        run_datawork_import_job(job_id)
+    finally:
+        # The job thread has its own connection
+        connection.close()
+
+
+def _get_error_message(error: Exception) -> str:
+    if isinstance(error, KeyError):
+        return f"One of the import CSV is missing the following column : {error}"
+    return str(error)
+
+
+def run_datawork_import_job(job_id: int):
+    """Import the datasets of the job
+
+    Metadata CSV files are read in worker processes, then each dataset is created
+    in its own transaction
+    """
+    if not DatasetImportJob.objects.filter(
+        pk=job_id, status=DatasetImportJob.Status.PENDING
+    ).update(status=DatasetImportJob.Status.RUNNING):
+        return  # Failed as stale, or already run
+    job: DatasetImportJob = DatasetImportJob.objects.select_related("created_by").get(
+        pk=job_id
+    )
+    try:
+        datasets = get_new_datasets(job.wanted_datasets)
+        DatasetImportJob.objects.filter(pk=job.pk).update(datasets_count=len(datasets))
+        if settings.DATAWORK_IMPORT_WORKERS > 0:
+            with ProcessPoolExecutor(
+                max_workers=settings.DATAWORK_IMPORT_WORKERS,
+                # Workers only read files: they do not need a copy of the Django process
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = {
+                    pool.submit(
+                        read_dataset_csvs,
+                        dataset,
+                        settings.DATASET_IMPORT_FOLDER,
+                        settings.DATASET_EXPORT_PATH,
+                        settings.DATASET_FILES_FOLDER,
+                        settings.DATASET_SPECTRO_FOLDER,
+                    ): dataset
+                    for dataset in datasets
+                }
+                for future in as_completed(futures):
+                    _import_job_dataset(job, futures[future], future.result)
+        else:
+            for dataset in datasets:
+                _import_job_dataset(job, dataset, lambda d=dataset: read_dataset(d))
+        # As the synchronous import: configurations of existing datasets may have changed
+        spectro_errors, spectro_report = check_new_spectro_config_errors(
+            get_datawork_datasets()
+        )
+        job.refresh_from_db()
+        job.spectro_configs_update = {
+            "errors": spectro_errors["error_lines"] if spectro_errors else [],
+            **spectro_report,
+        }
+        job.status = (
+            DatasetImportJob.Status.FAILED
+            if job.errors
+            else DatasetImportJob.Status.DONE
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        capture_exception(error)
+        job.refresh_from_db()
+        job.status = DatasetImportJob.Status.FAILED
+        job.errors = [
+            *job.errors,
+            {"dataset": None, "error": _get_error_message(error)},
+        ]
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def _import_job_dataset(job: DatasetImportJob, dataset: dict, read):
+    """Import one dataset of the job and report its progress"""
+    try:
+        data = read()
+        with transaction.atomic():
+            if Dataset.objects.filter(name=dataset["name"]).exists():
+                return
+            new_dataset, files_count = import_dataset(data, job.created_by)
+            job.datasets.add(new_dataset)
+            DatasetImportJob.objects.filter(pk=job.pk).update(
+                imported_datasets_count=F("imported_datasets_count") + 1,
+                files_count=F("files_count") + files_count,
+            )
+    except Exception as error:  # pylint: disable=broad-except
+        capture_exception(error)
+        job.refresh_from_db(fields=["errors"])
+        job.errors = [
+            *job.errors,
+            {"dataset": dataset["name"], "error": _get_error_message(error)},
+        ]
+        job.save(update_fields=["errors"])
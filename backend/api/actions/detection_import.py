@@ -0,0 +1,251 @@
+"""Import of detection results: CSV rows mapping and chunked import sessions"""
+import csv
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from sentry_sdk import capture_exception
+
+from backend.api.models import (
+    AnnotationResult,
+    AnnotationTask,
+    DetectionImportPart,
+    DetectionImportSession,
+    Phase,
+    PhaseProgress,
+)
+from backend.api.serializers import AnnotationResultImportListSerializer
+from backend.utils.executors import get_executor as get_thread_pool
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the local worker pool, it is created on first use"""
+    return get_thread_pool("detection_import", settings.DETECTION_IMPORT_WORKERS)
+
+
+def map_import_row(
+    row: dict, dataset_name: str, detectors_map: dict, phase_id: int
+) -> Optional[dict]:
+    """Map a CSV row to the import serializer data, None if its detector is not imported"""
+    annotator = row["annotator"] if "annotator" in row else None
+    if annotator not in detectors_map:
+        return None
+    detector_map = detectors_map[annotator] if annotator else None
+    confidence_level = (
+        row["confidence_indicator_level"]
+        if "confidence_indicator_level" in row
+        else None
+    )
+    detector = annotator
+    if detector_map and "detector" in detector_map and detector_map["detector"]:
+        detector = detector_map["detector"]
+    return {
+        "is_box": row["is_box"],
+        "dataset": dataset_name,
+        "detector": detector,
+        "detector_config": detector_map["configuration"]
+        if detector_map and "configuration" in detector_map
+        else None,
+        "start_datetime": row["start_datetime"],
+        "end_datetime": row["end_datetime"],
+        "min_frequency": row["start_frequency"],
+        "max_frequency": row["end_frequency"] if row["end_frequency"] != "" else None,
+        "label": row["annotation"],
+        "confidence_indicator": {
+            "label": row["confidence_indicator_label"],
+            "level": confidence_level.split("/")[0],
+        }
+        if "confidence_indicator_label" in row
+        and row["confidence_indicator_label"]
+        and confidence_level
+        else None,
+        "annotation_campaig_phase": phase_id,
+    }
+
+
+def reset_verification_tasks(campaign_id: int, results: list[AnnotationResult]):
+    """Imported results must be verified again"""
+    PhaseProgress.objects.update_tasks_status(
+        AnnotationTask.objects.filter(
+            annotation_campaign_phase__annotation_campaign_id=campaign_id,
+            annotation_campaign_phase__phase=Phase.VERIFICATION,
+            dataset_file_id__in={r.dataset_file_id for r in results},
+        ),
+        AnnotationTask.Status.CREATED,
+    )
+
+
+def _get_serializer(
+    session: DetectionImportSession, data: list[dict], stage: bool = False
+) -> AnnotationResultImportListSerializer:
+    return AnnotationResultImportListSerializer(
+        data=data,
+        context={
+            "phase": session.phase,
+            "force_datetime": session.force_datetime,
+            "force_max_frequency": session.force_max_frequency,
+            "stage": stage,
+        },
+    )
+
+
+def _validate(
+    session: DetectionImportSession, rows: list[dict], stage: bool = False
+) -> tuple[AnnotationResultImportListSerializer, list[dict], list[dict]]:
+    """Split rows ({"row": number, "data": data}) between valid ones and errors
+
+    The returned serializer is only valid if there is no error
+    """
+    serializer = _get_serializer(session, [row["data"] for row in rows], stage)
+    if serializer.is_valid():
+        return serializer, rows, []
+    errors = serializer.errors
+    return (
+        serializer,
+        [row for row, error in zip(rows, errors) if not error],
+        [
+            {"row": row["row"], "errors": error}
+            for row, error in zip(rows, errors)
+            if error
+        ],
+    )
+
+
+@transaction.atomic
+def stage_import_part(
+    session: DetectionImportSession, index: int, content: str
+) -> DetectionImportPart:
+    """Validate a received part and stage its valid rows
+
+    The first part must start with the CSV header
+    """
+    session = DetectionImportSession.objects.select_for_update().get(pk=session.pk)
+    content_hash = hashlib.sha256(content.encode()).hexdigest()
+    existing_part = session.parts.filter(index=index).first()
+    if existing_part is not None:
+        # Part sent again, after an interrupted upload
+        if existing_part.content_hash != content_hash:
+            raise ValueError(f"Part {index} was already received with another content")
+        return existing_part
+    if index != session.parts_count:
+        raise ValueError(f"Expected part {session.parts_count}, got part {index}")
+    if session.status != DetectionImportSession.Status.OPEN:
+        raise ValueError("Import session is not open")
+
+    if index == 0:
+        session.header, _, content = content.partition("\n")
+        session.header = session.header.rstrip("\r")
+    rows = list(csv.DictReader(StringIO(f"{session.header}\n{content}")))
+
+    first_row = session.rows_count + 1
+    mapped_rows = [
+        {"row": first_row + row_index, "data": data}
+        for row_index, data in enumerate(
+            map_import_row(
+                row, session.dataset_name, session.detectors_map, session.phase_id
+            )
+            for row in rows
+        )
+        if data is not None
+    ]
+    _, staged, errors = _validate(session, mapped_rows, stage=True)
+    part = DetectionImportPart.objects.create(
+        session=session,
+        index=index,
+        content_hash=content_hash,
+        first_row=first_row,
+        rows_count=len(rows),
+        data=staged,
+        errors=errors,
+    )
+
+    session.parts_count += 1
+    session.rows_count += len(rows)
+    session.staged_rows_count += len(staged)
+    session.save()
+    return part
+
+
+def request_import_commit(session: DetectionImportSession) -> DetectionImportSession:
+    """Start the import of the staged parts in a background job
+
+    Its progress is followed with the committed parts and imported results counts
+    """
+    session.status = DetectionImportSession.Status.COMMITTING
+    session.error = None
+    session.save()
+    if settings.DETECTION_IMPORT_WORKERS > 0:
+        session_id = session.id
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, session_id))
+    else:
+        commit_import_session(session.id)
+        session.refresh_from_db()
+    return session
+
+
+def is_commit_running(session: DetectionImportSession) -> bool:
+    """A commit is running if it made progress within DETECTION_IMPORT_COMMIT_TIMEOUT
+
+    Its worker may have been stopped with its process: it can then be started again
+    """
+    return (
+        session.status == DetectionImportSession.Status.COMMITTING
+        and session.updated_at
+        > timezone.now() - timedelta(seconds=settings.DETECTION_IMPORT_COMMIT_TIMEOUT)
+    )
+
+
+def _run_in_worker(session_id: int):
+    try:
+        commit_import_session(session_id)
+    finally:
+        # Each worker thread has its own connection
+        connection.close()
+
+
+def commit_import_session(session_id: int):
+    """Import the staged parts, one transaction for each part
+
+    An interrupted commit resumes from the first part not committed yet
+    """
+    session: DetectionImportSession = DetectionImportSession.objects.select_related(
+        "phase", "phase__annotation_campaign"
+    ).get(pk=session_id)
+    try:
+        for part_id in session.parts.filter(is_committed=False).values_list(
+            "id", flat=True
+        ):
+            with transaction.atomic():
+                part = DetectionImportPart.objects.select_for_update().get(pk=part_id)
+                if part.is_committed:  # By a concurrent commit
+                    continue
+                serializer, rows, errors = _validate(session, part.data)
+                if errors:  # Data changed since the part was staged
+                    serializer = _get_serializer(session, [row["data"] for row in rows])
+                    serializer.is_valid(raise_exception=True)
+                results: list[AnnotationResult] = serializer.save()
+                reset_verification_tasks(session.phase.annotation_campaign_id, results)
+
+                part.errors += errors
+                part.data = []
+                part.is_committed = True
+                part.save()
+                DetectionImportSession.objects.filter(pk=session.pk).update(
+                    committed_parts_count=F("committed_parts_count") + 1,
+                    imported_count=F("imported_count") + len(results),
+                    updated_at=timezone.now(),
+                )
+        session.refresh_from_db()
+        session.status = DetectionImportSession.Status.DONE
+    except Exception as error:  # pylint: disable=broad-except
+        capture_exception(error)
+        session.refresh_from_db()
+        session.status = DetectionImportSession.Status.FAILED
+        session.error = str(error)
+    session.save()
@@ -0,0 +1,473 @@
+"""Annotation campaign phase reports"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Callable, Iterator, Optional
+
+from django.db import models
+from django.db.models import (
+    F,
+    Value,
+    Case,
+    When,
+    OuterRef,
+    QuerySet,
+    Subquery,
+)
+from django.db.models.functions import Lower, Concat, Extract
+
+from backend.api.models import (
+    AnnotationResult,
+    AnnotationResultValidation,
+    AnnotationTask,
+    AnnotationComment,
+    AnnotationFileRange,
+    AnnotationCampaignPhase,
+    Phase,
+)
+from backend.api.models.annotation.result import AnnotationResultType
+from backend.aplose.models.user import ExpertiseLevel
+
+REPORT_HEADERS = [  # headers
+    "dataset",
+    "filename",
+    "result_id",
+    "is_update_of_id",
+    "start_time",
+    "end_time",
+    "start_frequency",
+    "end_frequency",
+    "annotation",
+    "annotator",
+    "annotator_expertise",
+    "start_datetime",
+    "end_datetime",
+    "is_box",
+    "type",
+    "confidence_indicator_label",
+    "confidence_indicator_level",
+    "comments",
+    "signal_quality",
+    "signal_start_frequency",
+    "signal_end_frequency",
+    "signal_relative_max_frequency_count",
+    "signal_relative_min_frequency_count",
+    "signal_has_harmonics",
+    "signal_trend",
+    "signal_steps_count",
+    "created_at_phase",
+]
+REPORT_RESULTS_FIELDS = [  # datetimes are formatted from the file dates
+    *[i for i in REPORT_HEADERS if i not in ("start_datetime", "end_datetime")],
+    "_file_start",
+    "_file_end",
+    "_start_time",
+    "_end_time",
+]
+REPORT_CHUNK_SIZE = 2000  # Rows fetched at once from the server-side cursor
+
+
+def report_add_validations(results: Iterator[dict]) -> Iterator[dict]:
+    """Add validation columns (one per validating user) to the given report rows
+
+    Validations are recovered with a single query for each chunk of results
+    then pivoted by user: True if the user validated the result, False if the user
+    invalidated it, None otherwise.
+    """
+    while True:
+        chunk = list(islice(results, REPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        validations: dict[int, dict[str, bool]] = defaultdict(dict)
+        for result_id, username, is_valid in AnnotationResultValidation.objects.filter(
+            result_id__in=[row["result_id"] for row in chunk],
+            is_valid__isnull=False,
+        ).values_list("result_id", "annotator__username", "is_valid"):
+            validations[result_id][username] = (
+                validations[result_id].get(username, False) or is_valid
+            )
+        for row in chunk:
+            yield {**row, **validations.get(row["result_id"], {})}
+
+
+class ReportIntervals:
+    """Sorted and merged file id intervals, used to check file assignation"""
+
+    def __init__(self):
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+
+    def add(self, start: int, end: int):
+        """Add an interval: intervals must be added ordered by start"""
+        if self.ends and start <= self.ends[-1] + 1:
+            self.ends[-1] = max(self.ends[-1], end)
+            return
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __contains__(self, value: int) -> bool:
+        index = bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+
+def get_report_results(phase: AnnotationCampaignPhase) -> QuerySet[AnnotationResult]:
+    """Get annotation results report rows queryset of the phase campaign"""
+    campaign = phase.annotation_campaign
+    is_box = Case(
+        When(type=AnnotationResultType.WEAK, then=0),
+        default=1,
+        output_field=models.IntegerField(),
+    )
+    result_type = Case(
+        When(type=AnnotationResultType.WEAK, then=Value("WEAK")),
+        When(type=AnnotationResultType.POINT, then=Value("POINT")),
+        When(type=AnnotationResultType.BOX, then=Value("BOX")),
+        default=None,
+        output_field=models.CharField(),
+    )
+    phase_type = Case(
+        When(
+            annotation_campaign_phase__phase=Phase.VERIFICATION,
+            then=Value("VERIFICATION"),
+        ),
+        When(
+            annotation_campaign_phase__phase=Phase.ANNOTATION,
+            then=Value("ANNOTATION"),
+        ),
+        default=None,
+        output_field=models.CharField(),
+    )
+    max_confidence = (
+        max(
+            campaign.confidence_indicator_set.confidence_indicators.values_list(
+                "level", flat=True
+            )
+        )
+        if campaign.confidence_indicator_set
+        else 0
+    )
+    comments = Subquery(
+        AnnotationComment.objects.select_related("author")
+        .filter(annotation_result_id=OuterRef("id"))
+        .annotate(data=Concat(F("comment"), Value(" |- "), F("author__username")))
+        .values_list("data", flat=True)
+    )
+    return (
+        AnnotationResult.objects.filter(
+            annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id
+        )
+        .select_related(
+            "dataset_file",
+            "dataset_file__dataset",
+            "annotator",
+            "annotator__aplose",
+            "label",
+            "confidence_indicator",
+            "acoustic_features",
+            "detector_configuration__detector",
+            "annotation_campaign_phase",
+        )
+        .prefetch_related(
+            "comments",
+            "comments__author",
+        )
+        .order_by("dataset_file__start", "dataset_file__id", "id")
+        .distinct()
+        .annotate(
+            dataset=F("dataset_file__dataset__name"),
+            filename=F("dataset_file__filename"),
+            annotation=F("label__name"),
+            annotator_expertise=Case(
+                When(
+                    annotator_expertise_level=ExpertiseLevel.NOVICE,
+                    then=Value("NOVICE"),
+                ),
+                When(
+                    annotator_expertise_level=ExpertiseLevel.AVERAGE,
+                    then=Value("AVERAGE"),
+                ),
+                When(
+                    annotator_expertise_level=ExpertiseLevel.EXPERT,
+                    then=Value("EXPERT"),
+                ),
+                default=F("annotator_expertise_level"),
+                output_field=models.CharField(),
+            ),
+            is_box=is_box,
+            type_label=result_type,
+            confidence_indicator_label=F("confidence_indicator__label"),
+            confidence_indicator_level=Case(
+                When(
+                    confidence_indicator__isnull=False,
+                    then=Concat(
+                        F("confidence_indicator__level"),
+                        Value("/"),
+                        max_confidence,
+                        output_field=models.CharField(),
+                    ),
+                ),
+                default=None,
+            ),
+            comments_data=comments,
+            signal_quality=Case(
+                When(acoustic_features__isnull=False, then=Value("GOOD")),
+                When(
+                    label__in=campaign.labels_with_acoustic_features.all(),
+                    then=Value("BAD"),
+                ),
+                default=None,
+                output_field=models.CharField(),
+            ),
+            signal_start_frequency=F("acoustic_features__start_frequency"),
+            signal_end_frequency=F("acoustic_features__end_frequency"),
+            signal_relative_max_frequency_count=F(
+                "acoustic_features__relative_max_frequency_count"
+            ),
+            signal_relative_min_frequency_count=F(
+                "acoustic_features__relative_min_frequency_count"
+            ),
+            signal_has_harmonics=F("acoustic_features__has_harmonics"),
+            signal_trend=F("acoustic_features__trend"),
+            signal_steps_count=F("acoustic_features__steps_count"),
+            _start_time=F("start_time"),
+            _end_time=F("end_time"),
+            _start_frequency=F("start_frequency"),
+            _end_frequency=F("end_frequency"),
+            result_id=F("id"),
+            created_at_phase=phase_type,
+            _file_start=F("dataset_file__start"),
+            _file_end=F("dataset_file__end"),
+        )
+        .values(
+            *[
+                i
+                for i in REPORT_HEADERS
+                if i
+                not in (
+                    "annotator",
+                    "comments",
+                    "start_time",
+                    "end_time",
+                    "start_frequency",
+                    "end_frequency",
+                    "type",
+                    "start_datetime",
+                    "end_datetime",
+                )
+            ],
+            "annotator__username",
+            "comments_data",
+            "validations",
+            "_start_time",
+            "_end_time",
+            "_start_frequency",
+            "_end_frequency",
+            "type_label",
+            "_file_start",
+            "_file_end",
+        )
+        .annotate(
+            annotator=Case(
+                When(annotator__isnull=False, then=F("annotator__username")),
+                When(
+                    detector_configuration__detector__isnull=False,
+                    then=F("detector_configuration__detector__name"),
+                ),
+                default=Value(""),
+                output_field=models.CharField(),
+            ),
+            comments=F("comments_data"),
+            start_time=Case(
+                When(type=AnnotationResultType.WEAK, then=Value(0.0)),
+                default=F("_start_time"),
+            ),
+            end_time=Case(
+                When(type=AnnotationResultType.POINT, then=F("_start_time")),
+                When(
+                    type=AnnotationResultType.WEAK,
+                    then=Extract(F("dataset_file__end"), lookup_name="epoch")
+                    - Extract(F("dataset_file__start"), lookup_name="epoch"),
+                ),
+                default=F("_end_time"),
+                output_field=models.FloatField(),
+            ),
+            start_frequency=Case(
+                When(type=AnnotationResultType.WEAK, then=Value(0.0)),
+                default=F("_start_frequency"),
+            ),
+            end_frequency=Case(
+                When(type=AnnotationResultType.POINT, then=F("_start_frequency")),
+                When(
+                    type=AnnotationResultType.WEAK,
+                    then=F("dataset_file__dataset__audio_metadatum__dataset_sr") / 2,
+                ),
+                default=F("_end_frequency"),
+            ),
+            type=F("type_label"),
+        )
+    )
+
+
+def get_report_task_comments(
+    phase: AnnotationCampaignPhase,
+) -> QuerySet[AnnotationComment]:
+    """Get task comments report rows queryset of the phase"""
+    return (
+        AnnotationComment.objects.filter(
+            annotation_campaign_phase_id=phase.id,
+            annotation_result__isnull=True,
+        )
+        .select_related("dataset_file", "dataset_file__dataset", "author")
+        .annotate(
+            dataset=F("dataset_file__dataset__name"),
+            filename=F("dataset_file__filename"),
+            annotator=F("author__username"),
+            comments=Concat(F("comment"), Value(" |- "), F("author__username")),
+            _file_start=F("dataset_file__start"),
+            _file_end=F("dataset_file__end"),
+        )
+    )
+
+
+def format_report_datetime(value: datetime) -> str:
+    """Format datetime in UTC with milliseconds, ie: 2012-10-03T10:01:48.200+00:00"""
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def iter_report_results(
+    results: QuerySet[AnnotationResult],
+    format_datetime: Callable[[datetime], Any] = format_report_datetime,
+) -> Iterator[dict]:
+    """Fetch results report rows through a server-side cursor and format their datetimes"""
+    for row in results.values(*REPORT_RESULTS_FIELDS).iterator(
+        chunk_size=REPORT_CHUNK_SIZE
+    ):
+        file_start: datetime = row.pop("_file_start")
+        file_end: datetime = row.pop("_file_end")
+        start_time: Optional[float] = row.pop("_start_time")
+        end_time: Optional[float] = row.pop("_end_time")
+        row["start_datetime"] = format_datetime(
+            file_start
+            if start_time is None
+            else file_start + timedelta(seconds=start_time)
+        )
+        row["end_datetime"] = format_datetime(
+            file_end if end_time is None else file_start + timedelta(seconds=end_time)
+        )
+        yield row
+
+
+def iter_report_task_comments(
+    comments: QuerySet[AnnotationComment],
+    format_datetime: Callable[[datetime], Any] = format_report_datetime,
+) -> Iterator[dict]:
+    """Fetch task comments report rows through a server-side cursor and format their datetimes"""
+    for row in comments.values(
+        "dataset", "filename", "annotator", "comments", "_file_start", "_file_end"
+    ).iterator(chunk_size=REPORT_CHUNK_SIZE):
+        row["start_datetime"] = format_datetime(row.pop("_file_start"))
+        row["end_datetime"] = format_datetime(row.pop("_file_end"))
+        yield row
+
+
+def get_report_headers(phase: AnnotationCampaignPhase) -> list[str]:
+    """Get annotation results report headers: validating users are added for verification phases"""
+    if phase.phase != Phase.VERIFICATION:
+        return REPORT_HEADERS
+    return REPORT_HEADERS + list(
+        AnnotationResultValidation.objects.filter(
+            result__annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id
+        )
+        .select_related("annotator")
+        .order_by("annotator__username")
+        .values_list("annotator__username", flat=True)
+        .distinct()
+    )
+
+
+def get_report(
+    phase: AnnotationCampaignPhase,
+    format_datetime: Callable[[datetime], Any] = format_report_datetime,
+) -> tuple[list[str], Iterator[dict]]:
+    """Get annotation results report headers and rows
+
+    Rows are fetched by chunks through a server-side cursor
+    so the whole report is never loaded in memory
+    """
+    headers = get_report_headers(phase)
+    results = iter_report_results(get_report_results(phase), format_datetime)
+    if phase.phase == Phase.VERIFICATION:
+        results = report_add_validations(results)
+    comments = iter_report_task_comments(
+        get_report_task_comments(phase), format_datetime
+    )
+
+    def get_rows() -> Iterator[dict]:
+        yield from results
+        yield from comments
+
+    return headers, get_rows()
+
+
+def get_status_report(
+    phase: AnnotationCampaignPhase,
+) -> tuple[list[str], Iterator[dict]]:
+    """Get tasks status report headers and rows"""
+    campaign = phase.annotation_campaign
+
+    # Headers
+    header = ["dataset", "filename"]
+    file_ranges: QuerySet[AnnotationFileRange] = phase.file_ranges
+    annotators = list(
+        file_ranges.values("annotator__username")
+        .distinct()
+        .order_by(Lower("annotator__username"))
+        .values_list("annotator__username", flat=True)
+    )
+    header += annotators
+
+    # Assigned files: one sweep over the ranges
+    assigned_intervals: dict[str, ReportIntervals] = {
+        user: ReportIntervals() for user in annotators
+    }
+    for user, first_file_id, last_file_id in file_ranges.order_by(
+        "annotator__username", "first_file_id"
+    ).values_list("annotator__username", "first_file_id", "last_file_id"):
+        assigned_intervals[user].add(first_file_id, last_file_id)
+
+    def get_rows() -> Iterator[dict]:
+        files = (
+            campaign.get_sorted_files()
+            .values_list("start", "id", "dataset__name", "filename")
+            .iterator(chunk_size=REPORT_CHUNK_SIZE)
+        )
+        # Finished tasks are sorted as the files: they are merged while walking the files
+        finished_tasks = (
+            phase.tasks.filter(status=AnnotationTask.Status.FINISHED)
+            .order_by("dataset_file__start", "dataset_file_id")
+            .values_list(
+                "dataset_file__start", "dataset_file_id", "annotator__username"
+            )
+            .iterator(chunk_size=REPORT_CHUNK_SIZE)
+        )
+        task = next(finished_tasks, None)
+        for start, file_id, dataset, filename in files:
+            while task is not None and task[:2] < (start, file_id):
+                task = next(finished_tasks, None)
+            finished_users = set()
+            while task is not None and task[:2] == (start, file_id):
+                finished_users.add(task[2])
+                task = next(finished_tasks, None)
+
+            row = {"dataset": dataset, "filename": filename}
+            for user in annotators:
+                if user in finished_users:
+                    row[user] = "FINISHED"
+                elif file_id in assigned_intervals[user]:
+                    row[user] = "CREATED"
+                else:
+                    row[user] = "UNASSIGNED"
+            yield row
+
+    return header, get_rows()
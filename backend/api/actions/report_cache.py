@@ -0,0 +1,399 @@
+"""Incremental cache of annotation results reports
+
+The report of a phase is materialized on disk by segments: each segment covers a block of
+REPORT_SEGMENT_SIZE consecutive campaign files (sorted by start then id).
+A segment is only rebuilt when the results, validations or comments of its files changed
+since it was written. A rebuilt segment is written to a new file: the manifest lists the
+files of the current report.
+
+Updates of a phase cache are serialized by an exclusive file lock, and reads hold a shared
+lock while streaming the segments listed in the manifest.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import MD5, Cast, Concat
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from backend.api.models import (
+    AnnotationCampaignPhase,
+    AnnotationComment,
+    AnnotationResult,
+    AnnotationResultValidation,
+    Detector,
+    Label,
+    Phase,
+)
+from backend.aplose.models import User
+from backend.utils.streaming import stream_csv
+from .report import (
+    REPORT_CHUNK_SIZE,
+    get_report_headers,
+    get_report_results,
+    get_report_task_comments,
+    iter_report_results,
+    iter_report_task_comments,
+    report_add_validations,
+)
+
+REPORT_CACHE_VERSION = 1  # Update it when the report content changes
+REPORT_READ_SIZE = 1024 * 1024
+
+Boundary = tuple[datetime, int]
+
+
+def _hash(data) -> str:
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def get_comments_digest() -> MD5:
+    """Digest of the comments ids and content: comments have no update date"""
+    return MD5(
+        StringAgg(
+            Concat(
+                Cast("id", models.CharField()),
+                Value(":"),
+                "comment",
+                output_field=models.CharField(),
+            ),
+            delimiter="|",
+            ordering="id",
+        )
+    )
+
+
+def _write_atomic(path: Path, content: Iterator[str]):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        for data in content:
+            file.write(data)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _lock(path: Path, shared: bool = False):
+    with open(path, "a", encoding="utf-8") as file:
+        fcntl.flock(file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class ReportCache:
+    """Segmented report cache of a phase"""
+
+    def __init__(self, phase: AnnotationCampaignPhase):
+        self.phase = phase
+        self.campaign = phase.annotation_campaign
+        self.folder = Path(settings.REPORT_FOLDER) / "segments" / str(phase.id)
+        self.headers = get_report_headers(phase)
+
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the manifest: it stores the signature of each written segment"""
+        return self.folder / "manifest.json"
+
+    @property
+    def lock_path(self) -> Path:
+        """Path of the file locked during updates (exclusive) and reads (shared)"""
+        return self.folder / ".lock"
+
+    def segment_path(self, key: str, index: int, signature: str, kind: str) -> Path:
+        """Path of a segment file: each content of a segment has its own file"""
+        return self.folder / f"{index}.{_hash([key, signature])[:32]}.{kind}.csv"
+
+    def read_manifest(self) -> dict:
+        """Read the stored manifest, empty if missing or unreadable"""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get_files_signature(self) -> str:
+        """Signature of the campaign files: the blocks change with it"""
+        return _hash(
+            self.campaign.get_sorted_files()
+            .order_by()
+            .aggregate(
+                count=Count("id"),
+                last=Max("id"),
+                ids=Sum("id"),
+                first_start=Min("start"),
+                last_start=Max("start"),
+            )
+        )
+
+    def get_names(self) -> list:
+        """Names written in the report rows, which are not part of the segments signatures"""
+        campaign_id = self.campaign.id
+        results = AnnotationResult.objects.filter(
+            annotation_campaign_phase__annotation_campaign_id=campaign_id
+        )
+        users = User.objects.filter(
+            Q(id__in=results.values("annotator_id"))
+            | Q(
+                id__in=AnnotationComment.objects.filter(
+                    annotation_campaign_phase__annotation_campaign_id=campaign_id
+                ).values("author_id")
+            )
+            | Q(
+                id__in=AnnotationResultValidation.objects.filter(
+                    result__annotation_campaign_phase__annotation_campaign_id=campaign_id
+                ).values("annotator_id")
+            )
+        )
+        return [
+            list(self.campaign.datasets.order_by("id").values_list("id", "name")),
+            list(
+                Label.objects.filter(id__in=results.values("label_id"))
+                .order_by("id")
+                .values_list("id", "name")
+            ),
+            list(users.order_by("id").values_list("id", "username")),
+            list(
+                Detector.objects.filter(
+                    id__in=results.values("detector_configuration__detector_id")
+                )
+                .order_by("id")
+                .values_list("id", "name")
+            ),
+        ]
+
+    def get_global_key(self, files_signature: str) -> str:
+        """Key of everything shared by all segments: any change invalidates the whole cache"""
+        confidence_set = self.campaign.confidence_indicator_set
+        return _hash(
+            [
+                REPORT_CACHE_VERSION,
+                settings.REPORT_SEGMENT_SIZE,
+                self.headers,
+                self.phase.phase,
+                files_signature,
+                self.get_names(),
+                list(
+                    self.campaign.labels_with_acoustic_features.order_by(
+                        "id"
+                    ).values_list("id", flat=True)
+                ),
+                list(
+                    confidence_set.confidence_indicators.order_by("level").values_list(
+                        "level", "label"
+                    )
+                )
+                if confidence_set
+                else None,
+            ]
+        )
+
+    def get_boundaries(self) -> list[Boundary]:
+        """First file (start, id) of each block"""
+        return [
+            file
+            for index, file in enumerate(
+                self.campaign.get_sorted_files()
+                .values_list("start", "id")
+                .iterator(chunk_size=REPORT_CHUNK_SIZE)
+            )
+            if index % settings.REPORT_SEGMENT_SIZE == 0
+        ]
+
+    def get_segments_signatures(self, boundaries: list[Boundary]) -> list[str]:
+        """Signature of each block from its results, validations and comments high-water marks"""
+        if not boundaries:
+            return []
+        states: list[list] = [[] for _ in boundaries]
+
+        def add(start: datetime, file_id: int, kind: str, *state):
+            index = max(bisect_right(boundaries, (start, file_id)) - 1, 0)
+            states[index].append([kind, file_id, *state])
+
+        for start, file_id, count, last, ids in (
+            AnnotationResult.objects.filter(
+                annotation_campaign_phase__annotation_campaign_id=self.campaign.id
+            )
+            .values("dataset_file__start", "dataset_file_id")
+            .annotate(count=Count("id"), last=Max("last_updated_at"), ids=Sum("id"))
+            .order_by("dataset_file__start", "dataset_file_id")
+            .values_list(
+                "dataset_file__start", "dataset_file_id", "count", "last", "ids"
+            )
+        ):
+            add(start, file_id, "results", count, last, ids)
+        if self.phase.phase == Phase.VERIFICATION:
+            for start, file_id, count, last, ids in (
+                AnnotationResultValidation.objects.filter(
+                    result__annotation_campaign_phase__annotation_campaign_id=self.campaign.id
+                )
+                .values("result__dataset_file__start", "result__dataset_file_id")
+                .annotate(count=Count("id"), last=Max("last_updated_at"), ids=Sum("id"))
+                .order_by("result__dataset_file__start", "result__dataset_file_id")
+                .values_list(
+                    "result__dataset_file__start",
+                    "result__dataset_file_id",
+                    "count",
+                    "last",
+                    "ids",
+                )
+            ):
+                add(start, file_id, "validations", count, last, ids)
+        # Comments have no update date: their content is hashed
+        for start, file_id, count, digest in (
+            AnnotationComment.objects.filter(
+                annotation_campaign_phase__annotation_campaign_id=self.campaign.id
+            )
+            .values("dataset_file__start", "dataset_file_id")
+            .annotate(
+                count=Count("id"),
+                digest=get_comments_digest(),
+            )
+            .order_by("dataset_file__start", "dataset_file_id")
+            .values_list("dataset_file__start", "dataset_file_id", "count", "digest")
+        ):
+            add(start, file_id, "comments", count, digest)
+
+        return [_hash(state) for state in states]
+
+    @staticmethod
+    def get_block_filter(boundaries: list[Boundary], index: int) -> Q:
+        """Filter on the files of a block, using the (start, id) keyset"""
+        query = Q()
+        start, file_id = boundaries[index]
+        if index > 0:
+            query &= Q(dataset_file__start__gt=start) | Q(
+                dataset_file__start=start, dataset_file_id__gte=file_id
+            )
+        if index + 1 < len(boundaries):
+            start, file_id = boundaries[index + 1]
+            query &= Q(dataset_file__start__lt=start) | Q(
+                dataset_file__start=start, dataset_file_id__lt=file_id
+            )
+        return query
+
+    def build_segment(
+        self, key: str, boundaries: list[Boundary], index: int, signature: str
+    ):
+        """Write the results and comments segments of a block"""
+        block_filter = self.get_block_filter(boundaries, index)
+        results = iter_report_results(
+            get_report_results(self.phase).filter(block_filter)
+        )
+        if self.phase.phase == Phase.VERIFICATION:
+            results = report_add_validations(results)
+        comments = iter_report_task_comments(
+            get_report_task_comments(self.phase)
+            .filter(block_filter)
+            .order_by("dataset_file__start", "dataset_file_id", "id")
+        )
+        for kind, rows in (("results", results), ("comments", comments)):
+            lines = stream_csv(self.headers, rows)
+            next(lines)  # Header is only written once, at the start of the report
+            _write_atomic(self.segment_path(key, index, signature, kind), lines)
+
+    def update(self) -> int:
+        """Rebuild outdated segments, return the number of segments
+
+        Must be called with the exclusive lock
+        """
+        manifest = self.read_manifest()
+        files_signature = self.get_files_signature()
+        key = self.get_global_key(files_signature)
+
+        if manifest.get("key") == key:
+            boundaries = [
+                (datetime.fromisoformat(start), file_id)
+                for start, file_id in manifest["boundaries"]
+            ]
+            previous_signatures: list[Optional[str]] = manifest["segments"]
+        else:
+            boundaries = self.get_boundaries()
+            previous_signatures = [None for _ in boundaries]
+
+        signatures = self.get_segments_signatures(boundaries)
+        for index, signature in enumerate(signatures):
+            if (
+                signature != previous_signatures[index]
+                or not self.segment_path(key, index, signature, "results").exists()
+                or not self.segment_path(key, index, signature, "comments").exists()
+            ):
+                self.build_segment(key, boundaries, index, signature)
+
+        _write_atomic(
+            self.manifest_path,
+            iter(
+                [
+                    json.dumps(
+                        {
+                            "key": key,
+                            "boundaries": [
+                                [start.isoformat(), file_id]
+                                for start, file_id in boundaries
+                            ],
+                            "segments": signatures,
+                        }
+                    )
+                ]
+            ),
+        )
+        # Segments replaced by this update, or by an interrupted one
+        paths = {
+            self.segment_path(key, index, signature, kind)
+            for index, signature in enumerate(signatures)
+            for kind in ("results", "comments")
+        }
+        for path in self.folder.glob("*.csv"):
+            if path not in paths:
+                path.unlink(missing_ok=True)
+        return len(signatures)
+
+    def read(self) -> Iterator[str]:
+        """Update the cache then yield the report content by chunks
+
+        The segments listed by the manifest are read: concurrent updates wait until
+        the end of the read.
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with _lock(self.lock_path):
+            self.update()
+        with _lock(self.lock_path, shared=True):
+            manifest = self.read_manifest()
+            yield from stream_csv(self.headers)  # Only the header
+            for kind in ("results", "comments"):
+                for index, signature in enumerate(manifest["segments"]):
+                    with open(
+                        self.segment_path(manifest["key"], index, signature, kind),
+                        encoding="utf-8",
+                        newline="",
+                    ) as file:
+                        yield from iter(partial(file.read, REPORT_READ_SIZE), "")
+
+
+@receiver(post_delete, sender=AnnotationCampaignPhase)
+def delete_phase_segments(sender, instance: AnnotationCampaignPhase, **kwargs):
+    """Remove the cached segments of a deleted phase, once the deletion is committed"""
+    # pylint: disable=unused-argument
+    folder = Path(settings.REPORT_FOLDER) / "segments" / str(instance.id)
+    transaction.on_commit(lambda: shutil.rmtree(folder, ignore_errors=True))
+
+
+def get_cached_report(phase: AnnotationCampaignPhase) -> Iterator[str]:
+    """Get annotation results report CSV content, using the segments cache"""
+    return ReportCache(phase).read()
@@ -0,0 +1,118 @@
+"""Columnar export of phase reports: Apache Parquet and Arrow IPC
+
+pyarrow is an optional dependency: columnar formats are only available when it is installed.
+"""
+from itertools import islice
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from .report import REPORT_CHUNK_SIZE
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+COLUMNAR_AVAILABLE = pyarrow is not None
+PARQUET = "parquet"
+ARROW = "arrow"
+
+
+def _to_float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def _to_int(value) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def _to_bool(value) -> Optional[bool]:
+    return None if value is None else bool(value)
+
+
+def _to_str(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _get_column_types() -> dict[str, tuple["pyarrow.DataType", Callable]]:
+    timestamp = (pyarrow.timestamp("ms", tz="UTC"), lambda value: value)
+    string = (pyarrow.string(), _to_str)
+    integer = (pyarrow.int64(), _to_int)
+    decimal = (pyarrow.float64(), _to_float)
+    boolean = (pyarrow.bool_(), _to_bool)
+    return {
+        "dataset": string,
+        "filename": string,
+        "result_id": integer,
+        "is_update_of_id": integer,
+        "start_time": decimal,
+        "end_time": decimal,
+        "start_frequency": decimal,
+        "end_frequency": decimal,
+        "annotation": string,
+        "annotator": string,
+        "annotator_expertise": string,
+        "start_datetime": timestamp,
+        "end_datetime": timestamp,
+        "is_box": boolean,
+        "type": string,
+        "confidence_indicator_label": string,
+        "confidence_indicator_level": string,
+        "comments": string,
+        "signal_quality": string,
+        "signal_start_frequency": decimal,
+        "signal_end_frequency": decimal,
+        "signal_relative_max_frequency_count": integer,
+        "signal_relative_min_frequency_count": integer,
+        "signal_has_harmonics": boolean,
+        "signal_trend": string,
+        "signal_steps_count": integer,
+        "created_at_phase": string,
+    }
+
+
+def write_columnar_report(
+    file: BinaryIO,
+    export_format: str,
+    headers: list[str],
+    rows: Iterator[dict],
+    default_type: str = "string",
+):
+    """Write report rows as typed columns, one record batch for each chunk of rows
+
+    Columns missing from the known report columns use the default type:
+    "string" or "bool" (validation columns)
+    """
+    column_types = _get_column_types()
+    default = (
+        (pyarrow.bool_(), _to_bool)
+        if default_type == "bool"
+        else (pyarrow.string(), _to_str)
+    )
+    types = [column_types.get(header, default) for header in headers]
+    schema = pyarrow.schema(
+        [(header, data_type) for header, (data_type, _) in zip(headers, types)]
+    )
+    if export_format == PARQUET:
+        writer = pyarrow.parquet.ParquetWriter(file, schema)
+    else:
+        writer = pyarrow.ipc.new_file(file, schema)
+
+    with writer:
+        while True:
+            chunk = list(islice(rows, REPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            writer.write_batch(
+                pyarrow.record_batch(
+                    [
+                        pyarrow.array(
+                            [convert(row.get(header)) for row in chunk],
+                            type=data_type,
+                        )
+                        for header, (data_type, convert) in zip(headers, types)
+                    ],
+                    schema=schema,
+                )
+            )
@@ -0,0 +1,205 @@
+"""Background generation of phase reports"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from sentry_sdk import capture_exception
+
+from backend.api.models import (
+    AnnotationCampaignPhase,
+    AnnotationComment,
+    AnnotationResult,
+    AnnotationResultValidation,
+    AnnotationTask,
+    PhaseReportJob,
+)
+from backend.utils.executors import get_executor as get_thread_pool
+from backend.utils.streaming import stream_csv
+from .report import get_status_report
+from .report_cache import get_cached_report, get_comments_digest
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the local worker pool, it is created on first use"""
+    return get_thread_pool("report", settings.REPORT_WORKERS)
+
+
+def get_report_fingerprint(
+    phase: AnnotationCampaignPhase, report_type: PhaseReportJob.Type
+) -> str:
+    """Get a hash of the data used by the report: it changes as soon as the report content can change"""
+    campaign = phase.annotation_campaign
+    if report_type == PhaseReportJob.Type.STATUS:
+        state = [
+            campaign.get_sorted_files().aggregate(count=Count("id"), last=Max("id")),
+            phase.tasks.filter(status=AnnotationTask.Status.FINISHED).aggregate(
+                count=Count("id"), sum=Sum("id")
+            ),
+            phase.file_ranges.aggregate(
+                count=Count("id"),
+                last=Max("id"),
+                first_files=Sum("first_file_id"),
+                last_files=Sum("last_file_id"),
+            ),
+        ]
+    else:
+        state = [
+            phase.phase,
+            AnnotationResult.objects.filter(
+                annotation_campaign_phase__annotation_campaign_id=campaign.id
+            ).aggregate(count=Count("id"), last=Max("last_updated_at")),
+            AnnotationResultValidation.objects.filter(
+                result__annotation_campaign_phase__annotation_campaign_id=campaign.id
+            ).aggregate(count=Count("id"), last=Max("last_updated_at")),
+            AnnotationComment.objects.filter(
+                annotation_campaign_phase__annotation_campaign_id=campaign.id
+            ).aggregate(count=Count("id"), digest=get_comments_digest()),
+            list(
+                campaign.labels_with_acoustic_features.order_by("id").values_list(
+                    "id", flat=True
+                )
+            ),
+        ]
+    return hashlib.sha256(
+        json.dumps(state, default=str, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def request_report_job(
+    phase: AnnotationCampaignPhase,
+    report_type: PhaseReportJob.Type,
+    compressed: bool,
+    user,
+) -> tuple[PhaseReportJob, bool]:
+    """Get a report job for the current data: an existing one is reused if nothing changed since its request.
+    Returns the job and whether it has been created"""
+    fail_stale_report_jobs()
+    fingerprint = get_report_fingerprint(phase, report_type)
+    with transaction.atomic():
+        # Concurrent requests on the phase wait for each other: a single job is created
+        AnnotationCampaignPhase.objects.select_for_update().get(pk=phase.pk)
+        job: Optional[PhaseReportJob] = (
+            PhaseReportJob.objects.filter(
+                phase=phase,
+                type=report_type,
+                compressed=compressed,
+                fingerprint=fingerprint,
+            )
+            .exclude(status=PhaseReportJob.Status.FAILED)
+            .first()
+        )
+        if job is not None and (
+            job.status != PhaseReportJob.Status.DONE
+            or (Path(settings.REPORT_FOLDER) / job.path).exists()
+        ):
+            return job, False
+
+        job = PhaseReportJob.objects.create(
+            phase=phase,
+            type=report_type,
+            compressed=compressed,
+            fingerprint=fingerprint,
+            created_by=user,
+        )
+        if settings.REPORT_WORKERS > 0:
+            job_id = job.id
+            transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job_id))
+    if settings.REPORT_WORKERS <= 0:
+        run_report_job(job.id)
+        job.refresh_from_db()
+    return job, True
+
+
+def fail_stale_report_jobs():
+    """Jobs not finished after REPORT_JOB_TIMEOUT are failed, so that they can be requested again
+
+    Their worker may have been stopped with its process
+    """
+    PhaseReportJob.objects.filter(
+        status__in=[PhaseReportJob.Status.PENDING, PhaseReportJob.Status.RUNNING],
+        created_at__lt=timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT),
+    ).update(
+        status=PhaseReportJob.Status.FAILED,
+        error="Timed out",
+        finished_at=timezone.now(),
+    )
+
+
+def _run_in_worker(job_id: int):
+    try:
+        run_report_job(job_id)
+    finally:
+        # Each worker thread has its own connection
+        connection.close()
+
+
+def run_report_job(job_id: int):
+    """Generate the report file of the given job"""
+    if not PhaseReportJob.objects.filter(
+        pk=job_id, status=PhaseReportJob.Status.PENDING
+    ).update(status=PhaseReportJob.Status.RUNNING):
+        return  # Failed as stale, or already run
+    job: PhaseReportJob = PhaseReportJob.objects.select_related(
+        "phase", "phase__annotation_campaign"
+    ).get(pk=job_id)
+    try:
+        write_report_file(job)
+        job.status = PhaseReportJob.Status.DONE
+    except Exception as error:  # pylint: disable=broad-except
+        capture_exception(error)
+        job.status = PhaseReportJob.Status.FAILED
+        job.error = str(error)
+    job.finished_at = timezone.now()
+    job.save()
+
+    if job.status == PhaseReportJob.Status.DONE:
+        # Previous jobs of the same report are outdated
+        previous_jobs = PhaseReportJob.objects.filter(
+            phase_id=job.phase_id,
+            type=job.type,
+            compressed=job.compressed,
+            status__in=[PhaseReportJob.Status.DONE, PhaseReportJob.Status.FAILED],
+            created_at__lt=job.created_at,
+        )
+        for path in previous_jobs.exclude(path=None).values_list("path", flat=True):
+            Path(settings.REPORT_FOLDER, path).unlink(missing_ok=True)
+        previous_jobs.delete()
+
+
+def write_report_file(job: PhaseReportJob):
+    """Write the report file of the job on disk and store its hash"""
+    if job.type == PhaseReportJob.Type.STATUS:
+        headers, rows = get_status_report(job.phase)
+        lines = stream_csv(headers, rows)
+    else:
+        lines = get_cached_report(job.phase)
+
+    job.path = f"{job.phase_id}/{job.id}.{'csv.gz' if job.compressed else 'csv'}"
+    path = Path(settings.REPORT_FOLDER) / job.path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as file:
+        output = (
+            gzip.GzipFile(fileobj=file, mode="wb", mtime=0) if job.compressed else file
+        )
+        for line in lines:
+            output.write(line.encode("utf-8"))
+        if job.compressed:
+            output.close()
+    os.replace(tmp_path, path)
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(block)
+    job.content_hash = sha256.hexdigest()
+    job.size = path.stat().st_size
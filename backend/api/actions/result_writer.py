@@ -0,0 +1,317 @@
+"""Bulk write of the annotator results of a file
+
+Submitted results are validated with the serializers, then diffed against the stored ones:
+each table is written with at most one bulk create, one bulk update and one delete.
+"""
+from typing import Iterable, Optional
+
+from django.db import models, transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from backend.api.models import (
+    AnnotationCampaignPhase,
+    AnnotationComment,
+    AnnotationResult,
+    AnnotationResultAcousticFeatures,
+    AnnotationResultValidation,
+    DatasetFile,
+    Phase,
+)
+from backend.api.models.annotation.result import AnnotationResultType
+from backend.api.serializers import AnnotationResultSerializer
+from backend.api.serializers.annotation.comment import AnnotationCommentSerializer
+from backend.aplose.models import get_expertise_levels
+from .annotator_file import RESULT_RELATED
+
+NESTED_FIELDS = ("id", "comments", "validations", "acoustic_features")
+
+
+def _set_fields(instance: models.Model, data: dict) -> bool:
+    """Set the given fields on the instance, return if any value changed
+
+    Relations are compared on their id, so that no related object is fetched
+    """
+    changed = False
+    for name, value in data.items():
+        field = instance._meta.get_field(name)  # pylint: disable=protected-access
+        if field.is_relation:
+            name = field.attname
+            value = value.pk if isinstance(value, models.Model) else value
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed = True
+    return changed
+
+
+def _get_result_type(result: AnnotationResult) -> str:
+    if result.start_time is None:
+        return AnnotationResultType.WEAK
+    if result.end_time is None:
+        return AnnotationResultType.POINT
+    return AnnotationResultType.BOX
+
+
+class _TableDiff:
+    """Instances to create, update and delete in a table"""
+
+    def __init__(self, model: type[models.Model], fields: Iterable[str]):
+        self.model = model
+        self.fields = set(fields)
+        self.to_create: list[models.Model] = []
+        self.to_update: list[models.Model] = []
+        self.to_delete: list[int] = []
+
+    def diff(
+        self,
+        current: Iterable[models.Model],
+        submitted: list[dict],
+        extra: Optional[dict] = None,
+    ) -> list[models.Model]:
+        """Match submitted items by id with the current ones
+
+        Return the instances in the submitted order
+        """
+        current = {instance.id: instance for instance in current}
+        ordered = []
+        for data in submitted:
+            data = {**data, **(extra or {})}
+            instance = current.pop(data.pop("id", None), None)
+            if instance is None:
+                instance = self.model(**data)
+                self.to_create.append(instance)
+            else:
+                self.fields.update(data.keys())
+                if _set_fields(instance, data):
+                    self.to_update.append(instance)
+            ordered.append(instance)
+        self.to_delete += list(current.keys())
+        return ordered
+
+    def apply(self, **update_values):
+        """Write the differences"""
+        if self.to_delete:
+            self.model.objects.filter(id__in=self.to_delete).delete()
+        if self.to_update:
+            for instance in self.to_update:
+                for field, value in update_values.items():
+                    setattr(instance, field, value)
+            self.model.objects.bulk_update(
+                self.to_update, fields=[*self.fields, *update_values.keys()]
+            )
+        if self.to_create:
+            self.model.objects.bulk_create(self.to_create)
+
+
+def get_current_results(
+    phase: AnnotationCampaignPhase, file: DatasetFile, user_id: int
+) -> QuerySet[AnnotationResult]:
+    """Results the user can update on the file for this phase"""
+    results = AnnotationResult.objects.filter(dataset_file_id=file.id)
+    if phase.phase == Phase.ANNOTATION:
+        return results.filter(
+            annotation_campaign_phase_id=phase.id, annotator_id=user_id
+        )
+    return results.filter(
+        Q(annotation_campaign_phase_id=phase.id, annotator_id=user_id)
+        | (
+            ~Q(annotation_campaign_phase_id=phase.id, annotator_id=user_id)
+            & Q(
+                annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id
+            )
+        )
+    )
+
+
+def _diff_result(
+    results: _TableDiff, instance: Optional[AnnotationResult], data: dict
+) -> tuple[AnnotationResult, bool]:
+    """Create or update the result with its submitted fields
+
+    Return the result and if it changed
+    """
+    fields = {key: value for key, value in data.items() if key not in NESTED_FIELDS}
+    if instance is None:
+        instance = AnnotationResult(**fields)
+        results.to_create.append(instance)
+        return instance, True
+    if fields.get("is_update_of") is None:
+        fields.pop("is_update_of", None)
+    results.fields.update(fields.keys())
+    return instance, _set_fields(instance, fields)
+
+
+def _diff_acoustic_features(
+    instance: AnnotationResult,
+    new_features: Optional[dict],
+    results: _TableDiff,
+    features: _TableDiff,
+    features_to_delete: list[int],
+) -> bool:
+    """Create, update or delete the acoustic features of the result
+
+    Return if they changed
+    """
+    if new_features is None:
+        if instance.acoustic_features_id is None:
+            return False
+        features_to_delete.append(instance.acoustic_features_id)
+        instance.acoustic_features = None
+        results.fields.add("acoustic_features")
+        return True
+    if instance.acoustic_features_id is None:
+        instance.acoustic_features = AnnotationResultAcousticFeatures(**new_features)
+        features.to_create.append(instance.acoustic_features)
+        results.fields.add("acoustic_features")
+        return True
+    features.fields.update(new_features.keys())
+    if not _set_fields(instance.acoustic_features, new_features):
+        return False
+    features.to_update.append(instance.acoustic_features)
+    return True
+
+
+def _write_nested(
+    nested: list[tuple[AnnotationResult, list[dict], list[dict]]], created: set[int]
+):
+    """Apply the differences of the results comments and validations"""
+    comments = _TableDiff(AnnotationComment, ())
+    validations = _TableDiff(AnnotationResultValidation, ())
+    for instance, submitted_comments, submitted_validations in nested:
+        is_new = id(instance) in created
+        comments.diff(
+            [] if is_new else instance.comments.all(),
+            submitted_comments,
+            extra={"annotation_result": instance},
+        )
+        validations.diff(
+            [] if is_new else instance.validations.all(),
+            submitted_validations,
+            extra={"result": instance},
+        )
+    comments.apply()
+    validations.apply(last_updated_at=timezone.now())
+
+
+@transaction.atomic
+def write_results(
+    data: list[dict],
+    phase: AnnotationCampaignPhase,
+    file: DatasetFile,
+    user_id: int,
+) -> list[dict]:
+    """Validate the submitted results and apply the differences with the stored ones
+
+    Return the serialized results, in the submitted order
+    """
+    serializer = AnnotationResultSerializer(
+        data=data, many=True, context={"phase": phase, "file": file}
+    )
+    serializer.is_valid(raise_exception=True)
+    submitted: list[dict] = serializer.validated_data
+
+    current = {
+        result.id: result
+        for result in get_current_results(phase, file, user_id)
+        .select_related("acoustic_features")
+        .prefetch_related("comments", "validations")
+    }
+    expertise_levels = get_expertise_levels(
+        {
+            *(d["annotator"].id for d in submitted if d.get("annotator")),
+            *(
+                result.annotator_id
+                for result in current.values()
+                if result.annotator_id
+            ),
+        }
+    )
+
+    results = _TableDiff(AnnotationResult, ())
+    features = _TableDiff(AnnotationResultAcousticFeatures, ())
+    features_to_delete: list[int] = []
+    # (result, submitted comments, submitted validations) for each submitted result
+    nested: list[tuple[AnnotationResult, list[dict], list[dict]]] = []
+    for result_data in submitted:
+        instance, changed = _diff_result(
+            results, current.pop(result_data.get("id"), None), result_data
+        )
+        # Updated features also update the result, for its last_updated_at
+        if _diff_acoustic_features(
+            instance,
+            result_data.get("acoustic_features"),
+            results,
+            features,
+            features_to_delete,
+        ):
+            changed = True
+
+        if changed:
+            # Same rules as AnnotationResult.save
+            instance.type = _get_result_type(instance)
+            instance.annotator_expertise_level = (
+                expertise_levels.get(instance.annotator_id)
+                if instance.annotator_id
+                else None
+            )
+            if instance.id is not None:
+                results.to_update.append(instance)
+        nested.append(
+            (
+                instance,
+                result_data.get("comments", []),
+                result_data.get("validations", []),
+            )
+        )
+    results.to_delete = list(current.keys())
+
+    # Features must exist before results reference them
+    features.apply()
+    for instance in [*results.to_create, *results.to_update]:
+        # Reassign so that the created features id is set on the result
+        instance.acoustic_features = instance.acoustic_features
+    results.fields.update({"type", "annotator_expertise_level"})
+    results.apply(last_updated_at=timezone.now())
+    if features_to_delete:
+        AnnotationResultAcousticFeatures.objects.filter(
+            id__in=features_to_delete
+        ).delete()
+
+    _write_nested(nested, {id(instance) for instance in results.to_create})
+
+    ordered = [instance for instance, _, _ in nested]
+    results_by_id = {
+        result.id: result
+        for result in AnnotationResult.objects.filter(
+            id__in=[result.id for result in ordered]
+        )
+        .select_related(*RESULT_RELATED)
+        .prefetch_related("comments", "validations", "updated_to")
+    }
+    return AnnotationResultSerializer(
+        [results_by_id[result.id] for result in ordered], many=True
+    ).data
+
+
+@transaction.atomic
+def write_task_comments(
+    data: list[dict],
+    phase: AnnotationCampaignPhase,
+    file: DatasetFile,
+    user_id: int,
+) -> list[dict]:
+    """Validate the submitted task comments and apply the differences with the stored ones"""
+    serializer = AnnotationCommentSerializer(data=data, many=True)
+    serializer.is_valid(raise_exception=True)
+    comments = _TableDiff(AnnotationComment, ())
+    ordered = comments.diff(
+        AnnotationComment.objects.filter(
+            annotation_campaign_phase_id=phase.id,
+            dataset_file_id=file.id,
+            author_id=user_id,
+            annotation_result__isnull=True,
+        ),
+        serializer.validated_data,
+    )
+    comments.apply()
+    return AnnotationCommentSerializer(ordered, many=True).data
@@ -8,3 +8,8 @@ class ApiConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend.api"
+
+    def ready(self):
+        # Register the signal receivers defined outside of the models
+        # pylint: disable=import-outside-toplevel, unused-import
+        from .actions import report_cache
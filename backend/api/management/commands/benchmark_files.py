@@ -0,0 +1,125 @@
+from datetime import timedelta
+from random import randint
+from time import perf_counter
+
+from django.core import management
+from django.db import connection, transaction
+from django.db.models import Q
+
+from backend.api.models import Dataset, DatasetFile
+
+
+class Command(management.BaseCommand):
+    help = (
+        "Compares the dataset files time range queries: "
+        "three comparisons (legacy) against indexed time range conditions. "
+        "Added files are removed at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset",
+            type=int,
+            required=True,
+            help="ID of the dataset to query",
+        )
+        parser.add_argument(
+            "--files-nb",
+            type=int,
+            default=0,
+            help="Give the amount of fake files to add to the dataset before the benchmark",
+        )
+        parser.add_argument(
+            "--queries-nb",
+            type=int,
+            default=1000,
+            help="Give the amount of random time ranges to query",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the query plan of the first time range for each query",
+        )
+
+    def handle(self, *args, **options):
+        dataset = Dataset.objects.get(pk=options["dataset"])
+        with transaction.atomic():
+            if options["files_nb"]:
+                print(f"# Create {options['files_nb']} files")
+                self._create_files(dataset, options["files_nb"])
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE dataset_files")
+
+            files = DatasetFile.objects.filter(dataset=dataset)
+            first = files.order_by("start").first()
+            last = files.order_by("end").last()
+            if first is None:
+                print("No files in this dataset")
+                return
+            duration = int((last.end - first.start).total_seconds())
+            ranges = []
+            for _ in range(options["queries_nb"]):
+                start = first.start + timedelta(seconds=randint(0, duration))
+                ranges.append((start, start + timedelta(seconds=randint(0, 600))))
+
+            print("# Benchmark")
+            self._run(
+                options["explain"],
+                "Three comparisons",
+                [
+                    files.filter(
+                        Q(start__lte=start, end__gt=start)
+                        | Q(start__gte=start, end__lte=end)
+                        | Q(start__lt=end, end__gte=end)
+                    )
+                    for start, end in ranges
+                ],
+            )
+            self._run(
+                options["explain"],
+                "Range overlap",
+                [
+                    DatasetFile.objects.filter_matches_time_range(start, end).filter(
+                        dataset=dataset
+                    )
+                    for start, end in ranges
+                ],
+            )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _run(explain: bool, name: str, querysets: list):
+        if explain and querysets:
+            print(f" {name} plan:")
+            print(querysets[0].explain(analyze=True))
+        start = perf_counter()
+        count = 0
+        for queryset in querysets:
+            count += len(queryset.values_list("id", flat=True))
+        duration = perf_counter() - start
+        per_query = duration / len(querysets) * 1e3 if querysets else 0
+        print(f" {name}: {count} files in {duration:.2f}s ({per_query:.2f}ms/query)")
+
+    @staticmethod
+    def _create_files(dataset: Dataset, count: int):
+        last = DatasetFile.objects.filter(dataset=dataset).order_by("end").last()
+        start = last.end if last else dataset.created_at
+        files = []
+        for index in range(count):
+            if len(files) >= 10_000:
+                DatasetFile.objects.bulk_create(files)
+                files = []
+            end = start + timedelta(seconds=randint(60, 600))
+            files.append(
+                DatasetFile(
+                    dataset=dataset,
+                    filename=f"benchmark_{index}.wav",
+                    filepath=f"benchmark/benchmark_{index}.wav",
+                    size=0,
+                    start=start,
+                    end=end,
+                )
+            )
+            start = end
+        DatasetFile.objects.bulk_create(files)
+        dataset.update_files_count()
@@ -0,0 +1,141 @@
+from random import randint, choice
+from time import perf_counter
+from typing import Iterator
+
+from django.core import management
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+
+from backend.api.actions.report import (
+    REPORT_CHUNK_SIZE,
+    REPORT_HEADERS,
+    get_report_results,
+    iter_report_results,
+)
+from backend.api.models import (
+    AnnotationCampaignPhase,
+    AnnotationResult,
+)
+from backend.api.models.annotation.result import AnnotationResultType
+from backend.aplose.models import get_expertise_level
+
+# Previous implementation: datetimes formatted by a subquery on the files for each row
+LEGACY_DATETIME_SELECT = {
+    "start_datetime": """
+    SELECT
+        CASE
+            WHEN annotation_results.start_time isnull THEN to_char(f.start::timestamp at time zone 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.MSOF":00"')
+            ELSE to_char((f.start + annotation_results.start_time * interval '1 second')::timestamp at time zone 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.MSOF":00"')
+        END
+    FROM dataset_files f
+    WHERE annotation_results.dataset_file_id = f.id
+    """,
+    "end_datetime": """
+    SELECT
+        CASE
+            WHEN annotation_results.end_time isnull THEN to_char(f.end::timestamp at time zone 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.MSOF":00"')
+            ELSE to_char((f.start + annotation_results.end_time * interval '1 second')::timestamp at time zone 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.MSOF":00"')
+        END
+    FROM dataset_files f
+    WHERE annotation_results.dataset_file_id = f.id
+    """,
+}
+
+
+class Command(management.BaseCommand):
+    help = (
+        "Compares the report results datetimes computation: "
+        "SQL subqueries (legacy) against Python formatting on the joined file. "
+        "Added results are removed at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--phase",
+            type=int,
+            required=True,
+            help="ID of the annotation campaign phase to report",
+        )
+        parser.add_argument(
+            "--results-nb",
+            type=int,
+            default=0,
+            help="Give the amount of fake results to add to the phase before the benchmark",
+        )
+
+    def handle(self, *args, **options):
+        phase = AnnotationCampaignPhase.objects.get(pk=options["phase"])
+        with transaction.atomic():
+            if options["results_nb"]:
+                print(f"# Create {options['results_nb']} results")
+                self._create_results(phase, options["results_nb"])
+
+            print("# Benchmark")
+            self._run(
+                "SQL subqueries",
+                get_report_results(phase)
+                .annotate(
+                    **{
+                        name: RawSQL(sql, ())
+                        for name, sql in LEGACY_DATETIME_SELECT.items()
+                    }
+                )
+                .values(*REPORT_HEADERS)
+                .iterator(chunk_size=REPORT_CHUNK_SIZE),
+            )
+            self._run(
+                "Python formatting",
+                iter_report_results(get_report_results(phase)),
+            )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _run(name: str, rows: Iterator[dict]):
+        start = perf_counter()
+        count = 0
+        for _ in rows:
+            count += 1
+        duration = perf_counter() - start
+        per_row = duration / count * 1e6 if count else 0
+        print(f" {name}: {count} rows in {duration:.2f}s ({per_row:.2f}µs/row)")
+
+    @staticmethod
+    def _create_results(phase: AnnotationCampaignPhase, count: int):
+        campaign = phase.annotation_campaign
+        files = list(campaign.get_sorted_files().values_list("id", flat=True))
+        labels = list(campaign.label_set.labels.values_list("id", flat=True))
+        expertise_level = get_expertise_level(campaign.owner_id)
+        results = []
+        for _ in range(count):
+            if len(results) >= 10_000:
+                AnnotationResult.objects.bulk_create(results)
+                results = []
+            if randint(1, 4) == 1:
+                results.append(
+                    AnnotationResult(
+                        type=AnnotationResultType.WEAK,
+                        label_id=choice(labels),
+                        dataset_file_id=choice(files),
+                        annotator_id=campaign.owner_id,
+                        annotator_expertise_level=expertise_level,
+                        annotation_campaign_phase=phase,
+                    )
+                )
+                continue
+            start_time = randint(0, 600)
+            start_frequency = randint(0, 10000)
+            results.append(
+                AnnotationResult(
+                    type=AnnotationResultType.BOX,
+                    start_time=start_time,
+                    end_time=start_time + randint(30, 300),
+                    start_frequency=start_frequency,
+                    end_frequency=start_frequency + randint(2000, 5000),
+                    label_id=choice(labels),
+                    dataset_file_id=choice(files),
+                    annotator_id=campaign.owner_id,
+                    annotator_expertise_level=expertise_level,
+                    annotation_campaign_phase=phase,
+                )
+            )
+        AnnotationResult.objects.bulk_create(results)
@@ -0,0 +1,52 @@
+from django.core import management
+from django.db.models import Count, F
+
+from backend.api.models import AnnotationCampaign, Dataset
+
+
+class Command(management.BaseCommand):
+    help = (
+        "Checks the stored files count of the datasets and campaigns against their files. "
+        "Meant to be run periodically: fails if a count is wrong, unless --fix is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Store the right counts (and rebuild the file index of the campaigns)",
+        )
+
+    def handle(self, *args, **options):
+        datasets = (
+            Dataset.objects.annotate(count=Count("files"))
+            .exclude(files_count=F("count"))
+            .order_by("id")
+        )
+        campaigns = (
+            AnnotationCampaign.objects.annotate(
+                count=Count("datasets__files", distinct=True)
+            )
+            .exclude(files_count=F("count"))
+            .order_by("id")
+        )
+
+        errors = 0
+        dataset: Dataset
+        for dataset in datasets:
+            errors += 1
+            print(f" Dataset {dataset.name}: {dataset.files_count} != {dataset.count}")
+            if options["fix"]:
+                dataset.update_files_count()
+        campaign: AnnotationCampaign
+        for campaign in campaigns:
+            errors += 1
+            print(
+                f" Campaign {campaign.name}: {campaign.files_count} != {campaign.count}"
+            )
+            if options["fix"]:
+                campaign.update_file_index()
+
+        if errors and not options["fix"]:
+            raise management.CommandError(f"{errors} wrong files count")
+        print(f"# {errors} wrong files count{' fixed' if errors else ''}")
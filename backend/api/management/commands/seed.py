@@ -28,6 +28,7 @@ from backend.api.models import (
     AnnotationFileRange,
     ConfidenceIndicatorSetIndicator,
     Phase,
+    PhaseProgress,
 )
 from backend.aplose.models import AploseUser
 from backend.aplose.models.user import ExpertiseLevel
@@ -310,6 +311,8 @@ class Command(management.BaseCommand):
         Dataset.objects.bulk_create(self.datasets)
         DatasetFile.objects.bulk_create(files)
         SpectrogramConfiguration.objects.bulk_create(configs)
+        for dataset in self.datasets:
+            dataset.update_files_count()
 
     def _create_label_sets(self):
         print(" ###### _create_label_set ######")
@@ -409,6 +412,9 @@ class Command(management.BaseCommand):
                     )
                 )
             AnnotationFileRange.objects.bulk_create(file_ranges)
+            PhaseProgress.objects.refresh(
+                phase.id, [file_range.annotator_id for file_range in file_ranges]
+            )
 
     def _create_annotation_results(self):
         print(" ###### _create_annotation_results ######")
@@ -447,6 +453,9 @@ class Command(management.BaseCommand):
                         dataset_file_id=task.dataset_file_id,
                         annotator_id=task.annotator_id,
                     )
+        PhaseProgress.objects.refresh(
+            phase.id, phase.file_ranges.values_list("annotator_id", flat=True)
+        )
 
     def _create_comments(self):
         print(" ###### _create_comments ######")
@@ -0,0 +1,108 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0082_label_metadatax_label"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhaseReportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "type",
+                    models.TextField(choices=[("R", "Results"), ("S", "Status")]),
+                ),
+                (
+                    "compressed",
+                    models.BooleanField(
+                        default=False, help_text="If the report is compressed with gzip"
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="Hash of the phase data state when the job was requested",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "status",
+                    models.TextField(
+                        choices=[
+                            ("P", "Pending"),
+                            ("R", "Running"),
+                            ("D", "Done"),
+                            ("F", "Failed"),
+                        ],
+                        default="P",
+                    ),
+                ),
+                (
+                    "path",
+                    models.CharField(
+                        blank=True,
+                        help_text="Path of the generated file, relative to the REPORT_FOLDER",
+                        max_length=255,
+                        null=True,
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        blank=True,
+                        help_text="SHA256 of the generated file",
+                        max_length=64,
+                        null=True,
+                    ),
+                ),
+                ("size", models.BigIntegerField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="report_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "phase",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="report_jobs",
+                        to="api.annotationcampaignphase",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="phasereportjob",
+            index=models.Index(
+                fields=["phase", "type", "compressed", "fingerprint"],
+                name="report_job_fingerprint_idx",
+            ),
+        ),
+    ]
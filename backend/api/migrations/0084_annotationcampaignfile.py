@@ -0,0 +1,62 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0083_phasereportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnnotationCampaignFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ordinal", models.PositiveIntegerField()),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="file_index",
+                        to="api.annotationcampaign",
+                    ),
+                ),
+                (
+                    "dataset_file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="campaign_index",
+                        to="api.datasetfile",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "annotation_campaign_files",
+                "unique_together": {
+                    ("campaign", "ordinal"),
+                    ("campaign", "dataset_file"),
+                },
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO annotation_campaign_files (campaign_id, dataset_file_id, ordinal)
+            SELECT cd.annotationcampaign_id, f.id,
+                ROW_NUMBER() OVER (PARTITION BY cd.annotationcampaign_id ORDER BY f.start, f.id) - 1
+            FROM dataset_files f
+            INNER JOIN annotation_campaigns_datasets cd ON cd.dataset_id = f.dataset_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,161 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0084_annotationcampaignfile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DetectionImportSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dataset_name", models.CharField(max_length=255)),
+                (
+                    "detectors_map",
+                    models.JSONField(
+                        help_text="Detectors to import with their detector name and configuration"
+                    ),
+                ),
+                ("force_datetime", models.BooleanField(default=False)),
+                ("force_max_frequency", models.BooleanField(default=False)),
+                (
+                    "header",
+                    models.TextField(
+                        blank=True,
+                        help_text="CSV header, read from the first part",
+                        null=True,
+                    ),
+                ),
+                (
+                    "status",
+                    models.TextField(
+                        choices=[
+                            ("O", "Open"),
+                            ("C", "Committing"),
+                            ("D", "Done"),
+                            ("F", "Failed"),
+                        ],
+                        default="O",
+                    ),
+                ),
+                (
+                    "parts_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of received parts"
+                    ),
+                ),
+                (
+                    "committed_parts_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of parts imported in the results"
+                    ),
+                ),
+                (
+                    "rows_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of received rows"
+                    ),
+                ),
+                (
+                    "staged_rows_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of valid received rows"
+                    ),
+                ),
+                (
+                    "imported_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of created results"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="detection_imports",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "phase",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="detection_imports",
+                        to="api.annotationcampaignphase",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DetectionImportPart",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                (
+                    "first_row",
+                    models.PositiveIntegerField(
+                        help_text="Number of the first row of the part in the whole CSV, from 1"
+                    ),
+                ),
+                ("rows_count", models.PositiveIntegerField()),
+                (
+                    "data",
+                    models.JSONField(
+                        help_text="Staged valid rows, with their row number in the whole CSV"
+                    ),
+                ),
+                (
+                    "errors",
+                    models.JSONField(
+                        default=list,
+                        help_text="Errors of the invalid rows, with their row number",
+                    ),
+                ),
+                ("is_committed", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="parts",
+                        to="api.detectionimportsession",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["index"],
+                "unique_together": {("session", "index")},
+            },
+        ),
+    ]
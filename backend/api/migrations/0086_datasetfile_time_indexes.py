@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:10
+
+import backend.api.models.datasets
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0085_detectionimportsession_detectionimportpart"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="datasetfile",
+            index=django.contrib.postgres.indexes.GistIndex(
+                backend.api.models.datasets.TsTzRange(
+                    models.F("start"), models.F("end")
+                ),
+                name="dataset_files_time_range_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="datasetfile",
+            index=models.Index(
+                fields=["dataset", "start", "end"],
+                name="dataset_files_dataset_time_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0086_datasetfile_time_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DatasetImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "wanted_datasets",
+                    models.JSONField(help_text="Names of the datasets to import"),
+                ),
+                (
+                    "status",
+                    models.TextField(
+                        choices=[
+                            ("P", "Pending"),
+                            ("R", "Running"),
+                            ("D", "Done"),
+                            ("F", "Failed"),
+                        ],
+                        default="P",
+                    ),
+                ),
+                (
+                    "datasets_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of new datasets to import"
+                    ),
+                ),
+                ("imported_datasets_count", models.PositiveIntegerField(default=0)),
+                (
+                    "files_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of imported files"
+                    ),
+                ),
+                (
+                    "errors",
+                    models.JSONField(
+                        default=list,
+                        help_text="Errors of the datasets which could not be imported",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="dataset_import_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "datasets",
+                    models.ManyToManyField(
+                        blank=True,
+                        help_text="Imported datasets",
+                        related_name="import_jobs",
+                        to="api.Dataset",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def compute_progress(apps, _):
+    """Compute the counters of the existing phases"""
+    phase_progress = apps.get_model("api", "PhaseProgress")
+    file_range = apps.get_model("api", "AnnotationFileRange")
+    task = apps.get_model("api", "AnnotationTask")
+
+    counters: dict[tuple, dict] = {}
+    for row in (
+        file_range.objects.order_by()
+        .values("annotation_campaign_phase_id", "annotator_id")
+        .annotate(total=Sum("files_count"))
+    ):
+        counters.setdefault(
+            (row["annotation_campaign_phase_id"], row["annotator_id"]),
+            {"total": 0, "progress": 0},
+        )["total"] = row["total"]
+    for row in (
+        task.objects.filter(status="F")
+        .order_by()
+        .values("annotation_campaign_phase_id", "annotator_id")
+        .annotate(progress=Count("id"))
+    ):
+        counters.setdefault(
+            (row["annotation_campaign_phase_id"], row["annotator_id"]),
+            {"total": 0, "progress": 0},
+        )["progress"] = row["progress"]
+
+    global_counters: dict[int, dict] = {}
+    for (phase_id, _), counter in counters.items():
+        global_counter = global_counters.setdefault(
+            phase_id, {"total": 0, "progress": 0}
+        )
+        global_counter["total"] += counter["total"]
+        global_counter["progress"] += counter["progress"]
+
+    phase_progress.objects.bulk_create(
+        [
+            phase_progress(phase_id=phase_id, annotator_id=annotator_id, **counter)
+            for (phase_id, annotator_id), counter in counters.items()
+        ]
+        + [
+            phase_progress(phase_id=phase_id, annotator_id=None, **counter)
+            for phase_id, counter in global_counters.items()
+        ],
+        batch_size=10_000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0087_datasetimportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PhaseProgress",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of files in the file ranges"
+                    ),
+                ),
+                (
+                    "progress",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of finished tasks"
+                    ),
+                ),
+                (
+                    "annotator",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="phase_progresses",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "phase",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progresses",
+                        to="api.annotationcampaignphase",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="phaseprogress",
+            constraint=models.UniqueConstraint(
+                fields=("phase", "annotator"), name="phase_progress_annotator_unicity"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="phaseprogress",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("annotator__isnull", True)),
+                fields=("phase",),
+                name="phase_progress_global_unicity",
+            ),
+        ),
+        migrations.RunPython(compute_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field: str):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")[:1]
+        ),
+        0,
+    )
+
+
+def compute_files_count(apps, _):
+    """Count the files of the existing datasets and campaigns"""
+    dataset = apps.get_model("api", "Dataset")
+    campaign = apps.get_model("api", "AnnotationCampaign")
+    dataset.objects.update(
+        files_count=_count(apps.get_model("api", "DatasetFile"), "dataset_id")
+    )
+    campaign.objects.update(
+        files_count=_count(
+            apps.get_model("api", "AnnotationCampaignFile"), "campaign_id"
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0088_phaseprogress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="files_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Number of files, maintained when they are imported",
+            ),
+        ),
+        migrations.AddField(
+            model_name="annotationcampaign",
+            name="files_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Number of files of the campaign datasets, maintained when they change",
+            ),
+        ),
+        migrations.RunPython(compute_files_count, migrations.RunPython.noop),
+    ]
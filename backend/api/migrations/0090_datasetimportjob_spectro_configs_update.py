@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0089_files_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="datasetimportjob",
+            name="spectro_configs_update",
+            field=models.JSONField(
+                blank=True,
+                help_text="Result of the spectrogram configurations update, run after the import",
+                null=True,
+            ),
+        ),
+    ]
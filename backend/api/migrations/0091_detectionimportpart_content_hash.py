@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0090_datasetimportjob_spectro_configs_update"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="detectionimportpart",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 of the received content, to check a part sent again",
+                max_length=64,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:10
+
+import backend.api.models.datasets
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0091_detectionimportpart_content_hash"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="datasetfile",
+            name="dataset_files_time_range_idx",
+        ),
+        migrations.AddIndex(
+            model_name="datasetfile",
+            index=django.contrib.postgres.indexes.GistIndex(
+                backend.api.models.datasets.TsTzRange(
+                    models.F("start"), models.F("end"), models.Value("[]")
+                ),
+                name="dataset_files_time_range_idx",
+            ),
+        ),
+    ]
@@ -4,6 +4,8 @@ from backend.api.models.datasets import (
     DatasetType,
     Dataset,
     DatasetFile,
+    DatasetFilesIndex,
+    DatasetImportJob,
 )
 from backend.api.models.metadata import (
     AudioMetadatum,
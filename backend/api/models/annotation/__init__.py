@@ -2,6 +2,7 @@
 from .campaign import (
     AnnotationCampaign,
     AnnotationCampaignArchive,
+    AnnotationCampaignFile,
     AnnotationCampaignPhase,
     Phase,
 )
@@ -10,6 +11,10 @@ from .confidence import (
     ConfidenceIndicatorSet,
     ConfidenceIndicatorSetIndicator,
 )
+from .detection_import import (
+    DetectionImportPart,
+    DetectionImportSession,
+)
 from .detector import (
     Detector,
     DetectorConfiguration,
@@ -18,6 +23,7 @@ from .label import (
     Label,
     LabelSet,
 )
+from .report import PhaseReportJob
 from .result import (
     AnnotationResult,
     AnnotationResultValidation,
@@ -29,4 +35,5 @@ from .tasks import (
     AnnotationTask,
     AnnotationFileRange,
     AnnotationSession,
+    PhaseProgress,
 )
@@ -1,9 +1,9 @@
 """Campaign related models"""
-from typing import Optional
+from typing import Iterable, Optional
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
 from django.db.models import QuerySet, signals
 from django.dispatch import receiver
 from django.utils import timezone
@@ -87,6 +87,10 @@ class AnnotationCampaign(models.Model):
         on_delete=models.SET_NULL,
         null=True,
     )
+    files_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of files of the campaign datasets, maintained when they change",
+    )
 
     def do_archive(self, user: User):
         """Archive current campaign"""
@@ -104,6 +108,34 @@ class AnnotationCampaign(models.Model):
             dataset_id__in=self.datasets.values_list("id", flat=True)
         ).order_by("start", "id")
 
+    def update_file_index(self):
+        """Rebuild the ordinal index of the campaign files in (start, id) order,
+        update the campaign files count and the indexes of its file ranges"""
+        datasets = AnnotationCampaign.datasets.through._meta
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {AnnotationCampaignFile._meta.db_table} WHERE campaign_id = %s",
+                [self.id],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {AnnotationCampaignFile._meta.db_table} (campaign_id, dataset_file_id, ordinal)
+                SELECT %s, f.id, ROW_NUMBER() OVER (ORDER BY f.start, f.id) - 1
+                FROM {DatasetFile._meta.db_table} f
+                WHERE f.dataset_id IN (
+                    SELECT dataset_id FROM {datasets.db_table} WHERE annotationcampaign_id = %s
+                )
+                """,
+                [self.id, self.id],
+            )
+            files_count = cursor.rowcount
+        # Files belong to a single dataset: the index holds all the campaign files
+        self.files_count = files_count
+        AnnotationCampaign.objects.filter(pk=self.pk).update(files_count=files_count)
+
+        # File ranges are defined from the campaign: the model is looked up lazily
+        self._meta.apps.get_model("api", "AnnotationFileRange").resolve_indexes(self.id)
+
 
 class AnnotationCampaignPhase(models.Model):
     """Annotation campaign phase"""
@@ -176,3 +208,74 @@ def check_labels_features_in_label_set(sender, **kwargs):
                 },
                 code="invalid",
             )
+
+
+class AnnotationCampaignFile(models.Model):
+    """Ordinal index of the campaign files, in (start, id) order
+
+    It is rebuilt each time the campaign datasets change
+    """
+
+    class Meta:
+        db_table = "annotation_campaign_files"
+        unique_together = (
+            ("campaign", "ordinal"),
+            ("campaign", "dataset_file"),
+        )
+
+    campaign = models.ForeignKey(
+        AnnotationCampaign, on_delete=models.CASCADE, related_name="file_index"
+    )
+    dataset_file = models.ForeignKey(
+        DatasetFile, on_delete=models.CASCADE, related_name="campaign_index"
+    )
+    ordinal = models.PositiveIntegerField()
+
+    @staticmethod
+    def get_file_ids(campaign_id: int, indexes: Iterable[int]) -> dict[int, int]:
+        """Get the ids of the campaign files at the given indexes, in one query"""
+        return dict(
+            AnnotationCampaignFile.objects.filter(
+                campaign_id=campaign_id, ordinal__in=set(indexes)
+            ).values_list("ordinal", "dataset_file_id")
+        )
+
+    @staticmethod
+    def get_ordinal(campaign_id: int, file_id: int) -> Optional[int]:
+        """Get the index of a file in the campaign, None if it is not part of it"""
+        return (
+            AnnotationCampaignFile.objects.filter(
+                campaign_id=campaign_id, dataset_file_id=file_id
+            )
+            .values_list("ordinal", flat=True)
+            .first()
+        )
+
+
+@receiver(
+    signal=signals.m2m_changed,
+    sender=AnnotationCampaign.datasets.through,
+)
+def update_campaign_file_index(sender, **kwargs):
+    """Rebuild the campaign file index when its datasets change"""
+    # pylint: disable=unused-argument
+    action = kwargs.get("action")
+    instance = kwargs.get("instance")
+    if not kwargs.get("reverse"):
+        if action in ("post_add", "post_remove", "post_clear"):
+            instance.update_file_index()
+        return
+    # Reverse relation: the instance is a dataset
+    if action == "pre_clear":
+        instance._cleared_campaign_ids = list(  # pylint: disable=protected-access
+            instance.annotation_campaigns.values_list("id", flat=True)
+        )
+        return
+    if action == "post_clear":
+        campaign_ids = getattr(instance, "_cleared_campaign_ids", [])
+    elif action in ("post_add", "post_remove"):
+        campaign_ids = kwargs.get("pk_set") or []
+    else:
+        return
+    for campaign in AnnotationCampaign.objects.filter(id__in=campaign_ids):
+        campaign.update_file_index()
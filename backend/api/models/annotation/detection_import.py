@@ -0,0 +1,100 @@
+"""Detection import models"""
+from django.conf import settings
+from django.db import models
+
+from .campaign import AnnotationCampaignPhase
+
+
+class DetectionImportSession(models.Model):
+    """
+    This table represents a chunked import of detection results.
+    The CSV is uploaded by parts: each part is validated and staged, then all staged parts
+    are imported on commit, one transaction for each part.
+    """
+
+    class Status(models.TextChoices):
+        """Status of the import"""
+
+        OPEN = ("O", "Open")
+        COMMITTING = ("C", "Committing")
+        DONE = ("D", "Done")
+        FAILED = ("F", "Failed")
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    phase = models.ForeignKey(
+        AnnotationCampaignPhase,
+        on_delete=models.CASCADE,
+        related_name="detection_imports",
+    )
+    dataset_name = models.CharField(max_length=255)
+    detectors_map = models.JSONField(
+        help_text="Detectors to import with their detector name and configuration"
+    )
+    force_datetime = models.BooleanField(default=False)
+    force_max_frequency = models.BooleanField(default=False)
+    header = models.TextField(
+        null=True, blank=True, help_text="CSV header, read from the first part"
+    )
+    status = models.TextField(choices=Status.choices, default=Status.OPEN)
+
+    parts_count = models.PositiveIntegerField(
+        default=0, help_text="Number of received parts"
+    )
+    committed_parts_count = models.PositiveIntegerField(
+        default=0, help_text="Number of parts imported in the results"
+    )
+    rows_count = models.PositiveIntegerField(
+        default=0, help_text="Number of received rows"
+    )
+    staged_rows_count = models.PositiveIntegerField(
+        default=0, help_text="Number of valid received rows"
+    )
+    imported_count = models.PositiveIntegerField(
+        default=0, help_text="Number of created results"
+    )
+    error = models.TextField(null=True, blank=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="detection_imports",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class DetectionImportPart(models.Model):
+    """
+    This table contains a received part of a detection import.
+    Only the valid rows are staged, the others are reported in errors.
+    """
+
+    class Meta:
+        ordering = ["index"]
+        unique_together = (("session", "index"),)
+
+    session = models.ForeignKey(
+        DetectionImportSession, on_delete=models.CASCADE, related_name="parts"
+    )
+    index = models.PositiveIntegerField()
+    first_row = models.PositiveIntegerField(
+        help_text="Number of the first row of the part in the whole CSV, from 1"
+    )
+    rows_count = models.PositiveIntegerField()
+    data = models.JSONField(
+        help_text="Staged valid rows, with their row number in the whole CSV"
+    )
+    errors = models.JSONField(
+        default=list, help_text="Errors of the invalid rows, with their row number"
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="SHA-256 of the received content, to check a part sent again",
+    )
+    is_committed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
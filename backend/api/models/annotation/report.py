@@ -0,0 +1,77 @@
+"""Report models"""
+from django.conf import settings
+from django.db import models
+
+from .campaign import AnnotationCampaignPhase
+
+
+class PhaseReportJob(models.Model):
+    # pylint: disable=duplicate-code
+    """
+    This table represents the background generation of a phase report.
+    The generated file is stored on disk, in the REPORT_FOLDER.
+    """
+
+    class Type(models.TextChoices):
+        """Type of report"""
+
+        RESULTS = ("R", "Results")
+        STATUS = ("S", "Status")
+
+    class Status(models.TextChoices):
+        """Status of the generation"""
+
+        PENDING = ("P", "Pending")
+        RUNNING = ("R", "Running")
+        DONE = ("D", "Done")
+        FAILED = ("F", "Failed")
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["phase", "type", "compressed", "fingerprint"],
+                name="report_job_fingerprint_idx",
+            ),
+        ]
+
+    phase = models.ForeignKey(
+        AnnotationCampaignPhase, on_delete=models.CASCADE, related_name="report_jobs"
+    )
+    type = models.TextField(choices=Type.choices)
+    compressed = models.BooleanField(
+        default=False, help_text="If the report is compressed with gzip"
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text="Hash of the phase data state when the job was requested",
+    )
+    status = models.TextField(choices=Status.choices, default=Status.PENDING)
+    path = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Path of the generated file, relative to the REPORT_FOLDER",
+    )
+    content_hash = models.CharField(
+        max_length=64, null=True, blank=True, help_text="SHA256 of the generated file"
+    )
+    size = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="report_jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def filename(self) -> str:
+        """Get download filename"""
+        name = self.phase.annotation_campaign.name.replace(" ", "_")
+        suffix = "status" if self.type == PhaseReportJob.Type.STATUS else "results"
+        extension = "csv.gz" if self.compressed else "csv"
+        return f"{name}_{suffix}.{extension}"
@@ -1,11 +1,9 @@
 """Results model"""
-from typing import Optional
-
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
 
-from backend.aplose.models import User, AploseUser
+from backend.aplose.models import User, get_expertise_level
 from backend.aplose.models.user import ExpertiseLevel
 from .campaign import AnnotationCampaignPhase
 from .confidence import ConfidenceIndicator
@@ -187,16 +185,7 @@ class AnnotationResult(models.Model):
 
     def save(self, *args, **kwargs):
         # Save expertise level
-        if self.annotator:
-            aplose_user: Optional[AploseUser] = AploseUser.objects.filter(
-                user_id=self.annotator.id, expertise_level__isnull=False
-            ).first()
-            if aplose_user is not None:
-                self.annotator_expertise_level = aplose_user.expertise_level
-            else:
-                self.annotator_expertise_level = None
-        else:
-            self.annotator_expertise_level = None
+        self.annotator_expertise_level = get_expertise_level(self.annotator_id)
 
         # Save type
         if self.start_time is None:
@@ -1,13 +1,24 @@
 """Annotation task related models"""
+from typing import Iterable, Optional
 
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import QuerySet, Q, Subquery, Exists, OuterRef, Func, F
+from django.db.models import (
+    QuerySet,
+    Q,
+    Subquery,
+    Exists,
+    OuterRef,
+    Func,
+    F,
+    Count,
+    Sum,
+)
+from django.db.models.functions import Coalesce
 
-from .campaign import AnnotationCampaignPhase, Phase
+from .campaign import AnnotationCampaignFile, AnnotationCampaignPhase, Phase
 from .result import AnnotationResult
-from ..datasets import DatasetFile
 
 
 class AnnotationTask(models.Model):
@@ -83,39 +94,59 @@ class AnnotationFileRange(models.Model):
             dataset_file_id__lte=self.last_file_id,
         )
 
-    @property
-    def results(self) -> QuerySet[AnnotationResult]:
-        """Get file range results"""
-        if self.annotation_campaign_phase.phase == Phase.VERIFICATION:
+    @staticmethod
+    def get_results(
+        phase: AnnotationCampaignPhase, annotator_id: int
+    ) -> QuerySet[AnnotationResult]:
+        """Get results an annotator works on within a phase, whatever the file"""
+        if phase.phase == Phase.VERIFICATION:
             return AnnotationResult.objects.filter(
-                annotation_campaign_phase__annotation_campaign_id=self.annotation_campaign_phase.annotation_campaign_id,
-                dataset_file_id__gte=self.first_file_id,
-                dataset_file_id__lte=self.last_file_id,
+                annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id,
             ).filter(
                 (
-                    Q(annotation_campaign_phase_id=self.id)
-                    & Q(annotator_id=self.annotator_id)
+                    Q(annotation_campaign_phase_id=phase.id)
+                    & Q(annotator_id=annotator_id)
                 )
                 | (
-                    ~Q(annotation_campaign_phase_id=self.id)
-                    & ~Q(annotator_id=self.annotator_id)
+                    ~Q(annotation_campaign_phase_id=phase.id)
+                    & ~Q(annotator_id=annotator_id)
                 )
             )
         return AnnotationResult.objects.filter(
-            annotation_campaign_phase=self.annotation_campaign_phase,
-            annotator_id=self.annotator_id,
+            annotation_campaign_phase=phase,
+            annotator_id=annotator_id,
+        )
+
+    @property
+    def results(self) -> QuerySet[AnnotationResult]:
+        """Get file range results"""
+        return AnnotationFileRange.get_results(
+            self.annotation_campaign_phase, self.annotator_id
+        ).filter(
             dataset_file_id__gte=self.first_file_id,
             dataset_file_id__lte=self.last_file_id,
         )
 
-    def save(self, *args, **kwargs):
-        self.files_count = self.last_file_index - self.first_file_index + 1
-        allowed_datasets = (
-            self.annotation_campaign_phase.annotation_campaign.datasets.all()
+    def save(self, *args, file_ids: Optional[dict[int, int]] = None, **kwargs):
+        """Save the range, resolving its file ids from the campaign file index
+
+        file_ids ({index: file id}) can be given when already resolved for many ranges
+        """
+        previous_annotator_id = (
+            AnnotationFileRange.objects.filter(id=self.id)
+            .values_list("annotator_id", flat=True)
+            .first()
+            if self.id is not None
+            else None
         )
-        files = DatasetFile.objects.filter(dataset__in=allowed_datasets)
-        new_first_file_id = files[self.first_file_index].id
-        new_last_file_id = files[self.last_file_index].id
+        self.files_count = self.last_file_index - self.first_file_index + 1
+        indexes = {self.first_file_index, self.last_file_index}
+        if file_ids is None or not indexes <= file_ids.keys():
+            file_ids = AnnotationCampaignFile.get_file_ids(
+                self.annotation_campaign_phase.annotation_campaign_id, indexes
+            )
+        new_first_file_id = file_ids[self.first_file_index]
+        new_last_file_id = file_ids[self.last_file_index]
 
         # When updating: remove tasks not related anymore
         if self.first_file_id is not None and self.last_file_id is not None:
@@ -127,10 +158,18 @@ class AnnotationFileRange(models.Model):
         self.first_file_id = new_first_file_id
         self.last_file_id = new_last_file_id
         super().save(*args, **kwargs)
+        PhaseProgress.objects.refresh(
+            self.annotation_campaign_phase_id,
+            {self.annotator_id, previous_annotator_id} - {None},
+        )
 
     def delete(self, using=None, keep_parents=False):
         self._get_tasks().filter(other_range_exist=False).delete()
-        return super().delete(using, keep_parents)
+        deleted = super().delete(using, keep_parents)
+        PhaseProgress.objects.refresh(
+            self.annotation_campaign_phase_id, [self.annotator_id]
+        )
+        return deleted
 
     def _get_tasks(self) -> QuerySet[AnnotationTask]:
         return self.tasks.annotate(
@@ -150,82 +189,134 @@ class AnnotationFileRange(models.Model):
         )
 
     @staticmethod
-    def get_connected_ranges(data):
-        """Recover connected ranges"""
-        return (
-            AnnotationFileRange.objects.filter(
-                annotator_id=data.annotator,
-                annotation_campaign_phase_id=data.annotation_campaign_phase,
-            )
-            .exclude(id=data.id)
-            .filter(
-                # get bigger
-                Q(
-                    first_file_index__lte=data.first_file_index,
-                    last_file_index__gte=data.last_file_index,
-                )
-                # get littler
-                | Q(
-                    first_file_index__gte=data.first_file_index,
-                    last_file_index__lte=data.last_file_index,
-                )
-                # get mixted
-                | Q(
-                    first_file_index__lte=data.first_file_index,
-                    last_file_index__gte=data.first_file_index,
-                    last_file_index__lte=data.last_file_index,
-                )
-                | Q(
-                    first_file_index__gte=data.first_file_index,
-                    first_file_index__lte=data.last_file_index,
-                    last_file_index__gte=data.last_file_index,
-                )
-                # get siblings
-                | Q(first_file_index=data.last_file_index + 1)
-                | Q(last_file_index=data.first_file_index - 1)
-            )
+    def resolve_indexes(campaign_id: int):
+        """Update the indexes of the campaign ranges from their stored file ids
+
+        The campaign file index is renumbered when its datasets change: ranges keep
+        their first and last files. A range whose file left the campaign keeps its index.
+        """
+        ranges = AnnotationFileRange.objects.filter(
+            annotation_campaign_phase__annotation_campaign_id=campaign_id
         )
+        index = AnnotationCampaignFile.objects.filter(campaign_id=campaign_id)
+        ranges.update(
+            first_file_index=Coalesce(
+                Subquery(
+                    index.filter(dataset_file_id=OuterRef("first_file_id")).values(
+                        "ordinal"
+                    )[:1]
+                ),
+                F("first_file_index"),
+            ),
+            last_file_index=Coalesce(
+                Subquery(
+                    index.filter(dataset_file_id=OuterRef("last_file_id")).values(
+                        "ordinal"
+                    )[:1]
+                ),
+                F("last_file_index"),
+            ),
+        )
+        ranges.update(files_count=F("last_file_index") - F("first_file_index") + 1)
+        annotators: dict[int, set[int]] = {}
+        for phase_id, annotator_id in (
+            ranges.order_by()
+            .values_list("annotation_campaign_phase_id", "annotator_id")
+            .distinct()
+        ):
+            annotators.setdefault(phase_id, set()).add(annotator_id)
+        for phase_id, annotator_ids in annotators.items():
+            PhaseProgress.objects.refresh(phase_id, annotator_ids)
+
+    @staticmethod
+    def get_connected_groups(
+        ranges: Iterable["AnnotationFileRange"],
+    ) -> list[list["AnnotationFileRange"]]:
+        """Group overlapping and adjacent ranges of the same annotator and phase
+
+        Ranges are sorted by first index, then swept while keeping the end of the
+        current group.
+        """
+        groups: list[list[AnnotationFileRange]] = []
+        last_index: dict[tuple[int, int], int] = {}
+        current: dict[tuple[int, int], list[AnnotationFileRange]] = {}
+        for file_range in sorted(ranges, key=lambda r: (r.first_file_index, r.id or 0)):
+            key = (file_range.annotation_campaign_phase_id, file_range.annotator_id)
+            if key in current and file_range.first_file_index <= last_index[key] + 1:
+                current[key].append(file_range)
+                last_index[key] = max(last_index[key], file_range.last_file_index)
+                continue
+            current[key] = [file_range]
+            last_index[key] = file_range.last_file_index
+            groups.append(current[key])
+        return groups
 
     @staticmethod
     def clean_connected_ranges(data: list[dict]):
-        """Clean connected ranges to limit the number of different items"""
-        ids = [file_range["id"] for file_range in data]
-        return_ids = []
-        for range_id in ids:
-            queryset = AnnotationFileRange.objects.filter(id=range_id)
-            if not queryset.exists():
+        """Merge connected ranges to limit the number of different items
+
+        All ranges of the phases are loaded once, merged in memory, then written back
+        in bulk. Tasks are kept: a merged range covers the same files as its parts.
+        Return the merged ranges containing the given ones.
+        """
+        ids = {file_range["id"] for file_range in data}
+        phase_ids = {file_range["annotation_campaign_phase"] for file_range in data}
+        updated: list[AnnotationFileRange] = []
+        deleted_ids: list[int] = []
+        return_ids: list[int] = []
+        changed_annotators: dict[int, set[int]] = {}
+        for group in AnnotationFileRange.get_connected_groups(
+            AnnotationFileRange.objects.filter(
+                annotation_campaign_phase_id__in=phase_ids
+            )
+        ):
+            first = min(group, key=lambda r: r.first_file_index)
+            last = max(group, key=lambda r: r.last_file_index)
+            # Keep a range already covering the group, else the oldest one
+            instance = next(
+                (
+                    r
+                    for r in group
+                    if r.first_file_index == first.first_file_index
+                    and r.last_file_index == last.last_file_index
+                ),
+                min(group, key=lambda r: r.id),
+            )
+            if any(r.id in ids for r in group):
+                return_ids.append(instance.id)
+            if len(group) == 1:
                 continue
-            item = queryset.first()
-            connected_ranges = AnnotationFileRange.get_connected_ranges(item)
-            if connected_ranges.exists():
-                # update connected
-                min_first_index = min(
-                    connected_ranges.order_by("first_file_index")
-                    .first()
-                    .first_file_index,
-                    item.first_file_index,
-                )
-                max_last_index = max(
-                    connected_ranges.order_by("-last_file_index")
-                    .first()
-                    .last_file_index,
-                    item.last_file_index,
-                )
-                instance = connected_ranges.order_by("id").first()
-                duplicates = AnnotationFileRange.objects.filter(
-                    annotator_id=instance.annotator_id,
-                    annotation_campaign_phase_id=instance.annotation_campaign_phase_id,
-                    first_file_index=min_first_index,
-                    last_file_index=max_last_index,
+
+            if instance.last_file_index != last.last_file_index or (
+                instance.first_file_index != first.first_file_index
+            ):
+                instance.first_file_index = first.first_file_index
+                instance.first_file_id = first.first_file_id
+                instance.last_file_index = last.last_file_index
+                instance.last_file_id = last.last_file_id
+                instance.files_count = (
+                    instance.last_file_index - instance.first_file_index + 1
                 )
-                if duplicates.exists():
-                    instance = duplicates.first()
-                else:
-                    instance.first_file_index = min_first_index
-                    instance.last_file_index = max_last_index
-                    instance.save()
-                return_ids.append(instance.id)
-                connected_ranges.exclude(id=instance.id).delete()
+                updated.append(instance)
+            deleted_ids += [r.id for r in group if r.id != instance.id]
+            changed_annotators.setdefault(
+                instance.annotation_campaign_phase_id, set()
+            ).add(instance.annotator_id)
+
+        # Not the model delete: it would remove the tasks of the deleted ranges
+        AnnotationFileRange.objects.filter(id__in=deleted_ids).delete()
+        AnnotationFileRange.objects.bulk_update(
+            updated,
+            fields=[
+                "first_file_index",
+                "first_file_id",
+                "last_file_index",
+                "last_file_id",
+                "files_count",
+            ],
+        )
+        for phase_id, annotator_ids in changed_annotators.items():
+            PhaseProgress.objects.refresh(phase_id, annotator_ids)
         return AnnotationFileRange.objects.filter(id__in=return_ids)
 
     @staticmethod
@@ -244,6 +335,124 @@ class AnnotationFileRange(models.Model):
         )
 
 
+class PhaseProgressManager(models.Manager):
+    """Keep phase progress counters up to date"""
+
+    def refresh(self, phase_id: int, annotator_ids: Iterable[int]):
+        """Compute again the counters of the given annotators and the phase global ones"""
+        annotator_ids = set(annotator_ids)
+        totals = dict(
+            AnnotationFileRange.objects.filter(
+                annotation_campaign_phase_id=phase_id, annotator_id__in=annotator_ids
+            )
+            .values("annotator_id")
+            .annotate(total=Sum("files_count"))
+            .values_list("annotator_id", "total")
+        )
+        progresses = dict(
+            AnnotationTask.objects.filter(
+                annotation_campaign_phase_id=phase_id,
+                annotator_id__in=annotator_ids,
+                status=AnnotationTask.Status.FINISHED,
+            )
+            .values("annotator_id")
+            .annotate(progress=Count("id"))
+            .values_list("annotator_id", "progress")
+        )
+        for annotator_id in annotator_ids:
+            self.update_or_create(
+                phase_id=phase_id,
+                annotator_id=annotator_id,
+                defaults={
+                    "total": totals.get(annotator_id, 0),
+                    "progress": progresses.get(annotator_id, 0),
+                },
+            )
+        # Each file range and task belongs to one annotator
+        self.update_or_create(
+            phase_id=phase_id,
+            annotator_id=None,
+            defaults=self.filter(phase_id=phase_id, annotator__isnull=False).aggregate(
+                total=Coalesce(Sum("total"), 0),
+                progress=Coalesce(Sum("progress"), 0),
+            ),
+        )
+
+    def update_tasks_status(
+        self, tasks: QuerySet[AnnotationTask], status: AnnotationTask.Status
+    ) -> int:
+        """Update the status of the tasks and the progress counters accordingly"""
+        if status == AnnotationTask.Status.FINISHED:
+            changed, sign = tasks.exclude(status=status), 1
+        else:
+            changed, sign = tasks.filter(status=AnnotationTask.Status.FINISHED), -1
+        deltas = list(
+            changed.order_by()
+            .values("annotation_campaign_phase_id", "annotator_id")
+            .annotate(count=Count("id"))
+        )
+        updated = tasks.update(status=status)
+        for delta in deltas:
+            self.add_progress(
+                delta["annotation_campaign_phase_id"],
+                delta["annotator_id"],
+                sign * delta["count"],
+            )
+        return updated
+
+    def add_progress(self, phase_id: int, annotator_id: int, count: int):
+        """Add finished tasks to the annotator and global counters"""
+        updated = self.filter(phase_id=phase_id, annotator_id=annotator_id).update(
+            progress=F("progress") + count
+        )
+        if not updated:
+            # Counters not initialized yet
+            self.refresh(phase_id, [annotator_id])
+            return
+        self.filter(phase_id=phase_id, annotator__isnull=True).update(
+            progress=F("progress") + count
+        )
+
+
+class PhaseProgress(models.Model):
+    """
+    This table contains the progress counters of a phase: the number of files to annotate
+    and of finished tasks, for each annotator and for the whole phase (without annotator).
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["phase", "annotator"],
+                name="phase_progress_annotator_unicity",
+            ),
+            models.UniqueConstraint(
+                fields=["phase"],
+                condition=Q(annotator__isnull=True),
+                name="phase_progress_global_unicity",
+            ),
+        ]
+
+    objects = PhaseProgressManager()
+
+    phase = models.ForeignKey(
+        AnnotationCampaignPhase, on_delete=models.CASCADE, related_name="progresses"
+    )
+    annotator = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="phase_progresses",
+    )
+    total = models.PositiveIntegerField(
+        default=0, help_text="Number of files in the file ranges"
+    )
+    progress = models.PositiveIntegerField(
+        default=0, help_text="Number of finished tasks"
+    )
+
+
 class AnnotationSession(models.Model):
     """
     This table contains the AudioAnnotator sessions output linked to the annotation of a specific dataset file. There
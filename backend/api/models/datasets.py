@@ -1,11 +1,27 @@
 """Dataset-related models"""
-from datetime import datetime
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterable
+from uuid import uuid4
 
 from django.conf import settings
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.core.cache import caches
 from django.db import models
-from django.db.models import QuerySet, Q
+from django.db.models import QuerySet, Func, Q, Value
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from metadatax.acquisition.models import ChannelConfiguration
+from psycopg2.extras import DateTimeTZRange
+
+DATASET_FILES_INDEXES_SIZE = 8  # Number of dataset files indexes kept in memory
+DATASET_FILES_INDEX_CHUNK_SIZE = 10_000  # Number of files fetched at once for an index
 
 
 class DatasetType(models.Model):
@@ -70,27 +86,223 @@ class Dataset(models.Model):
     related_channel_configuration = models.ManyToManyField(
         ChannelConfiguration, related_name="aplose_datasets"
     )
+    files_count = models.PositiveIntegerField(
+        default=0, help_text="Number of files, maintained when they are imported"
+    )
+
+    def update_files_count(self):
+        """Count again the dataset files"""
+        self.files_count = self.files.count()
+        Dataset.objects.filter(pk=self.pk).update(files_count=self.files_count)
+
+
+class TsTzRange(Func):
+    """Postgres time range, from start included to end excluded unless bounds are given"""
+
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_microseconds(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _from_microseconds(value: int) -> datetime:
+    return _EPOCH + value * _MICROSECOND
+
+
+class DatasetFilesIndex:
+    """Files of a dataset sorted by start: finds the files overlapping a time range
+    with a binary search
+
+    Only the ids, starts and ends are kept, as arrays of integers
+    """
+
+    def __init__(
+        self, dataset_id: int, files: Iterable[tuple[int, datetime, datetime]]
+    ):
+        self.dataset_id = dataset_id
+        self.ids = array("q")
+        self.starts = array("q")
+        self.ends = array("q")
+        for file_id, start, end in files:
+            self.ids.append(file_id)
+            self.starts.append(_to_microseconds(start))
+            self.ends.append(_to_microseconds(end))
+        # Running max of the ends: sorted, even if some files overlap
+        self.max_ends = array("q", accumulate(self.ends, max))
 
+    def __len__(self):
+        return len(self.ids)
 
-class DatasetFileManager(models.Manager):
-    """Specific ma,nager for dataset files"""
+    def _get_file(self, index: int) -> "DatasetFile":
+        return DatasetFile(
+            id=self.ids[index],
+            dataset_id=self.dataset_id,
+            start=_from_microseconds(self.starts[index]),
+            end=_from_microseconds(self.ends[index]),
+        )
+
+    def filter_matches_time_range(
+        self, start: datetime, end: datetime
+    ) -> list["DatasetFile"]:
+        """Same result as DatasetFileManager.filter_matches_time_range
+
+        Returned files only have their id, dataset, start and end
+        """
+        start, end = min(start, end), max(start, end)
+        start, end = _to_microseconds(start), _to_microseconds(end)
+        # Included: a file can end on the range start
+        low = bisect_left(self.max_ends, start)
+        high = bisect_right(self.starts, end)
+        if start == end:
+            matches = (
+                i for i in range(low, high) if self.starts[i] <= start <= self.ends[i]
+            )
+        else:
+            matches = (
+                i
+                for i in range(low, high)
+                if (self.starts[i] < end and start < self.ends[i])
+                or start <= self.starts[i] == self.ends[i] <= end
+            )
+        return [self._get_file(i) for i in matches]
+
+    def filter_matches_time_ranges(
+        self, ranges: Iterable[tuple[datetime, datetime]]
+    ) -> list[list["DatasetFile"]]:
+        """Files matching each of the (start, end) ranges"""
+        return [self.filter_matches_time_range(start, end) for start, end in ranges]
+
+
+_files_indexes: OrderedDict[int, tuple[tuple, DatasetFilesIndex]] = OrderedDict()
+_files_indexes_lock = threading.Lock()
+# Changes of these fields invalidate the files time index
+TIME_INDEX_FIELDS = {"start", "end", "dataset", "dataset_id"}
+
+
+def _files_version_key(dataset_id: int) -> str:
+    return f"dataset_files_version:{dataset_id}"
+
+
+class DatasetFileQuerySet(QuerySet):
+    """Dataset files queryset: updates and bulk creations invalidate the files time index"""
+
+    def update(self, **kwargs):
+        if TIME_INDEX_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        dataset_ids = set(
+            self.order_by().values_list("dataset_id", flat=True).distinct()
+        )
+        count = super().update(**kwargs)
+        new_dataset = kwargs.get("dataset", kwargs.get("dataset_id"))
+        if new_dataset is not None:
+            dataset_ids.add(getattr(new_dataset, "pk", new_dataset))
+        for dataset_id in dataset_ids:
+            DatasetFileManager.invalidate_time_index(dataset_id)
+        return count
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        objs = super().bulk_create(
+            objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+        )
+        for dataset_id in {obj.dataset_id for obj in objs}:
+            DatasetFileManager.invalidate_time_index(dataset_id)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        super().bulk_update(objs, fields, batch_size=batch_size)
+        if not TIME_INDEX_FIELDS.isdisjoint(fields):
+            for dataset_id in {obj.dataset_id for obj in objs}:
+                DatasetFileManager.invalidate_time_index(dataset_id)
+
+
+class DatasetFileManager(models.Manager.from_queryset(DatasetFileQuerySet)):
+    """Specific manager for dataset files"""
+
+    def get_time_index(self, dataset_id: int) -> DatasetFilesIndex:
+        """Get the time index of the dataset files
+
+        Indexes are built on first use and kept in memory. They are rebuilt in all
+        processes when files are added, deleted or updated: each change of the files
+        must call invalidate_time_index, as done by the manager and the model signals.
+        """
+        version = self._get_shared_version(dataset_id)
+        with _files_indexes_lock:
+            if dataset_id in _files_indexes:
+                cached_version, index = _files_indexes[dataset_id]
+                if cached_version == version:
+                    _files_indexes.move_to_end(dataset_id)
+                    return index
+
+        index = DatasetFilesIndex(
+            dataset_id,
+            self.filter(dataset_id=dataset_id)
+            .order_by("start", "id")
+            .values_list("id", "start", "end")
+            .iterator(chunk_size=DATASET_FILES_INDEX_CHUNK_SIZE),
+        )
+        with _files_indexes_lock:
+            _files_indexes[dataset_id] = (version, index)
+            _files_indexes.move_to_end(dataset_id)
+            while len(_files_indexes) > DATASET_FILES_INDEXES_SIZE:
+                _files_indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _get_shared_version(dataset_id: int) -> str:
+        shared_cache = caches["shared"]
+        version = shared_cache.get(_files_version_key(dataset_id))
+        if version is None:
+            shared_cache.add(_files_version_key(dataset_id), uuid4().hex, timeout=None)
+            version = shared_cache.get(_files_version_key(dataset_id))
+        return version
+
+    @staticmethod
+    def invalidate_time_index(dataset_id: int):
+        """Force the rebuild of the dataset files time index, in all processes"""
+        caches["shared"].set(_files_version_key(dataset_id), uuid4().hex, timeout=None)
+
+    def filter_matches_time_ranges(
+        self, dataset_id: int, ranges: Iterable[tuple[datetime, datetime]]
+    ) -> list[list["DatasetFile"]]:
+        """Get files of the dataset matching each of the (start, end) ranges, in memory"""
+        return self.get_time_index(dataset_id).filter_matches_time_ranges(ranges)
 
     def filter_matches_time_range(
         self, start: datetime, end: datetime
     ) -> QuerySet["DatasetFile"]:
-        """Get files from absolute start and ends"""
-        return self.filter(
-            Q(start__lte=start, end__gt=start)
-            | Q(start__gte=start, end__lte=end)
-            | Q(start__lt=end, end__gte=end)
-        ).order_by("start", "id")
+        """Get files from absolute start and ends
+
+        Files overlap the range if they share more than a bound with it, or if they are
+        within the range, bounds included (zero-length files). A single datetime matches
+        the files containing it, bounds included.
+        Both conditions use the files time range index.
+        """
+        start, end = min(start, end), max(start, end)
+        if start == end:
+            condition = Q(time_range__overlap=DateTimeTZRange(start, end, "[]"))
+        else:
+            condition = Q(time_range__overlap=DateTimeTZRange(start, end, "()")) | Q(
+                time_range__contained_by=DateTimeTZRange(start, end, "[]")
+            )
+        return (
+            self.alias(time_range=TsTzRange("start", "end", Value("[]")))
+            .filter(condition)
+            .order_by("start", "id")
+        )
 
     def filter_for_file_range(self, file_range: "AnnotationFileRange"):
-        """Get files for a given file range"""
+        """Get files for a given file range, from the campaign file index"""
         return self.filter(
-            dataset__in=file_range.annotation_campaign_phase.annotation_campaign.datasets.all(),
-            id__gte=file_range.first_file_id,
-            id__lte=file_range.last_file_id,
+            campaign_index__campaign_id=file_range.annotation_campaign_phase.annotation_campaign_id,
+            campaign_index__ordinal__gte=file_range.first_file_index,
+            campaign_index__ordinal__lte=file_range.last_file_index,
         )
 
 
@@ -108,6 +320,16 @@ class DatasetFile(models.Model):
     class Meta:
         db_table = "dataset_files"
         ordering = ("start", "id")
+        indexes = [
+            GistIndex(
+                TsTzRange("start", "end", Value("[]")),
+                name="dataset_files_time_range_idx",
+            ),
+            models.Index(
+                fields=["dataset", "start", "end"],
+                name="dataset_files_dataset_time_idx",
+            ),
+        ]
 
     def __str__(self):
         return str(self.filename)
@@ -128,3 +350,59 @@ class DatasetFile(models.Model):
         # Pylint can't follow foreign keys when using string identifiers instead of model
         # pylint: disable=no-member
         return self.dataset.audio_metadatum.dataset_sr
+
+
+@receiver(post_save, sender=DatasetFile)
+@receiver(post_delete, sender=DatasetFile)
+def invalidate_dataset_files_index(sender, instance: DatasetFile, **kwargs):
+    """File may have been added, deleted, or its start or end changed"""
+    # pylint: disable=unused-argument
+    DatasetFile.objects.invalidate_time_index(instance.dataset_id)
+
+
+class DatasetImportJob(models.Model):
+    """
+    This table represents the background import of datasets from datawork.
+    Each dataset is created in its own transaction, so that the progress can be followed.
+    """
+
+    class Status(models.TextChoices):
+        """Status of the import"""
+
+        PENDING = ("P", "Pending")
+        RUNNING = ("R", "Running")
+        DONE = ("D", "Done")
+        FAILED = ("F", "Failed")
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    wanted_datasets = models.JSONField(help_text="Names of the datasets to import")
+    status = models.TextField(choices=Status.choices, default=Status.PENDING)
+    datasets_count = models.PositiveIntegerField(
+        default=0, help_text="Number of new datasets to import"
+    )
+    imported_datasets_count = models.PositiveIntegerField(default=0)
+    files_count = models.PositiveIntegerField(
+        default=0, help_text="Number of imported files"
+    )
+    datasets = models.ManyToManyField(
+        Dataset, blank=True, related_name="import_jobs", help_text="Imported datasets"
+    )
+    errors = models.JSONField(
+        default=list, help_text="Errors of the datasets which could not be imported"
+    )
+    spectro_configs_update = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Result of the spectrogram configurations update, run after the import",
+    )
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="dataset_import_jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
@@ -4,6 +4,7 @@ DRF serializers module to be used in viewsets
 
 from backend.api.serializers.dataset import (
     DatasetSerializer,
+    DatasetImportJobSerializer,
 )
 from backend.api.serializers.label_set import LabelSetSerializer
 from .annotation import *
@@ -12,9 +12,14 @@ from .detector import (
     DetectorSerializer,
     DetectorConfigurationSerializer,
 )
+from .detection_import import (
+    DetectionImportPartSerializer,
+    DetectionImportSessionSerializer,
+)
 from .file_range import (
     AnnotationFileRangeSerializer,
 )
+from .report import PhaseReportJobSerializer
 from .result import (
     AnnotationResultSerializer,
     AnnotationResultImportListSerializer,
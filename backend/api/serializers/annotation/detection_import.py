@@ -0,0 +1,34 @@
+"""Detection import serializers"""
+from rest_framework import serializers
+
+from backend.api.models import DetectionImportPart, DetectionImportSession
+from backend.utils.serializers import EnumField
+
+
+class DetectionImportSessionSerializer(serializers.ModelSerializer):
+    """Serializer for chunked detection import session"""
+
+    status = EnumField(enum=DetectionImportSession.Status, read_only=True)
+
+    class Meta:
+        model = DetectionImportSession
+        exclude = ("header", "created_by")
+        read_only_fields = (
+            "phase",
+            "parts_count",
+            "committed_parts_count",
+            "rows_count",
+            "staged_rows_count",
+            "imported_count",
+            "error",
+            "created_at",
+            "updated_at",
+        )
+
+
+class DetectionImportPartSerializer(serializers.ModelSerializer):
+    """Serializer for a received part of a detection import, without its staged rows"""
+
+    class Meta:
+        model = DetectionImportPart
+        exclude = ("data", "content_hash")
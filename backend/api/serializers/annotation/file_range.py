@@ -1,4 +1,5 @@
 """Serializer for annotation file range"""
+from typing import Optional
 
 from django.db.models import QuerySet, Q
 from rest_framework import serializers
@@ -7,7 +8,9 @@ from backend.api.models import (
     AnnotationFileRange,
     AnnotationTask,
     AnnotationCampaign,
+    AnnotationCampaignFile,
     AnnotationCampaignPhase,
+    PhaseProgress,
 )
 from backend.aplose.models import User
 from backend.utils.serializers import EnumField
@@ -77,6 +80,24 @@ class AnnotationFileRangeListSerializer(serializers.ListSerializer):
                 serializers_list.append(serializer)
         return serializers_list
 
+    def resolve_file_ids(self, serializers_list: list[serializers.ModelSerializer]):
+        """Resolve the file ids of all the ranges indexes, in one query for each campaign"""
+        indexes: dict[int, set[int]] = {}
+        for serializer in serializers_list:
+            data = serializer.validated_data
+            indexes.setdefault(
+                data["annotation_campaign_phase"].annotation_campaign_id, set()
+            ).update((data["first_file_index"], data["last_file_index"]))
+        file_ids = {
+            campaign_id: AnnotationCampaignFile.get_file_ids(
+                campaign_id, campaign_indexes
+            )
+            for campaign_id, campaign_indexes in indexes.items()
+        }
+        for serializer in serializers_list:
+            serializer.context["file_ids"] = file_ids
+            serializer.get_file_ids(serializer.validated_data)
+
     def update(
         self,
         instance: QuerySet[AnnotationFileRange],
@@ -87,7 +108,15 @@ class AnnotationFileRangeListSerializer(serializers.ListSerializer):
         serializers_list = self.prepare_updates_and_creates(instance, validated_data)
 
         # Execution
+        self.resolve_file_ids(serializers_list)
+        deleted_annotators: dict[int, set[int]] = {}
+        for phase_id, annotator_id in deleted_ranges.values_list(
+            "annotation_campaign_phase_id", "annotator_id"
+        ):
+            deleted_annotators.setdefault(phase_id, set()).add(annotator_id)
         deleted_ranges.delete()
+        for phase_id, annotator_ids in deleted_annotators.items():
+            PhaseProgress.objects.refresh(phase_id, annotator_ids)
         instances = []
         for serializer in serializers_list:
             serializer.save()
@@ -114,13 +143,49 @@ class AnnotationFileRangeSerializer(serializers.ModelSerializer):
         exclude = ("first_file_id", "last_file_id")
         list_serializer_class = AnnotationFileRangeListSerializer
 
+    def get_file_ids(self, validated_data: dict) -> dict[int, int]:
+        """Get the file ids of the range indexes ({index: file id})
+
+        Fails if an index is not part of the campaign file index: the campaign files count
+        can be outdated
+        """
+        campaign_id = validated_data["annotation_campaign_phase"].annotation_campaign_id
+        indexes = {
+            validated_data["first_file_index"],
+            validated_data["last_file_index"],
+        }
+        file_ids: Optional[dict[int, int]] = self.context.get("file_ids", {}).get(
+            campaign_id
+        )
+        if file_ids is None or not indexes <= file_ids.keys():
+            file_ids = AnnotationCampaignFile.get_file_ids(campaign_id, indexes)
+        errors = {
+            field: "This file doesn't exist in the campaign"
+            for field in ("first_file_index", "last_file_index")
+            if validated_data[field] not in file_ids
+        }
+        if errors:
+            raise serializers.ValidationError(errors, code="max_value")
+        return file_ids
+
+    def create(self, validated_data):
+        instance = AnnotationFileRange(**validated_data)
+        instance.save(force_insert=True, file_ids=self.get_file_ids(validated_data))
+        return instance
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(file_ids=self.get_file_ids(validated_data))
+        return instance
+
     def check_max_value(self, data: dict):
         """Check file indexes doesn't go higher than campaign has files"""
         max_value_errors = {}
         campaign: AnnotationCampaign = data[
             "annotation_campaign_phase"
         ].annotation_campaign
-        max_files = campaign.get_sorted_files().count()
+        max_files = campaign.files_count
         if data["first_file_index"] >= max_files:
             max_value_errors = {
                 **max_value_errors,
@@ -0,0 +1,24 @@
+"""Report serializers"""
+from rest_framework import serializers
+
+from backend.api.models import PhaseReportJob
+from backend.utils.serializers import EnumField
+
+
+class PhaseReportJobSerializer(serializers.ModelSerializer):
+    """Serializer for phase report job"""
+
+    type = EnumField(enum=PhaseReportJob.Type)
+    status = EnumField(enum=PhaseReportJob.Status, read_only=True)
+
+    class Meta:
+        model = PhaseReportJob
+        exclude = ("path", "fingerprint", "created_by")
+        read_only_fields = (
+            "phase",
+            "content_hash",
+            "size",
+            "error",
+            "created_at",
+            "finished_at",
+        )
@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 from typing import Optional, Union
 
 from django.db import transaction
-from django.db.models import QuerySet
 from rest_framework import serializers
 from rest_framework.fields import empty
 
@@ -13,6 +12,7 @@ from backend.api.models import (
     AnnotationCampaign,
     ConfidenceIndicator,
     DatasetFile,
+    DatasetFilesIndex,
     AnnotationComment,
     AnnotationResultValidation,
     Dataset,
@@ -30,23 +30,47 @@ from backend.aplose.models import User
 from backend.aplose.models.user import ExpertiseLevel
 from backend.utils.serializers import (
     ListSerializer,
-    SlugRelatedGetOrCreateField,
+    CachedSlugRelatedField,
+    CachedSlugRelatedGetOrCreateField,
     EnumField,
 )
 from .comment import AnnotationCommentSerializer
 from ...models.annotation.result import AnnotationResultType
 
 
+IMPORT_BATCH_SIZE = 5000
+# Fields identifying an imported result: existing ones are not imported again
+# pylint: disable=duplicate-code
+IMPORT_KEY_FIELDS = (
+    "dataset_file_id",
+    "label_id",
+    "confidence_indicator_id",
+    "detector_configuration_id",
+    "type",
+    "start_time",
+    "end_time",
+    "start_frequency",
+    "end_frequency",
+)
+# pylint: enable=duplicate-code
+
+
 def to_seconds(delta: timedelta) -> float:
     """Format seconds timedelta as float"""
     return delta.seconds + delta.microseconds / 1000000
 
 
+def _get_import_key(values: tuple) -> tuple:
+    # Result type can be an enum member: its hash differs from its value's one
+    type_index = IMPORT_KEY_FIELDS.index("type")
+    return (*values[:type_index], str(values[type_index]), *values[type_index + 1 :])
+
+
 class AnnotationResultImportSerializer(serializers.Serializer):
     """Annotation result serializer for detection importation"""
 
     is_box = serializers.BooleanField()
-    dataset = serializers.SlugRelatedField(
+    dataset = CachedSlugRelatedField(
         queryset=Dataset.objects.all(),
         slug_field="name",
     )
@@ -60,7 +84,7 @@ class AnnotationResultImportSerializer(serializers.Serializer):
         allow_null=True,
         required=False,
     )
-    label = SlugRelatedGetOrCreateField(
+    label = CachedSlugRelatedGetOrCreateField(
         queryset=Label.objects,
         slug_field="name",
     )
@@ -69,11 +93,24 @@ class AnnotationResultImportSerializer(serializers.Serializer):
     class Meta:
         list_serializer_class = ListSerializer
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Resolved once for all the imported rows
+        self._files_indexes: dict[int, DatasetFilesIndex] = {}
+        self._detector_configurations: dict[tuple, DetectorConfiguration] = {}
+        self._campaign_labels: set[int] = set()
+        self._confidence_indicators: dict[tuple, ConfidenceIndicator] = {}
+
     def get_fields(self):
         fields = super().get_fields()
         phase: AnnotationCampaignPhase = self.context["phase"]
 
-        fields["dataset"].queryset = phase.annotation_campaign.datasets
+        fields["dataset"].queryset = phase.annotation_campaign.datasets.select_related(
+            "audio_metadatum"
+        )
+        if self.context.get("stage"):
+            # Labels are only created when the staged rows are imported
+            fields["label"] = serializers.CharField()
 
         return fields
 
@@ -97,9 +134,13 @@ class AnnotationResultImportSerializer(serializers.Serializer):
         dataset = attrs["dataset"]
         start = attrs["start_datetime"]
         end = attrs["end_datetime"]
-        dataset_files = DatasetFile.objects.filter_matches_time_range(
+        if dataset.id not in self._files_indexes:
+            self._files_indexes[dataset.id] = DatasetFile.objects.get_time_index(
+                dataset.id
+            )
+        dataset_files = self._files_indexes[dataset.id].filter_matches_time_range(
             start, end
-        ).filter(dataset=dataset)
+        )
         if not dataset_files:
             if force:
                 return None
@@ -166,7 +207,7 @@ class AnnotationResultImportSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         return AnnotationResult.objects.bulk_create(
-            self.get_create_instances(validated_data)
+            self.exclude_existing(self.get_create_instances(validated_data))
         )
 
     def _get_bounds(self, validated_data, file: DatasetFile) -> dict:
@@ -190,14 +231,15 @@ class AnnotationResultImportSerializer(serializers.Serializer):
         end_frequency = (
             validated_data["max_frequency"]
             if "max_frequency" in validated_data and is_box
-            else file.dataset.audio_metadatum.dataset_sr / 2
+            else validated_data["dataset"].audio_metadatum.dataset_sr / 2
         )
 
         if (
             start_time == 0
             and end_time == to_seconds(file.end - file.start)
             and start_frequency == 0
-            and end_frequency == file.dataset.audio_metadatum.dataset_sr / 2
+            and end_frequency
+            == validated_data["dataset"].audio_metadatum.dataset_sr / 2
         ):
             return {"type": AnnotationResultType.WEAK}
         if start_time == end_time and (
@@ -216,18 +258,27 @@ class AnnotationResultImportSerializer(serializers.Serializer):
             "end_frequency": end_frequency,
         }
 
-    def get_create_instances(self, validated_data) -> list[AnnotationResult]:
-        """Get instances to be created"""
-        is_box: bool = validated_data["is_box"]
+    def get_detector_configuration(
+        self, detector_name: str, configuration: str
+    ) -> DetectorConfiguration:
+        """Get or create the detector configuration, once for each distinct value"""
+        key = (detector_name, configuration)
+        if key not in self._detector_configurations:
+            detector, _ = Detector.objects.get_or_create(name=detector_name)
+            (
+                self._detector_configurations[key],
+                _,
+            ) = DetectorConfiguration.objects.get_or_create(
+                detector=detector,
+                configuration=configuration,
+            )
+        return self._detector_configurations[key]
 
-        files: QuerySet[DatasetFile] = validated_data["files"]
+    def add_campaign_label(self, label: Label):
+        """Add the label to the campaign label set, once for each distinct label"""
+        if label.id in self._campaign_labels:
+            return
         phase: AnnotationCampaignPhase = self.context["phase"]
-        detector, _ = Detector.objects.get_or_create(name=validated_data["detector"])
-        detector_config, _ = DetectorConfiguration.objects.get_or_create(
-            detector=detector,
-            configuration=validated_data["detector_config"],
-        )
-        label, _ = Label.objects.get_or_create(name=validated_data["label"])
         if not phase.annotation_campaign.label_set.labels.filter(id=label.id).exists():
             if phase.annotation_campaign.label_set.annotationcampaign_set.count() > 1:
                 old_label_set = phase.annotation_campaign.label_set
@@ -237,69 +288,118 @@ class AnnotationResultImportSerializer(serializers.Serializer):
                 )
                 phase.annotation_campaign.save()
             phase.annotation_campaign.label_set.labels.add(label)
+        self._campaign_labels.add(label.id)
+
+    def get_confidence_indicator(self, data: dict) -> ConfidenceIndicator:
+        """Get or create the confidence indicator and add it to the campaign set,
+        once for each distinct value"""
+        key = (data.get("label"), data.get("level"))
+        if key in self._confidence_indicators:
+            return self._confidence_indicators[key]
+        phase: AnnotationCampaignPhase = self.context["phase"]
+        confidence_indicator, _ = ConfidenceIndicator.objects.get_or_create(
+            label=data.get("label"),
+            level=data.get("level"),
+        )
+        if phase.annotation_campaign.confidence_indicator_set is None:
+            phase.annotation_campaign.confidence_indicator_set = (
+                self.get_confidence_set(name=phase.annotation_campaign.name)
+            )
+            phase.annotation_campaign.save()
+        elif not phase.annotation_campaign.confidence_indicator_set.confidence_indicators.filter(
+            id=confidence_indicator.id
+        ).exists():
+            if (
+                phase.annotation_campaign.confidence_indicator_set.annotationcampaign_set.count()
+                > 1
+            ):
+                old_set = phase.annotation_campaign.confidence_indicator_set
+                phase.annotation_campaign.confidence_indicator_set = (
+                    self.get_confidence_set(name=phase.annotation_campaign.name)
+                )
+                for indicator in old_set.confidence_indicators.all():
+                    ConfidenceIndicatorSetIndicator.objects.get_or_create(
+                        confidence_indicator=indicator,
+                        confidence_indicator_set=phase.annotation_campaign.confidence_indicator_set,
+                    )
+                phase.annotation_campaign.save()
+        ConfidenceIndicatorSetIndicator.objects.get_or_create(
+            confidence_indicator=confidence_indicator,
+            confidence_indicator_set=phase.annotation_campaign.confidence_indicator_set,
+        )
+        self._confidence_indicators[key] = confidence_indicator
+        return confidence_indicator
+
+    def get_create_instances(self, validated_data) -> list[AnnotationResult]:
+        """Get instances to be created, without checking the existing results"""
+        is_box: bool = validated_data["is_box"]
+
+        files: list[DatasetFile] = validated_data["files"]
+        phase: AnnotationCampaignPhase = self.context["phase"]
+        detector_config = self.get_detector_configuration(
+            validated_data["detector"], validated_data["detector_config"]
+        )
+        label: Label = validated_data["label"]
+        self.add_campaign_label(label)
         confidence_indicator = None
         if (
             "confidence_indicator" in validated_data
             and validated_data["confidence_indicator"] is not None
         ):
-            confidence_indicator, _ = ConfidenceIndicator.objects.get_or_create(
-                label=validated_data["confidence_indicator"].get("label"),
-                level=validated_data["confidence_indicator"].get("level"),
+            confidence_indicator = self.get_confidence_indicator(
+                validated_data["confidence_indicator"]
             )
-            if phase.annotation_campaign.confidence_indicator_set is None:
-                phase.annotation_campaign.confidence_indicator_set = (
-                    self.get_confidence_set(name=phase.annotation_campaign.name)
+
+        if not is_box and len(files) == 1:
+            return [
+                AnnotationResult(
+                    annotation_campaign_phase=phase,
+                    detector_configuration=detector_config,
+                    label=label,
+                    confidence_indicator=confidence_indicator,
+                    dataset_file=files[0],
+                    type=AnnotationResultType.WEAK,
                 )
-                phase.annotation_campaign.save()
-            elif not phase.annotation_campaign.confidence_indicator_set.confidence_indicators.filter(
-                id=confidence_indicator.id
-            ).exists():
-                if (
-                    phase.annotation_campaign.confidence_indicator_set.annotationcampaign_set.count()
-                    > 1
-                ):
-                    old_set = phase.annotation_campaign.confidence_indicator_set
-                    phase.annotation_campaign.confidence_indicator_set = (
-                        self.get_confidence_set(name=phase.annotation_campaign.name)
-                    )
-                    for indicator in old_set.confidence_indicators.all():
-                        ConfidenceIndicatorSetIndicator.objects.get_or_create(
-                            confidence_indicator=indicator,
-                            confidence_indicator_set=phase.annotation_campaign.confidence_indicator_set,
-                        )
-                    phase.annotation_campaign.save()
-            ConfidenceIndicatorSetIndicator.objects.get_or_create(
-                confidence_indicator=confidence_indicator,
-                confidence_indicator_set=phase.annotation_campaign.confidence_indicator_set,
-            )
+            ]
 
-        if not is_box and files.count() == 1:
-            params = {
-                "annotation_campaign_phase": phase,
-                "detector_configuration": detector_config,
-                "label": label,
-                "confidence_indicator": confidence_indicator,
-                "dataset_file": files.first(),
-                "type": AnnotationResultType.WEAK,
-            }
-            if AnnotationResult.objects.filter(**params).exists():
-                return []
-            return [AnnotationResult(**params)]
-
-        instances = []
-        for file in files:
-            params = {
-                "annotation_campaign_phase": phase,
-                "detector_configuration": detector_config,
-                "label": label,
-                "confidence_indicator": confidence_indicator,
-                "dataset_file": file,
+        return [
+            AnnotationResult(
+                annotation_campaign_phase=phase,
+                detector_configuration=detector_config,
+                label=label,
+                confidence_indicator=confidence_indicator,
+                dataset_file=file,
                 **self._get_bounds(validated_data, file),
-            }
-            if not AnnotationResult.objects.filter(**params).exists():
-                instances.append(AnnotationResult(**params))
+            )
+            for file in files
+        ]
 
-        return instances
+    def exclude_existing(
+        self, instances: list[AnnotationResult]
+    ) -> list[AnnotationResult]:
+        """Remove the instances already existing in the phase, with a single query"""
+        if not instances:
+            return []
+        phase: AnnotationCampaignPhase = self.context["phase"]
+        existing = {
+            _get_import_key(values)
+            for values in AnnotationResult.objects.filter(
+                annotation_campaign_phase=phase,
+                detector_configuration_id__in={
+                    instance.detector_configuration_id for instance in instances
+                },
+            )
+            .values_list(*IMPORT_KEY_FIELDS)
+            .iterator(chunk_size=IMPORT_BATCH_SIZE)
+        }
+        return [
+            instance
+            for instance in instances
+            if _get_import_key(
+                tuple(getattr(instance, field) for field in IMPORT_KEY_FIELDS)
+            )
+            not in existing
+        ]
 
     def update(self, instance, validated_data):
         raise NotImplementedError("`update()` must be implemented.")
@@ -324,7 +424,9 @@ class AnnotationResultImportListSerializer(ListSerializer):
             for attrs in validated_data
             for instance in self.child.get_create_instances(attrs)
         ]
-        return AnnotationResult.objects.bulk_create(instances)
+        return AnnotationResult.objects.bulk_create(
+            self.child.exclude_existing(instances), batch_size=IMPORT_BATCH_SIZE
+        )
 
 
 class AnnotationResultValidationSerializer(serializers.ModelSerializer):
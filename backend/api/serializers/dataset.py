@@ -4,7 +4,9 @@ from rest_framework import serializers
 
 from backend.api.models import (
     Dataset,
+    DatasetImportJob,
 )
+from backend.utils.serializers import EnumField
 from .data import SpectrogramConfigurationSerializer
 
 # Serializers have too many false-positives on the following warnings:
@@ -46,3 +48,24 @@ class SimpleSerializer(serializers.ModelSerializer):
     class Meta:
         model = None
         fields = "__all__"
+
+
+class DatasetImportJobSerializer(serializers.ModelSerializer):
+    """Serializer for dataset import job"""
+
+    status = EnumField(enum=DatasetImportJob.Status, read_only=True)
+
+    class Meta:
+        model = DatasetImportJob
+        exclude = ("created_by",)
+        read_only_fields = (
+            "wanted_datasets",
+            "datasets_count",
+            "imported_datasets_count",
+            "files_count",
+            "datasets",
+            "errors",
+            "spectro_configs_update",
+            "created_at",
+            "finished_at",
+        )
@@ -1,3 +1,4 @@
 """Models test case"""
 from .annotation import *
 from .metadata import MetadataTestCase
+from .datasets import DatasetFilesIndexTestCase, FilesCountTestCase
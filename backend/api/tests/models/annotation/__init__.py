@@ -1,3 +1,4 @@
 # pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring
 from .campaign import AnnotationCampaignModelTestCase
-from .tasks import AnnotationFileRangeTestCase
+from .result import AnnotationResultModelTestCase
+from .tasks import AnnotationFileRangeTestCase, PhaseProgressTestCase
@@ -0,0 +1,33 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring
+from django.test import TestCase
+
+from backend.api.models import AnnotationResult, AnnotationCampaign
+from backend.aplose.models import AploseUser, ExpertiseLevel
+from backend.utils.tests import all_fixtures
+
+
+class AnnotationResultModelTestCase(TestCase):
+    fixtures = all_fixtures
+
+    def _create_result(self) -> AnnotationResult:
+        return AnnotationResult.objects.create(
+            label=AnnotationCampaign.objects.get(pk=1).label_set.labels.first(),
+            annotation_campaign_phase_id=1,
+            annotator_id=4,
+            dataset_file_id=9,
+        )
+
+    def test_expertise_level_cached(self):
+        level = self._create_result().annotator_expertise_level
+        with self.assertNumQueries(1):  # Insert only
+            result = self._create_result()
+        self.assertEqual(result.annotator_expertise_level, level)
+
+    def test_expertise_level_updated(self):
+        self._create_result()
+        AploseUser.objects.update_or_create(
+            user_id=4, defaults={"expertise_level": ExpertiseLevel.EXPERT}
+        )
+        self.assertEqual(
+            self._create_result().annotator_expertise_level, ExpertiseLevel.EXPERT
+        )
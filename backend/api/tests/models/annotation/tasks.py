@@ -1,7 +1,13 @@
 # pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring
 from django.test import TestCase
 
-from backend.api.models import AnnotationTask, AnnotationFileRange
+from backend.api.models import (
+    AnnotationCampaign,
+    AnnotationCampaignFile,
+    AnnotationTask,
+    AnnotationFileRange,
+    PhaseProgress,
+)
 from backend.utils.tests import all_fixtures
 
 
@@ -41,3 +47,129 @@ class AnnotationFileRangeTestCase(TestCase):
         file_range.delete()
         self.assertEqual(AnnotationFileRange.objects.count(), 6)
         self.assertEqual(AnnotationTask.objects.count(), 13)
+
+    def test_get_file_ids(self):
+        campaign = AnnotationCampaign.objects.get(pk=1)
+        files = list(campaign.get_sorted_files().values_list("id", flat=True))
+        self.assertEqual(
+            AnnotationCampaignFile.get_file_ids(campaign.id, [0, 4, 10, 11]),
+            {0: files[0], 4: files[4], 10: files[10]},
+        )
+
+    def test_save_with_resolved_file_ids(self):
+        file_range = AnnotationFileRange.objects.get(pk=1)
+        file_range.last_file_index = 8
+        file_range.save(
+            file_ids=AnnotationCampaignFile.get_file_ids(1, [0, 8, 9]),
+        )
+        file_range.refresh_from_db()
+        self.assertEqual(
+            file_range.last_file_id,
+            AnnotationCampaign.objects.get(pk=1).get_sorted_files()[8].id,
+        )
+        self.assertEqual(file_range.files_count, 9)
+
+    def _create_range(self, first: int, last: int, annotator_id: int):
+        return AnnotationFileRange.objects.create(
+            first_file_index=first,
+            last_file_index=last,
+            annotation_campaign_phase_id=1,
+            annotator_id=annotator_id,
+        )
+
+    def test_clean_connected_ranges(self):
+        created = [
+            self._create_range(8, 9, 1),
+            self._create_range(6, 7, 1),
+            self._create_range(2, 4, 4),
+        ]
+        self.assertEqual(AnnotationFileRange.objects.count(), 9)
+
+        merged = AnnotationFileRange.clean_connected_ranges(
+            [
+                {
+                    "id": r.id,
+                    "annotation_campaign_phase": 1,
+                    "annotator": r.annotator_id,
+                }
+                for r in created
+            ]
+        )
+
+        self.assertEqual(AnnotationFileRange.objects.count(), 7)
+        self.assertEqual(AnnotationTask.objects.count(), 13)
+        self.assertEqual(
+            list(
+                merged.order_by("first_file_index").values_list(
+                    "id", "first_file_index", "last_file_index", "files_count"
+                )
+            ),
+            [(1, 0, 9, 10), (created[2].id, 2, 4, 3)],
+        )
+        self.assertEqual(
+            list(
+                AnnotationFileRange.objects.filter(
+                    annotation_campaign_phase_id=1, annotator_id=4
+                ).values_list("first_file_index", "last_file_index")
+            ),
+            [(2, 4), (6, 9)],
+        )
+        self.assertEqual(
+            PhaseProgress.objects.get(phase_id=1, annotator_id=1).total, 10
+        )
+
+
+class PhaseProgressTestCase(TestCase):
+    fixtures = all_fixtures
+
+    def _get_counters(self, phase_id: int, annotator_id=None) -> tuple[int, int]:
+        progress = PhaseProgress.objects.get(
+            phase_id=phase_id, annotator_id=annotator_id
+        )
+        return progress.total, progress.progress
+
+    def test_refresh_matches_fixtures(self):
+        counters = {
+            (progress.phase_id, progress.annotator_id): (
+                progress.total,
+                progress.progress,
+            )
+            for progress in PhaseProgress.objects.all()
+        }
+        PhaseProgress.objects.refresh(1, [1, 4])
+        PhaseProgress.objects.refresh(2, [1, 4])
+        PhaseProgress.objects.refresh(5, [1, 4])
+        self.assertEqual(
+            {
+                (progress.phase_id, progress.annotator_id): (
+                    progress.total,
+                    progress.progress,
+                )
+                for progress in PhaseProgress.objects.all()
+            },
+            counters,
+        )
+
+    def test_update_tasks_status(self):
+        tasks = AnnotationTask.objects.filter(
+            annotation_campaign_phase_id=1, annotator_id=1
+        )
+        PhaseProgress.objects.update_tasks_status(tasks, AnnotationTask.Status.FINISHED)
+        finished = tasks.count()
+        self.assertEqual(self._get_counters(1, 1), (6, finished))
+        self.assertEqual(self._get_counters(1), (10, finished))
+
+        PhaseProgress.objects.update_tasks_status(tasks, AnnotationTask.Status.CREATED)
+        self.assertEqual(self._get_counters(1, 1), (6, 0))
+        self.assertEqual(self._get_counters(1), (10, 0))
+
+    def test_file_range_changes(self):
+        file_range = AnnotationFileRange.objects.get(pk=3)
+        file_range.last_file_index -= 1
+        file_range.save()
+        self.assertEqual(self._get_counters(1, 4), (3, 0))
+        self.assertEqual(self._get_counters(1), (9, 1))
+
+        file_range.delete()
+        self.assertEqual(self._get_counters(1, 4), (0, 0))
+        self.assertEqual(self._get_counters(1), (6, 1))
@@ -0,0 +1,223 @@
+# pylint: disable=missing-module-docstring, missing-class-docstring, missing-function-docstring
+from datetime import timedelta
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from backend.api.models import (
+    AnnotationCampaign,
+    AnnotationCampaignFile,
+    AnnotationFileRange,
+    Dataset,
+    DatasetFile,
+)
+from backend.utils.tests import all_fixtures
+
+
+class DatasetFilesIndexTestCase(TestCase):
+    fixtures = all_fixtures
+
+    def _assert_same_as_query(self, start, end):
+        expected = DatasetFile.objects.filter_matches_time_range(start, end).filter(
+            dataset_id=1
+        )
+        self.assertEqual(
+            sorted(
+                f.id
+                for f in DatasetFile.objects.get_time_index(
+                    1
+                ).filter_matches_time_range(start, end)
+            ),
+            sorted(f.id for f in expected),
+        )
+
+    def test_matches_query(self):
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        for start_offset, duration in (
+            (timedelta(minutes=5), timedelta(minutes=5)),
+            (timedelta(minutes=-5), timedelta(minutes=10)),
+            (timedelta(minutes=10), timedelta(hours=3)),
+            (timedelta(days=-2), timedelta(hours=1)),
+        ):
+            start = first.start + start_offset
+            self._assert_same_as_query(start, start + duration)
+
+    def test_bounds(self):
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        for start, end, expected in (
+            (first.start, first.start, [first.id]),
+            (first.end, first.end, [first.id]),
+            (first.end, first.end + timedelta(minutes=1), []),
+            (first.start - timedelta(hours=1), first.start, []),
+            (first.end - timedelta(minutes=1), first.end, [first.id]),
+        ):
+            self.assertEqual(
+                [
+                    f.id
+                    for f in DatasetFile.objects.filter_matches_time_range(
+                        start, end
+                    ).filter(dataset_id=1)
+                ],
+                expected,
+            )
+            self._assert_same_as_query(start, end)
+
+    def test_zero_length_file(self):
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        file = DatasetFile.objects.create(
+            dataset_id=1,
+            filename="zero_length.wav",
+            filepath="zero_length.wav",
+            size=0,
+            start=first.start - timedelta(days=1),
+            end=first.start - timedelta(days=1),
+        )
+        for start, end in (
+            (file.start, file.start),
+            (file.start, file.start + timedelta(minutes=1)),
+            (file.start - timedelta(minutes=1), file.start),
+        ):
+            self.assertIn(
+                file.id,
+                [
+                    f.id
+                    for f in DatasetFile.objects.filter_matches_time_range(start, end)
+                ],
+            )
+            self._assert_same_as_query(start, end)
+        self._assert_same_as_query(
+            file.start + timedelta(minutes=1), file.start + timedelta(minutes=2)
+        )
+
+    def test_batch(self):
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        ranges = [
+            (first.start, first.start + timedelta(minutes=1)),
+            (first.start - timedelta(days=2), first.start - timedelta(days=1)),
+        ]
+        matches = DatasetFile.objects.filter_matches_time_ranges(1, ranges)
+        self.assertEqual([[f.id for f in m] for m in matches], [[first.id], []])
+
+    def test_index_is_reused(self):
+        index = DatasetFile.objects.get_time_index(1)
+        self.assertIs(DatasetFile.objects.get_time_index(1), index)
+
+    def test_invalidated_on_change(self):
+        index = DatasetFile.objects.get_time_index(1)
+        file = DatasetFile.objects.filter(dataset_id=1).order_by("start").last()
+        file.end += timedelta(days=1)
+        file.save()
+        new_index = DatasetFile.objects.get_time_index(1)
+        self.assertIsNot(index, new_index)
+        self.assertIn(
+            file.id,
+            [
+                f.id
+                for f in new_index.filter_matches_time_range(
+                    file.end - timedelta(hours=1), file.end
+                )
+            ],
+        )
+
+        file.delete()
+        self.assertNotIn(file.id, list(DatasetFile.objects.get_time_index(1).ids))
+
+    def test_invalidated_on_queryset_update(self):
+        index = DatasetFile.objects.get_time_index(1)
+        file = DatasetFile.objects.filter(dataset_id=1).order_by("start").last()
+        DatasetFile.objects.filter(pk=file.pk).update(end=file.end + timedelta(days=1))
+        new_index = DatasetFile.objects.get_time_index(1)
+        self.assertIsNot(index, new_index)
+        self.assertIn(
+            file.id,
+            [
+                f.id
+                for f in new_index.filter_matches_time_range(
+                    file.end + timedelta(hours=1), file.end + timedelta(hours=2)
+                )
+            ],
+        )
+
+    def test_invalidated_on_bulk_update(self):
+        index = DatasetFile.objects.get_time_index(1)
+        file = DatasetFile.objects.filter(dataset_id=1).order_by("start").last()
+        file.end += timedelta(days=1)
+        DatasetFile.objects.bulk_update([file], ["end"])
+        self.assertIsNot(DatasetFile.objects.get_time_index(1), index)
+
+    def test_invalidated_on_bulk_create(self):
+        index = DatasetFile.objects.get_time_index(1)
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        (file,) = DatasetFile.objects.bulk_create(
+            [
+                DatasetFile(
+                    dataset_id=1,
+                    filename="created.wav",
+                    filepath="created.wav",
+                    size=0,
+                    start=first.start - timedelta(days=1),
+                    end=first.start - timedelta(days=1) + timedelta(minutes=15),
+                )
+            ]
+        )
+        new_index = DatasetFile.objects.get_time_index(1)
+        self.assertIsNot(new_index, index)
+        self.assertIn(file.id, list(new_index.ids))
+
+
+class FilesCountTestCase(TestCase):
+    fixtures = all_fixtures
+
+    def test_fixtures_are_consistent(self):
+        call_command("check_files_count")
+
+    def test_campaign_datasets_change(self):
+        campaign = AnnotationCampaign.objects.get(pk=1)
+        campaign.datasets.remove(Dataset.objects.get(pk=1))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.files_count, 0)
+
+        campaign.datasets.add(Dataset.objects.get(pk=1))
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.files_count, 11)
+
+    def test_campaign_datasets_change_keeps_ranges_files(self):
+        campaign = AnnotationCampaign.objects.get(pk=1)
+        ranges = AnnotationFileRange.objects.filter(
+            annotation_campaign_phase__annotation_campaign=campaign
+        )
+        files = {r.id: (r.first_file_id, r.last_file_id) for r in ranges}
+        first = DatasetFile.objects.filter(dataset_id=1).order_by("start").first()
+        DatasetFile.objects.create(
+            dataset_id=2,
+            filename="earlier.wav",
+            filepath="earlier.wav",
+            size=0,
+            start=first.start - timedelta(days=1),
+            end=first.start - timedelta(days=1) + timedelta(minutes=15),
+        )
+
+        campaign.datasets.add(Dataset.objects.get(pk=2))
+        for file_range in ranges:
+            file_ids = AnnotationCampaignFile.get_file_ids(
+                campaign.id,
+                [file_range.first_file_index, file_range.last_file_index],
+            )
+            self.assertEqual(
+                (
+                    file_ids[file_range.first_file_index],
+                    file_ids[file_range.last_file_index],
+                ),
+                files[file_range.id],
+            )
+
+    def test_check_fix(self):
+        Dataset.objects.filter(pk=1).update(files_count=3)
+        AnnotationCampaign.objects.filter(pk=1).update(files_count=3)
+        with self.assertRaises(CommandError):
+            call_command("check_files_count")
+
+        call_command("check_files_count", fix=True)
+        self.assertEqual(Dataset.objects.get(pk=1).files_count, 11)
+        self.assertEqual(AnnotationCampaign.objects.get(pk=1).files_count, 11)
+        call_command("check_files_count")
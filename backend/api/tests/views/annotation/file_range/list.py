@@ -1,9 +1,12 @@
 """Test AnnotationFileRangeViewSet"""
-# pylint: disable=missing-class-docstring, missing-function-docstring, duplicate-code
+# pylint: disable=missing-class-docstring, missing-function-docstring, duplicate-code, too-many-public-methods
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from backend.api.models import AnnotationFileRange
 from backend.utils.tests import AuthenticatedTestCase, empty_fixtures, all_fixtures
 
 URL = reverse("annotation-file-range-list")
@@ -85,6 +88,52 @@ class ListFilledAdminAuthenticatedTestCase(AuthenticatedTestCase):
         self.assertEqual(response.data["results"][0]["results_count"], 3)
         self.assertEqual(response.data["results"][0]["filename"], "sound001.wav")
 
+    def test_list_for_current_user_with_files__cursor(self):
+        response = self.client.get(URL_files, {"cursor": "", "page_size": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["estimated_count"], 6)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(
+            [file["id"] for file in response.data["results"]], [1, 2, 3, 4]
+        )
+        self.assertEqual(response.data["results"][0]["results_count"], 3)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual([file["id"] for file in response.data["results"]], [5, 6])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(
+            [file["id"] for file in response.data["results"]], [1, 2, 3, 4]
+        )
+
+    def test_list_for_current_user_with_files__many_ranges(self):
+        params = {"page": 1, "page_size": 100}
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(URL_files, params)
+        queries = [query["sql"] for query in context.captured_queries]
+
+        for index in range(5):
+            AnnotationFileRange.objects.create(
+                annotation_campaign_phase_id=1,
+                annotator_id=1,
+                first_file_index=index,
+                last_file_index=index + 1,
+            )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(URL_files, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 6)
+        self.assertEqual(response.data["results"][0]["results_count"], 3)
+        # Queries do not depend on the number of ranges
+        self.assertEqual(
+            [len(query["sql"]) for query in context.captured_queries],
+            [len(query) for query in queries],
+        )
+
     # Filters
 
     def test_list_for_current_user_with_files__search_empty(self):
@@ -8,7 +8,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APITestCase
 
-from backend.api.models import AnnotationFileRange
+from backend.api.models import AnnotationCampaign, AnnotationFileRange
 from backend.utils.tests import AuthenticatedTestCase, all_fixtures
 
 URL = reverse("annotation-file-range-phase", kwargs={"phase_id": 1})
@@ -141,6 +141,19 @@ class PostCampaignOwnerAuthenticatedTestCase(PostBaseUserAuthenticatedTestCase):
 
         self.assertEqual(AnnotationFileRange.objects.count(), initial_count)
 
+    def test_post_over_range_outdated_files_count(self):
+        AnnotationCampaign.objects.filter(pk=1).update(files_count=100)
+        initial_count = AnnotationFileRange.objects.count()
+        response = self.post(
+            existing_ranges
+            + [{"first_file_index": 20, "last_file_index": 32, "annotator": 4}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data.get("first_file_index")[0].code, "max_value")
+        self.assertEqual(response.data.get("last_file_index")[0].code, "max_value")
+
+        self.assertEqual(AnnotationFileRange.objects.count(), initial_count)
+
     def test_post_wrong_limit_sort(self):
         initial_count = AnnotationFileRange.objects.count()
         response = self.post(
@@ -27,3 +27,9 @@ from .report import (
     ReportFilledAdminAuthenticatedTestCase,
     ReportFilledBaseUserAuthenticatedTestCase,
 )
+from .report_job import (
+    ReportJobUnauthenticatedTestCase,
+    ReportJobAdminAuthenticatedTestCase,
+    ReportJobPhaseOwnerAuthenticatedTestCase,
+    ReportJobBaseUserNoPhaseAuthenticatedTestCase,
+)
@@ -1,8 +1,14 @@
 """Test AnnotationCampaignViewSet"""
 import csv
 import io
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import skipIf, skipUnless
 
+from django.conf import settings
 from django.http import HttpResponse
+from django.test import override_settings
 
 # pylint: disable=missing-class-docstring, missing-function-docstring
 from django.urls import reverse
@@ -10,7 +16,9 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APITestCase
 
-from backend.api.views.annotation.phase import REPORT_HEADERS
+from backend.api.actions.report import REPORT_HEADERS
+from backend.api.actions.report_columnar import COLUMNAR_AVAILABLE
+from backend.api.models import AnnotationCampaignPhase, AnnotationResult, Label
 from backend.utils.tests import AuthenticatedTestCase, empty_fixtures, all_fixtures
 
 URL = reverse("annotation-campaign-phase-report", kwargs={"pk": 1})
@@ -18,10 +26,14 @@ URL_check = reverse("annotation-campaign-phase-report", kwargs={"pk": 5})
 URL_status = reverse("annotation-campaign-phase-report-status", kwargs={"pk": 1})
 
 
+def read_streamed_csv(response) -> list[list[str]]:
+    content = b"".join(response.streaming_content).decode("utf-8")
+    return list(csv.reader(io.StringIO(content)))
+
+
 def check_report(test: APITestCase, response: Response):
     test.assertEqual(response.status_code, status.HTTP_200_OK)
-    reader = csv.reader(io.StringIO(response.content.decode("utf-8")))
-    data = list(reader)
+    data = read_streamed_csv(response)
     test.assertEqual(len(data), 10)
     test.assertEqual(data[0], REPORT_HEADERS)
     # annotationresult id=7 ; because ordered by dataset_file__start and not id
@@ -52,8 +64,7 @@ def check_report(test: APITestCase, response: Response):
 
 def check_report_check(test: APITestCase, response: Response):
     test.assertEqual(response.status_code, status.HTTP_200_OK)
-    reader = csv.reader(io.StringIO(response.content.decode("utf-8")))
-    data = list(reader)
+    data = read_streamed_csv(response)
     test.assertEqual(len(data), 3)
     test.assertEqual(data[0], REPORT_HEADERS + ["admin", "user2"])
     test.assertEqual(
@@ -128,8 +139,7 @@ def check_report_check(test: APITestCase, response: Response):
 
 def check_report_status(test: APITestCase, response: HttpResponse):
     test.assertEqual(response.status_code, status.HTTP_200_OK)
-    reader = csv.reader(io.StringIO(response.content.decode("utf-8")))
-    data = list(reader)
+    data = read_streamed_csv(response)
     test.assertEqual(len(data), 12)
     test.assertEqual(data[0], ["dataset", "filename", "admin", "user2"])
     test.assertEqual(
@@ -171,6 +181,7 @@ class ReportEmptyAdminAuthenticatedTestCase(AuthenticatedTestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+@override_settings(REPORT_FOLDER=tempfile.mkdtemp())
 class ReportFilledAdminAuthenticatedTestCase(AuthenticatedTestCase):
     username = "admin"
     fixtures = all_fixtures
@@ -179,14 +190,104 @@ class ReportFilledAdminAuthenticatedTestCase(AuthenticatedTestCase):
         response = self.client.get(URL)
         check_report(self, response)
 
+    def test_report_cache_update(self):
+        check_report(self, self.client.get(URL))
+        result = AnnotationResult.objects.get(pk=7)
+        result.label_id = 3
+        result.save()
+
+        data = read_streamed_csv(self.client.get(URL))
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[1][2], "7")
+        self.assertEqual(data[1][8], "Boat")
+
+    def test_report_cache_label_renamed(self):
+        check_report(self, self.client.get(URL))
+        Label.objects.filter(pk=AnnotationResult.objects.get(pk=7).label_id).update(
+            name="Renamed"
+        )
+
+        data = read_streamed_csv(self.client.get(URL))
+        self.assertEqual(data[1][2], "7")
+        self.assertEqual(data[1][8], "Renamed")
+
+    def test_report_cache_deleted_phase(self):
+        check_report(self, self.client.get(URL))
+        folder = Path(settings.REPORT_FOLDER) / "segments" / "1"
+        self.assertTrue(folder.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnnotationCampaignPhase.objects.get(pk=1).delete()
+        self.assertFalse(folder.exists())
+
     def test_report_check(self):
         response = self.client.get(URL_check)
         check_report_check(self, response)
 
+    @skipUnless(COLUMNAR_AVAILABLE, "pyarrow is not installed")
+    def test_report_parquet(self):
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet
+
+        response = self.client.get(URL, {"format": "parquet"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pyarrow.parquet.read_table(
+            io.BytesIO(b"".join(response.streaming_content))
+        )
+        self.assertEqual(table.num_rows, 9)
+        self.assertEqual(table.column_names, REPORT_HEADERS)
+        row = table.slice(0, 1).to_pylist()[0]
+        self.assertEqual(row["result_id"], 7)
+        self.assertEqual(row["start_time"], 108.2)
+        self.assertEqual(row["is_box"], True)
+        self.assertEqual(
+            row["start_datetime"],
+            datetime(2012, 10, 3, 10, 1, 48, 200000, tzinfo=timezone.utc),
+        )
+
+    @skipUnless(COLUMNAR_AVAILABLE, "pyarrow is not installed")
+    def test_report_check_arrow(self):
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.ipc
+
+        response = self.client.get(URL_check, {"format": "arrow"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pyarrow.ipc.open_file(
+            io.BytesIO(b"".join(response.streaming_content))
+        ).read_all()
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.column_names, REPORT_HEADERS + ["admin", "user2"])
+        self.assertEqual(str(table.schema.field("admin").type), "bool")
+
+    @skipIf(COLUMNAR_AVAILABLE, "pyarrow is installed")
+    def test_report_parquet_unavailable(self):
+        response = self.client.get(URL, {"format": "parquet"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_report_status(self):
         response = self.client.get(URL_status)
         check_report_status(self, response)
 
+    @skipUnless(COLUMNAR_AVAILABLE, "pyarrow is not installed")
+    def test_report_status_parquet(self):
+        # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet
+
+        response = self.client.get(URL_status, {"format": "parquet"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pyarrow.parquet.read_table(
+            io.BytesIO(b"".join(response.streaming_content))
+        )
+        self.assertEqual(
+            table.slice(1, 1).to_pylist()[0],
+            {
+                "dataset": "SPM Aural A 2010",
+                "filename": "sound002.wav",
+                "admin": "CREATED",
+                "user2": "UNASSIGNED",
+            },
+        )
+
 
 class ReportFilledPhaseOwnerAuthenticatedTestCase(
     ReportFilledAdminAuthenticatedTestCase
@@ -0,0 +1,147 @@
+"""Test AnnotationCampaignPhaseViewSet report jobs"""
+# pylint: disable=missing-class-docstring, missing-function-docstring
+import gzip
+import tempfile
+from datetime import timedelta
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from backend.api.actions.report_job import run_report_job
+from backend.api.models import PhaseReportJob, AnnotationComment, AnnotationResult
+from backend.utils.tests import AuthenticatedTestCase, all_fixtures
+
+URL = reverse("annotation-campaign-phase-report-job", kwargs={"pk": 1})
+URL_report = reverse("annotation-campaign-phase-report", kwargs={"pk": 1})
+URL_status = reverse("annotation-campaign-phase-report-status", kwargs={"pk": 1})
+
+
+def get_detail_url(job_id: int) -> str:
+    return reverse(
+        "annotation-campaign-phase-report-job-detail",
+        kwargs={"pk": 1, "job_id": job_id},
+    )
+
+
+def get_download_url(job_id: int) -> str:
+    return reverse(
+        "annotation-campaign-phase-report-job-download",
+        kwargs={"pk": 1, "job_id": job_id},
+    )
+
+
+class ReportJobUnauthenticatedTestCase(APITestCase):
+    def test_create(self):
+        """ViewSet returns 401 if no user is authenticated"""
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(REPORT_WORKERS=0, REPORT_FOLDER=tempfile.mkdtemp())
+class ReportJobAdminAuthenticatedTestCase(AuthenticatedTestCase):
+    username = "admin"
+    fixtures = all_fixtures
+
+    def test_create(self):
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "Done")
+        self.assertEqual(len(response.data["content_hash"]), 64)
+
+        response = self.client.get(get_detail_url(response.data["id"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "Done")
+
+    def test_create_reuse(self):
+        job_id = self.client.post(URL, {"type": "Results"}).data["id"]
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], job_id)
+        self.assertEqual(PhaseReportJob.objects.count(), 1)
+
+    def test_create_after_change(self):
+        job_id = self.client.post(URL, {"type": "Results"}).data["id"]
+        AnnotationResult.objects.filter(annotation_campaign_phase_id=1).first().save()
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data["id"], job_id)
+
+    def test_create_after_comment_change(self):
+        comment = AnnotationComment.objects.create(
+            comment="Comment",
+            annotation_campaign_phase_id=1,
+            dataset_file_id=1,
+            author_id=1,
+        )
+        job_id = self.client.post(URL, {"type": "Results"}).data["id"]
+        comment.comment = "Updated comment"
+        comment.save()
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data["id"], job_id)
+        # The outdated job is removed
+        self.assertEqual(PhaseReportJob.objects.count(), 1)
+
+    def test_create_after_stale_job(self):
+        job_id = self.client.post(URL, {"type": "Results"}).data["id"]
+        PhaseReportJob.objects.filter(pk=job_id).update(
+            status=PhaseReportJob.Status.RUNNING,
+            created_at=timezone.now() - timedelta(hours=2),
+        )
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "Done")
+        self.assertFalse(PhaseReportJob.objects.filter(pk=job_id).exists())
+
+    def test_run_once(self):
+        job = PhaseReportJob.objects.create(
+            phase_id=1,
+            type=PhaseReportJob.Type.RESULTS,
+            fingerprint="",
+            status=PhaseReportJob.Status.RUNNING,
+        )
+        run_report_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PhaseReportJob.Status.RUNNING)
+        self.assertIsNone(job.path)
+
+    def test_download(self):
+        job = self.client.post(URL, {"type": "Results"}).data
+        response = self.client.get(get_download_url(job["id"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], f'"{job["content_hash"]}"')
+        self.assertEqual(
+            b"".join(response.streaming_content),
+            b"".join(self.client.get(URL_report).streaming_content),
+        )
+
+        response = self.client.get(
+            get_download_url(job["id"]), HTTP_IF_NONE_MATCH=f'"{job["content_hash"]}"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_download_status_compressed(self):
+        job = self.client.post(URL, {"type": "Status", "compressed": True}).data
+        response = self.client.get(get_download_url(job["id"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)),
+            b"".join(self.client.get(URL_status).streaming_content),
+        )
+
+
+class ReportJobPhaseOwnerAuthenticatedTestCase(ReportJobAdminAuthenticatedTestCase):
+    username = "user1"
+
+
+@override_settings(REPORT_WORKERS=0, REPORT_FOLDER=tempfile.mkdtemp())
+class ReportJobBaseUserNoPhaseAuthenticatedTestCase(AuthenticatedTestCase):
+    username = "user4"
+    fixtures = all_fixtures
+
+    def test_create(self):
+        response = self.client.post(URL, {"type": "Results"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
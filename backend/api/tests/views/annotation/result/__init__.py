@@ -6,6 +6,10 @@ from .import_results import (
     ImportCampaignOwnerAuthenticatedTestCase,
     ImportAdminAuthenticatedTestCase,
 )
+from .import_session import (
+    ImportSessionBaseUserAuthenticatedTestCase,
+    ImportSessionCampaignOwnerAuthenticatedTestCase,
+)
 from .list import (
     ListUnauthenticatedTestCase,
     ListEmpyAdminAuthenticatedTestCase,
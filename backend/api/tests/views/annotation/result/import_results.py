@@ -3,7 +3,9 @@
 import os
 from typing import Optional
 
+from django.db import connection
 from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -472,6 +474,29 @@ class ImportCampaignOwnerAuthenticatedTestCase(ImportBaseUserAuthenticatedTestCa
         results = AnnotationResult.objects.exclude(id__in=old_ids)
         self.__check_strong_two_files_annotation(response.data, results, phase_id)
 
+    def test_empty_post_many_same_queries_count(self):
+        url, _, _ = self._get_url()
+        header = (
+            "dataset,start_frequency,end_frequency,annotation,annotator,start_datetime,"
+            "end_datetime,is_box,confidence_indicator_label,confidence_indicator_level"
+        )
+
+        def post(first: int, count: int):
+            rows = [
+                "Dataset,32416,53916,click,detector1,"
+                f"2012-10-03T10:00:{second:02d}.800+00:00,"
+                f"2012-10-03T10:00:{second + 1:02d}.800+00:00,1,sure,1/1"
+                for second in range(first, first + count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(url, {"data": "\n".join([header, *rows])})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.data), count)
+            return len(context.captured_queries)
+
+        post(0, 1)  # Creates label, detector and confidence indicator
+        self.assertEqual(post(1, 5), post(10, 30))
+
     # Errors
 
     def test_empty_post_without_is_box(self):
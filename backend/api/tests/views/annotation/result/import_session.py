@@ -0,0 +1,146 @@
+"""Test chunked detection import sessions"""
+# pylint: disable=missing-class-docstring, missing-function-docstring, duplicate-code
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from backend.api.models import (
+    AnnotationResult,
+    AnnotationCampaign,
+    AnnotationCampaignPhase,
+    Dataset,
+    DetectionImportSession,
+    Label,
+    LabelSet,
+    Phase,
+)
+from backend.utils.tests import AuthenticatedTestCase
+
+HEADER = (
+    "dataset,start_frequency,end_frequency,annotation,annotator,start_datetime,end_datetime,"
+    "is_box,confidence_indicator_label,confidence_indicator_level"
+)
+SESSION_DATA = {
+    "dataset_name": "SPM Aural A 2010",
+    "detectors_map": {"detector1": {"detector": "nnini", "configuration": "test"}},
+}
+
+
+def get_row(second: int, is_box: str = "1") -> str:
+    return (
+        "Dataset,32416,53916,click,detector1,"
+        f"2012-10-03T10:00:{second:02d}.800+00:00,2012-10-03T10:00:{second + 1:02d}.800+00:00,"
+        f"{is_box},sure,1/1"
+    )
+
+
+class ImportSessionBaseUserAuthenticatedTestCase(AuthenticatedTestCase):
+    username = "user3"
+    fixtures = ["users", "datasets"]
+
+    def setUp(self):
+        super().setUp()
+        campaign = AnnotationCampaign.objects.create(
+            name="string",
+            label_set=LabelSet.objects.create(name="string label set"),
+            owner_id=3,
+        )
+        campaign.datasets.add(Dataset.objects.get(pk=1))
+        self.phase = AnnotationCampaignPhase.objects.create(
+            phase=Phase.ANNOTATION,
+            annotation_campaign=campaign,
+            created_by_id=3,
+        )
+        self.kwargs = {"campaign_id": campaign.id, "phase_id": self.phase.id}
+
+    def _url(self, name: str, **kwargs) -> str:
+        return reverse(
+            f"annotation-result-campaign-import-session{name}",
+            kwargs={**self.kwargs, **kwargs},
+        )
+
+    def test_create(self):
+        response = self.client.post(self._url(""), SESSION_DATA, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(DETECTION_IMPORT_WORKERS=0)
+class ImportSessionCampaignOwnerAuthenticatedTestCase(
+    ImportSessionBaseUserAuthenticatedTestCase
+):
+    username = "user1"
+
+    def test_create(self):
+        response = self.client.post(self._url(""), SESSION_DATA, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "Open")
+        self.assertEqual(response.data["parts_count"], 0)
+
+    def test_import(self):
+        old_count = AnnotationResult.objects.count()
+        session_id = self.client.post(self._url(""), SESSION_DATA, format="json").data[
+            "id"
+        ]
+        part_url = self._url("-part", session_id=session_id)
+
+        response = self.client.post(
+            part_url,
+            {"index": 0, "data": "\n".join([HEADER, get_row(0), get_row(2, "")])},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows_count"], 2)
+        self.assertEqual(len(response.data["errors"]), 1)
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+        self.assertIn("is_box", response.data["errors"][0]["errors"])
+
+        part = {"index": 1, "data": "\n".join([get_row(4), get_row(6)])}
+        response = self.client.post(part_url, part, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["first_row"], 3)
+        part_id = response.data["id"]
+
+        # Interrupted upload: same part sent again
+        response = self.client.post(part_url, part, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], part_id)
+        response = self.client.post(
+            part_url, {"index": 1, "data": get_row(4)}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            part_url, {"index": 3, "data": get_row(8)}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(self._url("-detail", session_id=session_id))
+        self.assertEqual(response.data["parts_count"], 2)
+        self.assertEqual(response.data["rows_count"], 4)
+        self.assertEqual(response.data["staged_rows_count"], 3)
+        self.assertEqual(AnnotationResult.objects.count(), old_count)
+        self.assertFalse(Label.objects.filter(name="click").exists())
+
+        response = self.client.post(self._url("-commit", session_id=session_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "Done")
+        self.assertEqual(response.data["committed_parts_count"], 2)
+        self.assertEqual(response.data["imported_count"], 3)
+        self.assertEqual(AnnotationResult.objects.count(), old_count + 3)
+        self.assertTrue(Label.objects.filter(name="click").exists())
+
+        response = self.client.post(self._url("-commit", session_id=session_id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            DetectionImportSession.objects.get(pk=session_id).imported_count, 3
+        )
+
+    def test_commit_running(self):
+        session_id = self.client.post(self._url(""), SESSION_DATA, format="json").data[
+            "id"
+        ]
+        DetectionImportSession.objects.filter(pk=session_id).update(
+            status=DetectionImportSession.Status.COMMITTING
+        )
+        response = self.client.post(self._url("-commit", session_id=session_id))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,3 +1,7 @@
 """API Dataset view test"""
 from .dataset_base import DatasetViewSetTestCase, DatasetViewSetUnauthenticatedTestCase
-from .datawork_import import DatasetViewSetDataworkImportTestcase
+from .datawork_import import (
+    DatasetViewSetDataworkImportTestcase,
+    SpectroConfigReconciliationTestCase,
+)
+from .datawork_import_job import DatasetViewSetDataworkImportJobTestCase
@@ -1,11 +1,14 @@
 """Dataset import tests"""
 from django.http import HttpResponse
-from django.test import override_settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from backend import settings
+from backend.api.actions.check_new_spectro_config_errors import (
+    reconcile_spectro_configs,
+)
 from backend.api.models import Dataset
 from backend.api.serializers.dataset import DATASET_FIELDS
 
@@ -112,6 +115,20 @@ class DatasetViewSetDataworkImportTestcase(APITestCase):
         """Check correct import of Audible scale"""
         self.basic_import_test()
 
+    @override_settings(DATASET_IMPORT_FOLDER=IMPORT_FIXTURES / "good")
+    def test_refresh_datawork_catalog(self):
+        """Dataset view 'refresh_datawork_catalog' is only allowed for staff"""
+        url = reverse("dataset-refresh-datawork-catalog")
+        self.client.login(username="user1", password="osmose29")
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.client.logout()
+
+        self.client.login(username="staff", password="osmose29")
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.basic_import_test()
+
     def basic_import_test(self) -> HttpResponse:
         """Basic test for dataset import for authorized user"""
         old_count = Dataset.objects.count()
@@ -127,3 +144,63 @@ class DatasetViewSetDataworkImportTestcase(APITestCase):
         self.assertEqual(response.data[0]["name"], "gliderSPAmsDemo")
         self.assertEqual(len(response.data[0]["spectros"]), 1)
         return response
+
+
+class SpectroConfigReconciliationTestCase(TestCase):
+    """Test spectrogram configurations reconciliation after import"""
+
+    fixtures = ["users", "datasets"]
+
+    spectro = {
+        "nfft": "512",
+        "window_size": "512",
+        "overlap": "97",
+        "zoom_level": "2",
+        "spectro_normalization": "density",
+        "data_normalization": "0",
+        "hp_filter_min_freq": "0",
+        "colormap": "viridis",
+        "dynamic_min": "0",
+        "dynamic_max": "40",
+        "window_type": "Hamming",
+        "frequency_resolution": "62.5",
+    }
+
+    def test_reconcile(self):
+        """Only new and changed configurations are written"""
+        dataset = Dataset.objects.get(pk=1)
+        report = reconcile_spectro_configs([(dataset, [self.spectro])])
+        self.assertEqual(
+            report,
+            {
+                "created": [{"dataset": dataset.name, "name": "512_512_97"}],
+                "updated": [],
+                "unchanged": 0,
+            },
+        )
+
+        # Existing configurations and window types
+        with self.assertNumQueries(2):
+            report = reconcile_spectro_configs([(dataset, [self.spectro])])
+        self.assertEqual(report, {"created": [], "updated": [], "unchanged": 1})
+
+        report = reconcile_spectro_configs(
+            [(dataset, [{**self.spectro, "colormap": "Greys"}])]
+        )
+        self.assertEqual(
+            report,
+            {
+                "created": [],
+                "updated": [
+                    {
+                        "dataset": dataset.name,
+                        "name": "512_512_97",
+                        "fields": ["colormap"],
+                    }
+                ],
+                "unchanged": 0,
+            },
+        )
+        self.assertEqual(
+            dataset.spectro_configs.get(name="512_512_97").colormap, "Greys"
+        )
@@ -0,0 +1,108 @@
+"""Dataset background import tests"""
+from datetime import timedelta
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from backend.api.actions.datawork_import import run_datawork_import_job
+from backend.api.models import Dataset, DatasetImportJob
+from .datawork_import import IMPORT_FIXTURES, DATA_SEND
+
+URL = reverse("dataset-datawork-import-job")
+
+
+@override_settings(DATAWORK_IMPORT_WORKERS=0)
+class DatasetViewSetDataworkImportJobTestCase(APITestCase):
+    """Test DatasetViewSet datawork import job"""
+
+    fixtures = ["users", "datasets"]
+
+    def tearDown(self):
+        """Logout when tests ends"""
+        self.client.logout()
+
+    @override_settings(DATASET_IMPORT_FOLDER=IMPORT_FIXTURES / "good")
+    def test_create_for_user(self):
+        """Dataset view 'datawork_import_job' is forbidden for non-staff"""
+        self.client.login(username="user1", password="osmose29")
+        response = self.client.post(URL, DATA_SEND, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(DATASET_IMPORT_FOLDER=IMPORT_FIXTURES / "good")
+    def test_create_for_staff(self):
+        """Dataset view 'datawork_import_job' imports the datasets and reports the progress"""
+        old_count = Dataset.objects.count()
+        self.client.login(username="staff", password="osmose29")
+        response = self.client.post(URL, DATA_SEND, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "Done")
+        self.assertEqual(response.data["datasets_count"], 1)
+        self.assertEqual(response.data["imported_datasets_count"], 1)
+        self.assertEqual(response.data["files_count"], 10)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Dataset.objects.count(), old_count + 1)
+        dataset = Dataset.objects.latest("id")
+        self.assertEqual(response.data["datasets"], [dataset.id])
+        self.assertEqual(dataset.files.count(), 10)
+        self.assertEqual(dataset.spectro_configs.count(), 1)
+
+        response = self.client.get(
+            reverse(
+                "dataset-datawork-import-job-detail",
+                kwargs={"job_id": response.data["id"]},
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "Done")
+        self.assertEqual(response.data["spectro_configs_update"]["errors"], [])
+        self.assertIn("created", response.data["spectro_configs_update"])
+        self.assertIn("updated", response.data["spectro_configs_update"])
+        self.assertIn("unchanged", response.data["spectro_configs_update"])
+
+    def test_get_stale(self):
+        """Dataset view 'datawork_import_job' fails jobs not finished in time"""
+        job = DatasetImportJob.objects.create(
+            wanted_datasets=[], status=DatasetImportJob.Status.RUNNING
+        )
+        DatasetImportJob.objects.filter(pk=job.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        self.client.login(username="staff", password="osmose29")
+        response = self.client.get(
+            reverse("dataset-datawork-import-job-detail", kwargs={"job_id": job.id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "Failed")
+        self.assertEqual(response.data["errors"][0]["error"], "Timed out")
+
+    @override_settings(DATASET_IMPORT_FOLDER=IMPORT_FIXTURES / "good")
+    def test_run_once(self):
+        """A job which is not pending anymore is not run again"""
+        old_count = Dataset.objects.count()
+        job = DatasetImportJob.objects.create(
+            wanted_datasets=[
+                dataset["name"] for dataset in DATA_SEND["wanted_datasets"]
+            ],
+            status=DatasetImportJob.Status.RUNNING,
+        )
+        run_datawork_import_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DatasetImportJob.Status.RUNNING)
+        self.assertEqual(Dataset.objects.count(), old_count)
+
+    @override_settings(DATASET_IMPORT_FOLDER=IMPORT_FIXTURES / "missing_csv_columns")
+    def test_create_missing_csv_columns(self):
+        """Dataset view 'datawork_import_job' reports a failed job when import CSV is malformed"""
+        old_count = Dataset.objects.count()
+        self.client.login(username="staff", password="osmose29")
+        response = self.client.post(URL, DATA_SEND, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "Failed")
+        self.assertEqual(
+            response.data["errors"][0]["error"],
+            "One of the import CSV is missing the following column : 'dataset'",
+        )
+        self.assertEqual(Dataset.objects.count(), old_count)
@@ -5,7 +5,6 @@ from django.db.models import (
     Q,
     Exists,
     OuterRef,
-    Count,
 )
 from rest_framework import viewsets, status, filters, permissions, mixins
 from rest_framework.decorators import action
@@ -72,9 +71,6 @@ class AnnotationCampaignViewSet(
             "archive__by_user__aplose",
         )
         .prefetch_related("datasets", "labels_with_acoustic_features", "phases")
-        .annotate(
-            files_count=Count("datasets__files", distinct=True),
-        )
         .order_by("name")
     )
     serializer_class = AnnotationCampaignSerializer
@@ -4,6 +4,7 @@ from django.db.models import QuerySet, Q
 from rest_framework import viewsets, permissions, filters, mixins
 from rest_framework.request import Request
 
+from backend.api.actions.result_writer import write_task_comments
 from backend.api.models import (
     AnnotationResult,
     DatasetFile,
@@ -73,17 +74,4 @@ class AnnotationCommentViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         data = AnnotationCommentViewSet.map_request_comments(
             new_comments, phase.id, file.id, user_id
         )
-        current_comments = AnnotationCommentViewSet.queryset.filter(
-            annotation_campaign_phase_id=phase.id,
-            dataset_file_id=file.id,
-            author_id=user_id,
-            annotation_result__isnull=True,
-        )
-        serializer = AnnotationCommentViewSet.serializer_class(
-            current_comments,
-            many=True,
-            data=data,
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return serializer.data
+        return write_task_comments(data, phase, file, user_id)
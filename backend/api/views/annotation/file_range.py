@@ -1,4 +1,7 @@
 """Viewset for annotation file range"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 from typing import Optional
 
 from django.db.models import (
@@ -6,11 +9,11 @@ from django.db.models import (
     Q,
     Exists,
     OuterRef,
-    Count,
     Value,
     Subquery,
     Func,
     F,
+    Sum,
 )
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, permissions, filters
@@ -18,8 +21,10 @@ from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from backend.api.models import (
+    AnnotationCampaignFile,
     AnnotationFileRange,
     AnnotationTask,
     DatasetFile,
@@ -35,56 +40,87 @@ from backend.utils.filters import ModelFilter, get_boolean_query_param
 
 
 class AnnotationFileRangeFilesFilter(filters.BaseFilterBackend):
-    """Filter dataset files from file ranges"""
+    """Filter dataset files from file ranges
+
+    Files are matched to all the ranges in a single query, through the campaign file index:
+    the query does not grow with the number of ranges
+    """
+
+    boolean_params = (
+        "annotation_results__acoustic_features__isnull",
+        "with_user_annotations",
+        "is_submitted",
+    )
+
+    @classmethod
+    def has_filters(cls, request: Request) -> bool:
+        """Whether the request filters the files: ignores the query params it doesn't read"""
+        return any(
+            param in cls.boolean_params
+            or ModelFilter.is_filter_param(DatasetFile.objects.all(), param)
+            or ModelFilter.is_filter_param(AnnotationResult.objects.all(), param)
+            for param in request.query_params
+        )
 
     @staticmethod
-    def get_results_for_file_range(
+    def get_results(
         request: Request,
         view,
-        file_range,
-        user_annotations: Optional[bool],
-    ):
-        """Recover matching results"""
+        *,
+        couples: list[tuple[AnnotationCampaignPhase, int]],
+    ) -> QuerySet[AnnotationResult]:
+        """Recover matching results of the user on the outer file
+
+        couples are the (phase, annotator id) of the ranges
+        """
         user_id = request.user.id
+        results = AnnotationResult.objects.none()
+        for phase, annotator_id in couples:
+            phase_results = AnnotationFileRange.get_results(phase, annotator_id)
+            if phase.phase == Phase.ANNOTATION:
+                phase_results = phase_results.filter(annotator_id=user_id)
+            elif phase.phase == Phase.VERIFICATION:
+                phase_results = phase_results.filter(~Q(annotator_id=user_id))
+            results = results | phase_results
+        results: QuerySet[AnnotationResult] = ModelFilter().filter_queryset(
+            request, results, view
+        )
         features = get_boolean_query_param(
             request, "annotation_results__acoustic_features__isnull"
         )
-        results: QuerySet[AnnotationResult] = ModelFilter().filter_queryset(
-            request, file_range.results, view
-        )
         if features is not None:
             results = results.filter(acoustic_features__isnull=features)
-
-        if user_annotations is not None:
-            file_filter = Q(dataset_file_id=OuterRef("id"))
-            if file_range.annotation_campaign_phase.phase == Phase.ANNOTATION:
-                file_filter = file_filter & Q(annotator_id=user_id)
-            elif file_range.annotation_campaign_phase.phase == Phase.VERIFICATION:
-                file_filter = file_filter & ~Q(annotator_id=user_id)
-            if user_annotations:
-                results = results.filter(file_filter)
-            else:
-                results = results.filter(~file_filter)
-
-        return results
+        return results.filter(dataset_file_id=OuterRef("id"))
 
     def filter_queryset(
         self, request: Request, queryset: QuerySet[AnnotationFileRange], view
     ) -> QuerySet[DatasetFile]:
         """Get filtered dataset files"""
-        files = DatasetFile.objects.none()
-        for file_range in queryset:
-            files = files | self._filter_queryset_for_file_range(
-                request, file_range, view
-            )
-
-        return files.order_by("start", "id")
+        couples = list(
+            queryset.order_by()
+            .values_list("annotation_campaign_phase_id", "annotator_id")
+            .distinct()
+        )
+        if not couples:
+            return DatasetFile.objects.none()
+        phases = AnnotationCampaignPhase.objects.in_bulk(
+            {phase_id for phase_id, _ in couples}
+        )
 
-    def _filter_queryset_for_file_range(
-        self, request: Request, file_range: AnnotationFileRange, view
-    ) -> QuerySet[DatasetFile]:
-        """Get filtered dataset files for a specific file_range"""
-        files = DatasetFile.objects.filter_for_file_range(file_range)
+        files = DatasetFile.objects.filter(
+            id__in=AnnotationCampaignFile.objects.filter(
+                Exists(
+                    AnnotationFileRange.objects.filter(
+                        id__in=queryset.order_by().values("id"),
+                        annotation_campaign_phase__annotation_campaign_id=OuterRef(
+                            "campaign_id"
+                        ),
+                        first_file_index__lte=OuterRef("ordinal"),
+                        last_file_index__gte=OuterRef("ordinal"),
+                    )
+                ),
+            ).values("dataset_file_id")
+        )
         files: QuerySet[DatasetFile] = ModelFilter().filter_queryset(
             request, files, view
         )
@@ -92,67 +128,150 @@ class AnnotationFileRangeFilesFilter(filters.BaseFilterBackend):
         with_user_annotations = get_boolean_query_param(
             request, "with_user_annotations"
         )
-        results = self.get_results_for_file_range(
+        results = self.get_results(
             request,
             view,
-            file_range,
-            user_annotations=with_user_annotations
-            if with_user_annotations is not False
-            else True,
+            couples=[
+                (phases[phase_id], annotator_id) for phase_id, annotator_id in couples
+            ],
         )
         if with_user_annotations is not None:
             files = files.filter(
-                Exists(results)
-                if with_user_annotations is not False
-                else ~Exists(results),
+                Exists(results) if with_user_annotations else ~Exists(results),
             )
 
         files = files.annotate(
             results_count=Subquery(
-                self.get_results_for_file_range(
-                    request,
-                    view,
-                    file_range,
-                    user_annotations=True,
+                results.annotate(count=Func(F("id"), function="count")).values("count")
+            ),
+            is_submitted=Exists(
+                AnnotationTask.objects.filter(
+                    dataset_file_id=OuterRef("id"),
+                    annotation_campaign_phase_id__in=phases.keys(),
+                    annotator_id=request.user.id,
+                    status=AnnotationTask.Status.FINISHED,
                 )
-                .annotate(count=Func(F("id"), function="count"))
-                .values("count")
             ),
         )
 
         is_submitted = get_boolean_query_param(request, "is_submitted")
         if is_submitted is not None:
-            is_submitted_filter = Exists(
-                AnnotationTask.objects.filter(
-                    dataset_file_id=OuterRef("id"),
-                    status=AnnotationTask.Status.FINISHED,
-                    annotator=request.user,
-                )
-            )
-            if is_submitted:
-                files = files.filter(is_submitted_filter)
-            else:
-                files = files.filter(~is_submitted_filter)
+            files = files.filter(is_submitted=is_submitted)
 
         return files.order_by("start", "id")
 
 
 class AnnotationFilePagination(PageNumberPagination):
-    """Custom pagination to allow the front to select the page size"""
+    """Custom pagination to allow the front to select the page size
+
+    Providing a "cursor" query param (empty for the first page) switches to keyset pagination
+    on (start, id): it doesn't count nor scan skipped files
+    """
 
     page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    keyset_page_size = 100
+
+    keyset = False
+    next_position: Optional[DatasetFile] = None
+    previous_position: Optional[DatasetFile] = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request) or self.keyset_page_size
+        start, file_id, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if start is None:
+            files = queryset.order_by("start", "id")
+        elif reverse:
+            files = queryset.filter(
+                Q(start__lt=start) | Q(start=start, id__lt=file_id)
+            ).order_by("-start", "-id")
+        else:
+            files = queryset.filter(
+                Q(start__gt=start) | Q(start=start, id__gt=file_id)
+            ).order_by("start", "id")
+        page = list(files[: page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+        if not page:
+            self.next_position = self.previous_position = None
+            return page
+        self.next_position = page[-1] if has_more or reverse else None
+        self.previous_position = (
+            page[0] if (has_more if reverse else start is not None) else None
+        )
+        return page
 
-    def get_paginated_response(self, data, next_file: Optional[int] = None):
+    @staticmethod
+    def encode_cursor(file: DatasetFile, reverse: bool = False) -> str:
+        """Encode the (start, id) position of a file"""
+        position = f"{file.start.isoformat()}|{file.id}|{int(reverse)}"
+        return urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[Optional[datetime], Optional[int], bool]:
+        """Decode a cursor position, an empty or invalid cursor is the first page"""
         try:
-            count = self.page.paginator.count
-        except AttributeError:
-            return Response(data)
-        response = {
-            "count": count,
-            "next": self.get_next_link(),
-            "previous": self.get_previous_link(),
-            "results": data,
-        }
+            start, file_id, reverse = (
+                urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+            )
+            return datetime.fromisoformat(start), int(file_id), reverse == "1"
+        except (ValueError, UnicodeError, binascii.Error):
+            return None, None, False
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.previous_position, reverse=True),
+        )
+
+    def get_paginated_response(
+        self,
+        data,
+        next_file: Optional[int] = None,
+        estimated_count: Optional[int] = None,
+    ):
+        if self.keyset:
+            response = {
+                "estimated_count": estimated_count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        else:
+            try:
+                count = self.page.paginator.count
+            except AttributeError:
+                return Response(data)
+            response = {
+                "count": count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
         if next_file:
             response["resume"] = next_file
         return Response(response)
@@ -241,67 +360,55 @@ class AnnotationFileRangeViewSet(viewsets.ReadOnlyModelViewSet):
             id=phase_id
         ).first()
 
-        created_annotations_filter = Q(
-            annotation_results__annotation_campaign_phase_id=phase_id,
-            annotation_results__annotator_id=self.request.user.id,
-        )
-        # annotation_results_count = Value(0)
-        validated_annotation_results_count = Value(0)
-        if phase is not None:
-            if phase.phase == Phase.ANNOTATION:
-                # annotation_results_count = Count(
-                #     "annotation_results",
-                #     filter=created_annotations_filter,
-                #     distinct=True,
-                # )
-                pass
-            if phase.phase == Phase.VERIFICATION:
-                annotation_results_count_filter = Q(
-                    annotation_results__annotation_campaign_phase__phase=Phase.ANNOTATION,
-                    annotation_results__annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id,
-                ) & ~Q(annotation_results__annotator_id=self.request.user.id)
-                # annotation_results_count = Count(
-                #     "annotation_results",
-                #     filter=annotation_results_count_filter,
-                #     distinct=True,
-                # )
-                validated_annotation_results_count = Count(
-                    "annotation_results",
-                    filter=(
-                        (
-                            annotation_results_count_filter
-                            & Q(
-                                annotation_results__validations__annotator_id=self.request.user.id,
-                                annotation_results__validations__is_valid=True,
-                            )
-                        )
-                        | created_annotations_filter
-                    ),
-                    distinct=True,
+        validated_results_count = Value(0)
+        if phase is not None and phase.phase == Phase.VERIFICATION:
+            validated_results = AnnotationResult.objects.filter(
+                dataset_file_id=OuterRef("id")
+            ).filter(
+                (
+                    Q(
+                        annotation_campaign_phase__phase=Phase.ANNOTATION,
+                        annotation_campaign_phase__annotation_campaign_id=phase.annotation_campaign_id,
+                        validations__annotator_id=self.request.user.id,
+                        validations__is_valid=True,
+                    )
+                    & ~Q(annotator_id=self.request.user.id)
                 )
+                | Q(
+                    annotation_campaign_phase_id=phase_id,
+                    annotator_id=self.request.user.id,
+                )
+            )
+            validated_results_count = Subquery(
+                validated_results.annotate(
+                    count=Func(
+                        F("id"),
+                        function="count",
+                        template="%(function)s(DISTINCT %(expressions)s)",
+                    )
+                ).values("count")
+            )
         files: QuerySet[DatasetFile] = (
             AnnotationFileRangeFilesFilter()
             .filter_queryset(request, queryset, self)
             .select_related("dataset", "dataset__audio_metadatum")
-            .annotate(
-                is_submitted=Exists(
-                    AnnotationTask.objects.filter(
-                        dataset_file_id=OuterRef("pk"),
-                        annotation_campaign_phase_id=phase_id,
-                        annotator_id=self.request.user.id,
-                        status=AnnotationTask.Status.FINISHED,
-                    )
-                ),
-                validated_results_count=validated_annotation_results_count,
-            )
+            .annotate(validated_results_count=validated_results_count)
         )
         next_file = files.filter(is_submitted=False).first()
         paginated_files = self.paginate_queryset(files)
         if paginated_files is not None:
-            files = files.filter(id__in=[file.id for file in paginated_files])
+            files = paginated_files
+        estimated_count = None
+        if self.paginator.keyset:
+            # Cheap upper bound: assigned files, without filters nor overlapping ranges
+            estimated_count = queryset.order_by().aggregate(count=Sum("files_count"))[
+                "count"
+            ]
         serializer = FileRangeDatasetFileSerializer(files, many=True)
         return self.paginator.get_paginated_response(
-            serializer.data, next_file=next_file.id if next_file is not None else None
+            serializer.data,
+            next_file=next_file.id if next_file is not None else None,
+            estimated_count=estimated_count,
         )
 
     @action(
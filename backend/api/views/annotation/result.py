@@ -2,26 +2,38 @@
 import ast
 import csv
 from io import StringIO
+from typing import Optional
 
-from django.db.models import QuerySet, Q, Prefetch, F
+from django.db.models import QuerySet, Q, Prefetch, F, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions, filters, status, mixins
 from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from backend.api.actions.detection_import import (
+    is_commit_running,
+    map_import_row,
+    request_import_commit,
+    reset_verification_tasks,
+    stage_import_part,
+)
+from backend.api.actions.result_writer import write_results
 from backend.api.models import (
     AnnotationResult,
     DatasetFile,
-    AnnotationTask,
     AnnotationResultValidation,
     AnnotationCampaignPhase,
+    DetectionImportSession,
     Phase,
 )
 from backend.api.serializers import (
     AnnotationResultSerializer,
     AnnotationResultImportListSerializer,
+    DetectionImportPartSerializer,
+    DetectionImportSessionSerializer,
 )
+from backend.api.serializers.annotation.result import IMPORT_BATCH_SIZE
 from backend.utils.filters import ModelFilter, get_boolean_query_param
 
 
@@ -186,36 +198,7 @@ class AnnotationResultViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         data = AnnotationResultViewSet.map_request_results(
             new_results, phase.id, file.id, user_id
         )
-        current_results = AnnotationResultViewSet.queryset.filter(
-            dataset_file_id=file.id,
-        )
-        if phase.phase == Phase.ANNOTATION:
-            current_results = current_results.filter(
-                annotation_campaign_phase_id=phase.id,
-                annotator_id=user_id,
-            )
-        else:
-            current_results = current_results.filter(
-                Q(
-                    annotation_campaign_phase_id=phase.id,
-                    annotator_id=user_id,
-                )
-                | (
-                    ~Q(annotation_campaign_phase_id=phase.id, annotator_id=user_id)
-                    & Q(
-                        annotation_campaign_phase__annotation_campaign=phase.annotation_campaign
-                    )
-                )
-            )
-        serializer = AnnotationResultViewSet.serializer_class(
-            current_results,
-            many=True,
-            data=data,
-            context={"phase": phase, "file": file},
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return serializer.data
+        return write_results(data, phase, file, user_id)
 
     @action(
         methods=["POST"],
@@ -225,66 +208,22 @@ class AnnotationResultViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     )
     def import_results(self, request, campaign_id, phase_id):
         """Import result from automated detection"""
-        # Check permission
-        phase = get_object_or_404(
-            AnnotationCampaignPhase, id=phase_id, annotation_campaign_id=campaign_id
-        )
-        if (
-            phase.annotation_campaign.owner_id != request.user.id
-            and not request.user.is_staff
-        ):
-            return Response(status=status.HTTP_403_FORBIDDEN)
-
-        if phase.phase != Phase.ANNOTATION:
-            return Response(
-                "Import should always be made on annotation campaign",
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        phase, error_response = self._get_import_phase(request, campaign_id, phase_id)
+        if error_response is not None:
+            return error_response
 
         dataset_name = request.query_params.get("dataset_name")
         detectors_map = ast.literal_eval(request.query_params.get("detectors_map"))
 
         reader = csv.DictReader(StringIO(request.data.get("data")))
-        data = []
-        for row in reader:
-            annotator = row["annotator"] if "annotator" in row else None
-            if annotator not in detectors_map:
-                continue
-            detector_map = detectors_map[annotator] if annotator else None
-            confidence_level = (
-                row["confidence_indicator_level"]
-                if "confidence_indicator_level" in row
-                else None
-            )
-            detector = annotator
-            if detector_map and "detector" in detector_map and detector_map["detector"]:
-                detector = detector_map["detector"]
-            data.append(
-                {
-                    "is_box": row["is_box"],
-                    "dataset": dataset_name,
-                    "detector": detector,
-                    "detector_config": detector_map["configuration"]
-                    if detector_map and "configuration" in detector_map
-                    else None,
-                    "start_datetime": row["start_datetime"],
-                    "end_datetime": row["end_datetime"],
-                    "min_frequency": row["start_frequency"],
-                    "max_frequency": row["end_frequency"]
-                    if row["end_frequency"] != ""
-                    else None,
-                    "label": row["annotation"],
-                    "confidence_indicator": {
-                        "label": row["confidence_indicator_label"],
-                        "level": confidence_level.split("/")[0],
-                    }
-                    if "confidence_indicator_label" in row
-                    and row["confidence_indicator_label"]
-                    and confidence_level
-                    else None,
-                    "annotation_campaig_phase": phase_id,
-                }
+        data = [
+            row_data
+            for row_data in (
+                map_import_row(row, dataset_name, detectors_map, phase_id)
+                for row in reader
             )
+            if row_data is not None
+        ]
 
         # Execute import
         serializer = AnnotationResultImportListSerializer(
@@ -302,12 +241,143 @@ class AnnotationResultViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         instances: list[AnnotationResult] = serializer.instance
-        AnnotationTask.objects.filter(
-            annotation_campaign_phase__annotation_campaign=phase.annotation_campaign,
-            annotation_campaign_phase__phase=Phase.VERIFICATION,
-            dataset_file_id__in=[r.dataset_file_id for r in instances],
-        ).update(status=AnnotationTask.Status.CREATED)
+        reset_verification_tasks(phase.annotation_campaign_id, instances)
+        for index in range(0, len(instances), IMPORT_BATCH_SIZE):
+            prefetch_related_objects(
+                instances[index : index + IMPORT_BATCH_SIZE],
+                "comments",
+                "validations",
+                "updated_to",
+            )
         list_serializer: AnnotationResultSerializer = self.get_serializer_class()(
             instances, many=True
         )
         return Response(list_serializer.data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def _get_import_phase(
+        request: Request, campaign_id, phase_id
+    ) -> tuple[AnnotationCampaignPhase, Optional[Response]]:
+        """Get the phase to import in, with the error response if the user cannot import"""
+        phase = get_object_or_404(
+            AnnotationCampaignPhase, id=phase_id, annotation_campaign_id=campaign_id
+        )
+        if (
+            phase.annotation_campaign.owner_id != request.user.id
+            and not request.user.is_staff
+        ):
+            return phase, Response(status=status.HTTP_403_FORBIDDEN)
+
+        if phase.phase != Phase.ANNOTATION:
+            return phase, Response(
+                "Import should always be made on annotation campaign",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return phase, None
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="campaign/(?P<campaign_id>[^/.]+)/phase/(?P<phase_id>[^/.]+)/import-session",
+        url_name="campaign-import-session",
+    )
+    def create_import_session(self, request, campaign_id, phase_id):
+        """Start a chunked import of results from automated detection"""
+        phase, error_response = self._get_import_phase(request, campaign_id, phase_id)
+        if error_response is not None:
+            return error_response
+        serializer = DetectionImportSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(phase=phase, created_by=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _get_import_session(
+        self, request: Request, campaign_id, phase_id, session_id
+    ) -> tuple[Optional[DetectionImportSession], Optional[Response]]:
+        _, error_response = self._get_import_phase(request, campaign_id, phase_id)
+        if error_response is not None:
+            return None, error_response
+        return (
+            get_object_or_404(
+                DetectionImportSession.objects.select_related(
+                    "phase__annotation_campaign"
+                ),
+                id=session_id,
+                phase_id=phase_id,
+            ),
+            None,
+        )
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="campaign/(?P<campaign_id>[^/.]+)/phase/(?P<phase_id>[^/.]+)/import-session/(?P<session_id>[^/.]+)",
+        url_name="campaign-import-session-detail",
+    )
+    def get_import_session(self, request, campaign_id, phase_id, session_id):
+        """Get the progress of a chunked import"""
+        session, error_response = self._get_import_session(
+            request, campaign_id, phase_id, session_id
+        )
+        if error_response is not None:
+            return error_response
+        return Response(DetectionImportSessionSerializer(session).data)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="campaign/(?P<campaign_id>[^/.]+)/phase/(?P<phase_id>[^/.]+)"
+        "/import-session/(?P<session_id>[^/.]+)/part",
+        url_name="campaign-import-session-part",
+    )
+    def upload_import_part(self, request, campaign_id, phase_id, session_id):
+        """Upload a part of the CSV: "index" of the part from 0, and CSV "data"
+
+        The first part must start with the CSV header
+        """
+        session, error_response = self._get_import_session(
+            request, campaign_id, phase_id, session_id
+        )
+        if error_response is not None:
+            return error_response
+        try:
+            part = stage_import_part(
+                session, int(request.data.get("index")), request.data.get("data") or ""
+            )
+        except (TypeError, ValueError) as error:
+            return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            DetectionImportPartSerializer(part).data, status=status.HTTP_200_OK
+        )
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="campaign/(?P<campaign_id>[^/.]+)/phase/(?P<phase_id>[^/.]+)"
+        "/import-session/(?P<session_id>[^/.]+)/commit",
+        url_name="campaign-import-session-commit",
+    )
+    def commit_import(self, request, campaign_id, phase_id, session_id):
+        """Import all the staged parts of a chunked import, in a background job
+
+        The progress is followed on the session
+        """
+        session, error_response = self._get_import_session(
+            request, campaign_id, phase_id, session_id
+        )
+        if error_response is not None:
+            return error_response
+        if session.status == DetectionImportSession.Status.DONE:
+            return Response(
+                "Import session is already committed",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if is_commit_running(session):
+            return Response(
+                "Import session is being committed",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        session = request_import_commit(session)
+        return Response(
+            DetectionImportSessionSerializer(session).data, status=status.HTTP_200_OK
+        )
@@ -1,20 +1,24 @@
 """Dataset DRF-Viewset file"""
-import csv
-
-from django.conf import settings
-from django.db.models import Count, OuterRef, Subquery
+from django.db.models import OuterRef, Subquery
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
-from rest_framework import viewsets
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from sentry_sdk import capture_exception
 
 from backend.api.actions import datawork_import
+from backend.api.actions.datawork_import import (
+    fail_stale_datawork_import_jobs,
+    get_datawork_datasets,
+    refresh_datawork_catalog,
+    request_datawork_import_job,
+)
 from backend.api.actions.check_new_spectro_config_errors import (
     check_new_spectro_config_errors,
 )
-from backend.api.models import Dataset
-from backend.api.serializers import DatasetSerializer
+from backend.api.models import Dataset, DatasetImportJob
+from backend.api.serializers import DatasetSerializer, DatasetImportJobSerializer
 from backend.utils.filters import ModelFilter
 
 
@@ -37,7 +41,6 @@ class DatasetViewSet(viewsets.ReadOnlyModelViewSet):
             "related_channel_configuration__recorder_specification__recorder__provider",
             "related_channel_configuration__recorder_specification__recording_formats",
         )
-        .annotate(files_count=Count("files"))
         .order_by("name")
     )
     filter_backends = (ModelFilter,)
@@ -45,19 +48,15 @@ class DatasetViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False)
     def list_to_import(self, request):
         """list dataset in datasets.csv"""
-        dataset_names = Dataset.objects.values_list("name", flat=True)
-        new_datasets = []
+        dataset_names = set(Dataset.objects.values_list("name", flat=True))
 
         # Check for new datasets
         try:
-            with open(
-                settings.DATASET_IMPORT_FOLDER / settings.DATASET_FILE, encoding="utf-8"
-            ) as csvfile:
-                dataset: dict
-                for dataset in csv.DictReader(csvfile):
-                    dataset["name"] = dataset["dataset"]
-                    if dataset["name"] not in dataset_names:
-                        new_datasets.append(dataset)
+            new_datasets = [
+                dataset
+                for dataset in get_datawork_datasets()
+                if dataset["name"] not in dataset_names
+            ]
         except FileNotFoundError as error:
             capture_exception(error)
             return HttpResponse(error, status=400)
@@ -71,6 +70,19 @@ class DatasetViewSet(viewsets.ReadOnlyModelViewSet):
 
         return Response(new_datasets)
 
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="refresh-datawork-catalog",
+        url_name="refresh-datawork-catalog",
+    )
+    def refresh_datawork_catalog(self, request):
+        """Read again the datawork CSV files, even if they seem unchanged"""
+        if not request.user.is_staff:
+            return HttpResponse("Forbidden", status=403)
+        refresh_datawork_catalog()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=False, methods=["POST"])
     def datawork_import(self, request):
         """Import new datasets from datawork"""
@@ -95,15 +107,47 @@ class DatasetViewSet(viewsets.ReadOnlyModelViewSet):
             return HttpResponse(error, status=400)
 
         queryset = new_datasets.annotate(
-            files_count=Count("files"),
             type=Subquery(
                 new_datasets.filter(pk=OuterRef("pk")).values("dataset_type__name")[:1]
             ),
         )
         serializer = self.serializer_class(queryset, many=True)
 
-        errors = check_new_spectro_config_errors()
+        errors, _ = check_new_spectro_config_errors(get_datawork_datasets())
         if errors:
             return JsonResponse(errors, status=400)
 
         return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="datawork-import-job",
+        url_name="datawork-import-job",
+    )
+    def create_datawork_import_job(self, request):
+        """Start the background import of new datasets from datawork"""
+        if not request.user.is_staff:
+            return HttpResponse("Forbidden", status=403)
+        if "wanted_datasets" not in request.data:
+            return HttpResponse("Missing wanted_datasets", status=400)
+        job = request_datawork_import_job(
+            wanted_datasets=request.data["wanted_datasets"],
+            importer=request.user,
+        )
+        return Response(
+            DatasetImportJobSerializer(job).data, status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        detail=False,
+        url_path="datawork-import-job/(?P<job_id>[^/.]+)",
+        url_name="datawork-import-job-detail",
+    )
+    def get_datawork_import_job(self, request, job_id: int = None):
+        """Get datawork import job progress"""
+        if not request.user.is_staff:
+            return HttpResponse("Forbidden", status=403)
+        fail_stale_datawork_import_jobs()
+        job = get_object_or_404(DatasetImportJob, pk=job_id)
+        return Response(DatasetImportJobSerializer(job).data)
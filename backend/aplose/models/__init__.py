@@ -1,2 +1,9 @@
 """APLOSE Authentication models"""
-from .user import AploseUser, User, AnnotatorGroup, ExpertiseLevel
+from .user import (
+    AploseUser,
+    User,
+    AnnotatorGroup,
+    ExpertiseLevel,
+    get_expertise_level,
+    get_expertise_levels,
+)
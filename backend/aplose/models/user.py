@@ -1,9 +1,16 @@
 """User-related models"""
+from typing import Iterable, Optional
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 User = get_user_model()
 
+EXPERTISE_CACHE_TIMEOUT = 60  # seconds
+
 
 class ExpertiseLevel(models.TextChoices):
     """Expertise level of the user. Multiple choices are offered : expert, average, novice."""
@@ -27,6 +34,51 @@ class AploseUser(models.Model):
     )
 
 
+def _expertise_cache_key(user_id: int) -> str:
+    return f"aplose:expertise_level:{user_id}"
+
+
+def get_expertise_levels(user_ids: Iterable[int]) -> dict[int, Optional[str]]:
+    """Get the expertise level of the given users, using a short-lived cache
+
+    Users without any expertise level are mapped to None
+    """
+    keys = {_expertise_cache_key(user_id): user_id for user_id in set(user_ids)}
+    levels = {keys[key]: level for key, level in cache.get_many(keys).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in levels]
+    if missing:
+        fetched = dict.fromkeys(missing)
+        fetched.update(
+            AploseUser.objects.filter(
+                user_id__in=missing, expertise_level__isnull=False
+            ).values_list("user_id", "expertise_level")
+        )
+        cache.set_many(
+            {
+                _expertise_cache_key(user_id): level
+                for user_id, level in fetched.items()
+            },
+            timeout=EXPERTISE_CACHE_TIMEOUT,
+        )
+        levels.update(fetched)
+    return levels
+
+
+def get_expertise_level(user_id: Optional[int]) -> Optional[str]:
+    """Get the expertise level of a user, using a short-lived cache"""
+    if user_id is None:
+        return None
+    return get_expertise_levels([user_id])[user_id]
+
+
+@receiver(post_save, sender=AploseUser)
+@receiver(post_delete, sender=AploseUser)
+def clear_expertise_level_cache(sender, instance: AploseUser, **kwargs):
+    """Expertise level changed: remove it from the cache"""
+    # pylint: disable=unused-argument
+    cache.delete(_expertise_cache_key(instance.user_id))
+
+
 class AnnotatorGroup(models.Model):
     """Used to manage group of annotators in APLOSE"""
 
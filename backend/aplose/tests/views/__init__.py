@@ -1,5 +1,6 @@
 """Aplose views test case"""
 from .annotator import (
+    GetAnnotatorAuthenticatedTestCase,
     PostAnnotatorAuthenticatedEmptyResultsTestCase,
     PostUnauthenticatedTestCase,
     PostAdminAuthenticatedTestCase,
@@ -2,14 +2,18 @@
 """User DRF-Viewset test file"""
 import json
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from backend.api.models import (
+    AnnotationCampaign,
     AnnotationResult,
     AnnotationComment,
 )
+from backend.api.models.annotation.result import AnnotationResultType
 from backend.utils.tests import AuthenticatedTestCase, all_fixtures
 
 URL = reverse(
@@ -32,6 +36,74 @@ empty_data = {
 }
 
 
+class GetAnnotatorAuthenticatedTestCase(AuthenticatedTestCase):
+    username = "user2"
+    fixtures = all_fixtures
+
+    def test_get(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["is_assigned"])
+        self.assertEqual(response.data["current_task_index"], 2)
+        self.assertEqual(response.data["total_tasks"], 4)
+        self.assertEqual(response.data["current_task_index_in_filter"], 2)
+        self.assertEqual(response.data["total_tasks_in_filter"], 4)
+        self.assertEqual(response.data["previous_file_id"], 8)
+        self.assertEqual(response.data["next_file_id"], 10)
+
+    def test_get_filtered(self):
+        response = self.client.get(URL, {"with_user_annotations": "false"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["current_task_index"], 2)
+        self.assertEqual(response.data["total_tasks"], 4)
+        self.assertNotEqual(response.data["previous_file_id"], 9)
+        self.assertNotEqual(response.data["next_file_id"], 9)
+
+    def test_get_unused_query_param(self):
+        response = self.client.get(URL, {"format": "json"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["current_task_index_in_filter"], 2)
+        self.assertEqual(response.data["total_tasks_in_filter"], 4)
+        self.assertEqual(response.data["previous_file_id"], 8)
+        self.assertEqual(response.data["next_file_id"], 10)
+
+    def test_get_queries_count(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        initial_count = len(context.captured_queries)
+
+        label = AnnotationCampaign.objects.get(pk=1).label_set.labels.first()
+        for index in range(10):
+            result = AnnotationResult.objects.create(
+                type=AnnotationResultType.WEAK,
+                label=label,
+                annotation_campaign_phase_id=1,
+                annotator_id=4,
+                dataset_file_id=9,
+            )
+            AnnotationComment.objects.create(
+                comment=f"comment {index}",
+                annotation_result=result,
+                annotation_campaign_phase_id=1,
+                dataset_file_id=9,
+                author_id=4,
+            )
+            AnnotationComment.objects.create(
+                comment=f"task comment {index}",
+                annotation_campaign_phase_id=1,
+                dataset_file_id=9,
+                author_id=4,
+            )
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(len(response.data["task_comments"]), 10)
+        self.assertEqual(len(context.captured_queries), initial_count)
+
+
 class PostUnauthenticatedTestCase(APITestCase):
     """Test AnnotationFileRangeViewSet when request is unauthenticated"""
 
@@ -175,3 +247,110 @@ class PostAnnotatorAuthenticatedEmptyResultsTestCase(PostBaseUserAuthenticatedTe
         self._check_presence(response.data["results"][0], presence, 9)
         self._check_box(response.data["results"][1], box, 9)
         self.assertEqual(comment.comment, "Test A")
+
+    def test_post_update(self):
+        session = {"start": "2024-11-11T08:10", "end": "2024-11-11T08:15"}
+        presence = {
+            "label": "Boat",
+            "confidence_indicator": "confident",
+            "annotation_campaign_phase": 1,
+            "annotator": 4,
+        }
+        box = {
+            **presence,
+            "start_time": 0,
+            "end_time": 10,
+            "start_frequency": 5,
+            "end_frequency": 25,
+            "comments": [{"comment": "Box comment"}],
+        }
+        response = self.client.post(
+            URL,
+            data=json.dumps(
+                {"results": [presence, box], "task_comments": [], "session": session}
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        presence_id, box_id = [r["id"] for r in response.data["results"]]
+        presence_updated_at = AnnotationResult.objects.get(
+            pk=presence_id
+        ).last_updated_at
+        result_count = AnnotationResult.objects.count()
+        comment_count = AnnotationComment.objects.count()
+
+        response = self.client.post(
+            URL,
+            data=json.dumps(
+                {
+                    "results": [
+                        {**presence, "id": presence_id},
+                        {
+                            **box,
+                            "id": box_id,
+                            "end_time": 20,
+                            "comments": [
+                                {
+                                    **response.data["results"][1]["comments"][0],
+                                    "comment": "Updated comment",
+                                }
+                            ],
+                        },
+                    ],
+                    "task_comments": [],
+                    "session": session,
+                }
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AnnotationResult.objects.count(), result_count)
+        self.assertEqual(AnnotationComment.objects.count(), comment_count)
+        self.assertEqual(
+            AnnotationResult.objects.get(pk=presence_id).last_updated_at,
+            presence_updated_at,
+        )
+        updated_box = AnnotationResult.objects.get(pk=box_id)
+        self.assertEqual(updated_box.end_time, 20)
+        self.assertEqual(updated_box.comments.get().comment, "Updated comment")
+        self.assertEqual(response.data["results"][1]["end_time"], 20)
+
+    def test_post_update_acoustic_features_only(self):
+        session = {"start": "2024-11-11T08:10", "end": "2024-11-11T08:15"}
+        box = {
+            "label": "Boat",
+            "confidence_indicator": "confident",
+            "annotation_campaign_phase": 1,
+            "annotator": 4,
+            "start_time": 0,
+            "end_time": 10,
+            "start_frequency": 5,
+            "end_frequency": 25,
+            "acoustic_features": {"start_frequency": 5, "end_frequency": 10},
+        }
+
+        def post(result: dict):
+            return self.client.post(
+                URL,
+                data=json.dumps(
+                    {"results": [result], "task_comments": [], "session": session}
+                ),
+                content_type="application/json",
+            )
+
+        response = post(box)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        box_id = response.data["results"][0]["id"]
+        updated_at = AnnotationResult.objects.get(pk=box_id).last_updated_at
+
+        response = post(
+            {
+                **box,
+                "id": box_id,
+                "acoustic_features": {"start_frequency": 5, "end_frequency": 20},
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updated_box = AnnotationResult.objects.get(pk=box_id)
+        self.assertEqual(updated_box.acoustic_features.end_frequency, 20)
+        self.assertGreater(updated_box.last_updated_at, updated_at)
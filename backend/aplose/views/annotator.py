@@ -1,8 +1,7 @@
 """Annotator viewset"""
+from typing import Iterable, Optional
 
 from django.db import transaction
-
-# pylint: disable=protected-access
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
@@ -10,13 +9,15 @@ from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from backend.api.actions.annotator_file import load_annotator_file
 from backend.api.models import (
-    AnnotationCampaign,
+    AnnotationCampaignFile,
     DatasetFile,
     AnnotationTask,
     AnnotationFileRange,
     AnnotationCampaignPhase,
     Phase,
+    PhaseProgress,
 )
 from backend.api.serializers import (
     AnnotationSessionSerializer,
@@ -24,11 +25,40 @@ from backend.api.serializers import (
 from backend.api.views import (
     AnnotationCommentViewSet,
     AnnotationResultViewSet,
-    DatasetFileViewSet,
 )
 from backend.api.views.annotation.file_range import AnnotationFileRangeFilesFilter
 
 
+def _merge_intervals(intervals: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Sort and merge overlapping or adjacent inclusive intervals"""
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _get_position(
+    ordinal: int, intervals: list[tuple[int, int]]
+) -> tuple[int, int, Optional[int], Optional[int]]:
+    """Get index, total, previous and next ordinals of a file in the merged intervals"""
+    index = sum(
+        min(end, ordinal - 1) - start + 1 for start, end in intervals if start < ordinal
+    )
+    total = sum(end - start + 1 for start, end in intervals)
+    previous_ordinal = max(
+        (min(end, ordinal - 1) for start, end in intervals if start < ordinal),
+        default=None,
+    )
+    next_ordinal = min(
+        (max(start, ordinal + 1) for start, end in intervals if end > ordinal),
+        default=None,
+    )
+    return index, total, previous_ordinal, next_ordinal
+
+
 # TODO: test !!!! and update result post ones
 class AnnotatorViewSet(viewsets.ViewSet):
     """Annotator viewset"""
@@ -43,78 +73,78 @@ class AnnotatorViewSet(viewsets.ViewSet):
         # pylint: disable=too-many-locals
         """Get all data for annotator"""
 
-        campaign = AnnotationCampaign.objects.get(pk=campaign_id)
+        phase = get_object_or_404(
+            AnnotationCampaignPhase.objects.select_related("annotation_campaign"),
+            pk=phase_id,
+            annotation_campaign_id=campaign_id,
+        )
+        file = get_object_or_404(
+            DatasetFile.objects.select_related("dataset", "dataset__audio_metadatum"),
+            pk=file_id,
+        )
         file_ranges = AnnotationFileRange.objects.filter(
             annotation_campaign_phase_id=phase_id,
             annotator_id=request.user.id,
         )
+        ordinal = AnnotationCampaignFile.get_ordinal(campaign_id, file_id)
         is_assigned = (
-            campaign.archive is None
+            phase.annotation_campaign.archive_id is None
+            and ordinal is not None
             and file_ranges.filter(
-                first_file_id__lte=file_id,
-                last_file_id__gte=file_id,
+                first_file_index__lte=ordinal,
+                last_file_index__gte=ordinal,
             ).exists()
         )
         filtered_files = AnnotationFileRangeFilesFilter().filter_queryset(
             request, file_ranges, self
         )
+        has_filters = AnnotationFileRangeFilesFilter.has_filters(request)
 
-        # User previous results
-        results = []
-        task_comments = []
         current_task_index = 0
         current_task_index_in_filter = 0
-        next_file = None
-        previous_file = None
+        next_file_id = None
+        previous_file_id = None
         total_tasks = 0
         total_tasks_in_filter = 0
         if is_assigned:
-            total_tasks_in_filter = filtered_files.count()
-            request._request.GET = {
-                "for_phase": phase_id,
-                "dataset_file_id": file_id,
-                "for_current_user": True,
-            }
-            results = AnnotationResultViewSet.as_view({"get": "list"})(
-                request._request
-            ).data
-            request._request.GET = {
-                "annotation_campaign_phase_id": phase_id,
-                "dataset_file_id": file_id,
-                "annotation_result__isnull": True,
-                "for_current_user": True,
-            }
-            task_comments = AnnotationCommentViewSet.as_view({"get": "list"})(
-                request._request
-            ).data
-
-            current_file = DatasetFile.objects.get(pk=file_id)
-
-            min_id = min(file_ranges.values_list("first_file_id", flat=True))
-            max_id = max(file_ranges.values_list("last_file_id", flat=True))
-
-            all_files = DatasetFile.objects.filter(
-                dataset__annotation_campaigns=campaign_id,
-                id__gte=min_id,
-                id__lte=max_id,
-            )
-            total_tasks = all_files.count()
-
-            previous_file: DatasetFile = filtered_files.filter(
-                Q(start__lt=current_file.start)
-                | Q(start=current_file.start, id__lt=current_file.id)
-            ).last()
-            next_file = filtered_files.filter(
-                Q(start__gt=current_file.start)
-                | Q(start=current_file.start, id__gt=current_file.id)
-            ).first()
-
-            index_filter = Q(start__lt=current_file.start) | Q(
-                start=current_file.start, id__lt=current_file.id
+            intervals = _merge_intervals(
+                file_ranges.values_list("first_file_index", "last_file_index")
             )
-
-            current_task_index_in_filter = filtered_files.filter(index_filter).count()
-            current_task_index = all_files.filter(index_filter).count()
+            (
+                current_task_index,
+                total_tasks,
+                previous_ordinal,
+                next_ordinal,
+            ) = _get_position(ordinal, intervals)
+            if not has_filters:
+                # Without filters, navigation only relies on the campaign file index
+                current_task_index_in_filter = current_task_index
+                total_tasks_in_filter = total_tasks
+                neighbours = AnnotationCampaignFile.get_file_ids(
+                    campaign_id, [previous_ordinal, next_ordinal]
+                )
+                previous_file_id = neighbours.get(previous_ordinal)
+                next_file_id = neighbours.get(next_ordinal)
+            else:
+                index_filter = Q(start__lt=file.start) | Q(
+                    start=file.start, id__lt=file.id
+                )
+                total_tasks_in_filter = filtered_files.count()
+                previous_file_id = (
+                    filtered_files.filter(index_filter)
+                    .values_list("id", flat=True)
+                    .last()
+                )
+                next_file_id = (
+                    filtered_files.filter(
+                        Q(start__gt=file.start) | Q(start=file.start, id__gt=file.id)
+                    )
+                    .values_list("id", flat=True)
+                    .first()
+                )
+                current_task_index_in_filter = filtered_files.filter(
+                    index_filter
+                ).count()
 
         return Response(
             {
@@ -122,22 +152,11 @@ class AnnotatorViewSet(viewsets.ViewSet):
                 "total_tasks_in_filter": total_tasks_in_filter,
                 "current_task_index": current_task_index,
                 "total_tasks": total_tasks,
-                "is_submitted": AnnotationTask.objects.filter(
-                    annotation_campaign_phase_id=phase_id,
-                    dataset_file_id=file_id,
-                    annotator_id=request.user.id,
-                    status=AnnotationTask.Status.FINISHED,
-                ).exists(),
-                "file": DatasetFileViewSet.as_view({"get": "retrieve"})(
-                    request._request,
-                    pk=file_id,
-                ).data,
-                "results": results,
-                "task_comments": task_comments,
-                "previous_file_id": previous_file.id
-                if previous_file is not None
-                else None,
-                "next_file_id": next_file.id if next_file is not None else None,
+                **load_annotator_file(
+                    phase, file, request.user, with_annotations=is_assigned
+                ),
+                "previous_file_id": previous_file_id,
+                "next_file_id": next_file_id,
                 "is_assigned": is_assigned,
             },
             status=status.HTTP_200_OK,
@@ -160,13 +179,15 @@ class AnnotatorViewSet(viewsets.ViewSet):
             annotation_campaign_id=campaign_id,
         )
         file = get_object_or_404(DatasetFile, id=file_id)
-        file_ranges = phase.file_ranges.filter(annotator_id=request.user.id)
-        if not file_ranges.exists():
-            return Response(status=status.HTTP_403_FORBIDDEN)
-        all_files = []
-        for file_range in file_ranges:
-            all_files += list(DatasetFile.objects.filter_for_file_range(file_range))
-        if file not in all_files:
+        ordinal = AnnotationCampaignFile.get_ordinal(campaign_id, file_id)
+        if (
+            ordinal is None
+            or not phase.file_ranges.filter(
+                annotator_id=request.user.id,
+                first_file_index__lte=ordinal,
+                last_file_index__gte=ordinal,
+            ).exists()
+        ):
             return Response(status=status.HTTP_403_FORBIDDEN)
 
         # Update
@@ -185,16 +206,18 @@ class AnnotatorViewSet(viewsets.ViewSet):
             annotation_campaign_phase_id=phase_id,
             dataset_file_id=file_id,
         )
-        task.status = AnnotationTask.Status.FINISHED
-        task.save()
+        PhaseProgress.objects.update_tasks_status(
+            AnnotationTask.objects.filter(id=task.id), AnnotationTask.Status.FINISHED
+        )
         if phase.phase == Phase.ANNOTATION:
             # Mark as unsubmitted verification task of other users on this file
-            AnnotationTask.objects.filter(
-                annotation_campaign_phase__annotation_campaign=phase.annotation_campaign,
-                annotation_campaign_phase__phase=Phase.VERIFICATION,
-                dataset_file_id=file_id,
-            ).filter(~Q(annotator=request.user)).update(
-                status=AnnotationTask.Status.CREATED
+            PhaseProgress.objects.update_tasks_status(
+                AnnotationTask.objects.filter(
+                    annotation_campaign_phase__annotation_campaign=phase.annotation_campaign,
+                    annotation_campaign_phase__phase=Phase.VERIFICATION,
+                    dataset_file_id=file_id,
+                ).filter(~Q(annotator=request.user)),
+                AnnotationTask.Status.CREATED,
             )
         session_serializer = AnnotationSessionSerializer(
             data={
@@ -125,6 +125,37 @@ DATASET_EXPORT_PATH = Path("datawork/dataset")  # linked to nginx conf
 DATASET_FILES_FOLDER = Path("data/audio")
 DATASET_SPECTRO_FOLDER = Path("processed/spectrogram")
 DATASET_FILE = "datasets.csv"
+REPORT_FOLDER = BASE_DIR / "reports"  # Reports generated in background
+REPORT_WORKERS = (
+    2  # Size of the report worker pool, 0 to generate reports synchronously
+)
+REPORT_JOB_TIMEOUT = 3600  # Seconds after which an unfinished report job is failed
+REPORT_SEGMENT_SIZE = 1000  # Number of files in each cached report segment
+DATAWORK_IMPORT_WORKERS = (
+    2  # Number of processes reading datawork CSV files, 0 to import synchronously
+)
+DATAWORK_IMPORT_JOB_TIMEOUT = (
+    6 * 3600  # Seconds after which an unfinished datawork import job is failed
+)
+DETECTION_IMPORT_WORKERS = (
+    1  # Size of the detection import worker pool, 0 to commit imports synchronously
+)
+DETECTION_IMPORT_COMMIT_TIMEOUT = (
+    600  # Seconds without progress after which a commit can be started again
+)
+
+# Caches
+# The shared cache holds the versions that must be seen by all processes
+# Its table is created with `manage.py createcachetable`
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "shared_cache",
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -6,6 +6,7 @@ if [ "$STAGING" = "true" ]; then poetry install; fi
 # Normal setup commands
 poetry run python manage.py collectstatic --noinput
 poetry run python manage.py migrate
+poetry run python manage.py createcachetable
 
 # Launching server
 # Increase the timeout to 120 seconds to handle large CSV files
@@ -0,0 +1,128 @@
+"""Reading of the datawork CSV files
+
+It has no database access, so that datasets can be read in worker processes.
+Read CSV files and folders are kept in a catalog: they are only read again when their
+modification time or size changes, or after a refresh.
+"""
+import csv
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+from django.utils.dateparse import parse_datetime
+
+# Path: ((mtime, size), content)
+_catalog: dict[str, tuple[tuple[int, int], list]] = {}
+_catalog_lock = threading.Lock()
+_catalog_generation: Optional[str] = None
+
+
+def refresh_catalog(generation: Optional[str] = None):
+    """Forget the read files, if the catalog generation changed
+
+    Without generation, the catalog is always cleared
+    """
+    global _catalog_generation  # pylint: disable=global-statement
+    with _catalog_lock:
+        if generation is None or generation != _catalog_generation:
+            _catalog.clear()
+            _catalog_generation = generation
+
+
+def _get_cached(path: Union[str, Path], read: Callable[[str], list]) -> list:
+    path = str(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _catalog_lock:
+        cached = _catalog.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    content = read(path)
+    with _catalog_lock:
+        _catalog[path] = (version, content)
+    return content
+
+
+def _read_csv(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as csvfile:
+        return list(csv.DictReader(csvfile))
+
+
+def _read_sub_folders(path: str) -> list[str]:
+    return [entry.path for entry in os.scandir(path) if entry.is_dir()]
+
+
+def read_csv(path: Union[str, Path]) -> list[dict]:
+    """Get the rows of a CSV file, from the catalog if it did not change"""
+    # Rows are copied since callers update them
+    return [dict(row) for row in _get_cached(path, _read_csv)]
+
+
+def read_spectro_csvs(conf_folder_path: Union[str, Path]) -> list[dict]:
+    """Get the spectrogram configurations of a dataset configuration folder
+
+    Each sub folder has one metadata.csv
+    """
+    return [
+        row
+        for sub_folder in _get_cached(conf_folder_path, _read_sub_folders)
+        for row in read_csv(f"{sub_folder}/metadata.csv")
+    ]
+
+
+def read_datasets_csv(datasets_csv_path: Path) -> list[dict]:
+    """Read the datasets listed in datasets.csv"""
+    datasets = read_csv(datasets_csv_path)
+    for dataset in datasets:
+        dataset["name"] = dataset["dataset"]
+    return datasets
+
+
+def read_dataset_csvs(
+    dataset: dict,
+    import_folder: Path,
+    export_path: Path,
+    files_folder: Path,
+    spectro_folder: Path,
+) -> dict:
+    """Read the audio metadata and spectrogram configurations of a dataset"""
+    conf_folder = f"{dataset['spectro_duration']}_{dataset['dataset_sr']}"
+
+    audio_folder = import_folder / dataset["path"] / files_folder / conf_folder
+    audio = read_csv(audio_folder / "metadata.csv")[0]
+
+    dataset_path = (export_path / dataset["path"]).as_posix()
+    dataset_folder = dataset_path.split("datawork/dataset/")[1]
+    spectros = read_spectro_csvs(
+        import_folder / dataset_folder / spectro_folder / conf_folder
+    )
+
+    return {
+        "dataset": dataset,
+        "dataset_path": dataset_path,
+        "conf_folder": conf_folder,
+        "audio": audio,
+        "spectros": spectros,
+        # Files are streamed from it when loaded
+        "timestamps_path": audio_folder / "timestamp.csv",
+    }
+
+
+def iter_dataset_files(
+    timestamps_path: Path, audio: dict
+) -> Iterator[tuple[str, datetime, datetime]]:
+    """Iterate over the filename, start and end of the files listed in timestamp.csv"""
+    duration = None
+    with open(timestamps_path, encoding="utf-8") as csvfile:
+        timestamp_data: dict
+        for timestamp_data in csv.DictReader(csvfile):
+            if duration is None:
+                duration = timedelta(
+                    seconds=float(audio["audio_file_dataset_duration"])
+                )
+            start = parse_datetime(timestamp_data["timestamp"])
+            if start.tzinfo is None:  # As Django does with the UTC time zone
+                start = start.replace(tzinfo=timezone.utc)
+            yield timestamp_data["filename"], start, start + duration
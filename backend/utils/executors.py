@@ -0,0 +1,16 @@
+"""Local thread pools running background jobs"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """Get the named thread pool, it is created on first use"""
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=name
+            )
+        return _executors[name]
@@ -23,6 +23,17 @@ class ModelFilter(filters.BaseFilterBackend):
                 continue
         return _queryset.distinct()
 
+    @staticmethod
+    def is_filter_param(queryset, param: str) -> bool:
+        """Whether the query param is a lookup this filter applies on the queryset"""
+        try:
+            queryset.filter(**{param: None})
+        except FieldError:
+            return False
+        except (TypeError, ValueError):
+            pass
+        return True
+
 
 def get_boolean_query_param(request: Request, label: str) -> Optional[bool]:
     """Recover boolean query param as bool"""
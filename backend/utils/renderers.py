@@ -15,3 +15,26 @@ class CSVRenderer(BaseRenderer):
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         return "\n".join([",".join(line) for line in data])
+
+
+class ParquetRenderer(BaseRenderer):
+    """Custom renderer for Apache Parquet files, the content is written by the view"""
+
+    # pylint: disable=too-few-public-methods
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class ArrowRenderer(ParquetRenderer):
+    """Custom renderer for Apache Arrow IPC files, the content is written by the view"""
+
+    # pylint: disable=too-few-public-methods
+
+    media_type = "application/vnd.apache.arrow.file"
+    format = "arrow"
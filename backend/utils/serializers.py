@@ -1,4 +1,6 @@
 """ Serializer util functions """
+from collections.abc import Hashable
+
 from django.db import transaction
 from django.db.models import QuerySet
 from rest_framework import serializers
@@ -91,3 +93,28 @@ class SlugRelatedGetOrCreateField(serializers.SlugRelatedField):
         except (TypeError, ValueError):
             self.fail("invalid")
             return None
+
+
+class CachedRelatedFieldMixin:
+    """Keep the resolved related items: each distinct value is only resolved once by the field"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._resolved = {}
+
+    def to_internal_value(self, data):
+        if not isinstance(data, Hashable):
+            return super().to_internal_value(data)
+        if data not in self._resolved:
+            self._resolved[data] = super().to_internal_value(data)
+        return self._resolved[data]
+
+
+class CachedSlugRelatedField(CachedRelatedFieldMixin, serializers.SlugRelatedField):
+    """Slug related field querying each distinct slug only once"""
+
+
+class CachedSlugRelatedGetOrCreateField(
+    CachedRelatedFieldMixin, SlugRelatedGetOrCreateField
+):
+    """Slug related field that can create an unknown item, querying each distinct slug only once"""
@@ -0,0 +1,22 @@
+"""Util functions for streamed responses"""
+import csv
+from typing import Iterable, Iterator
+
+
+class Echo:
+    """Pseudo-buffer: returns the written value instead of storing it"""
+
+    # pylint: disable=too-few-public-methods
+
+    def write(self, value: str) -> str:
+        """Return the value to write"""
+        return value
+
+
+def stream_csv(fieldnames: list[str], *rows: Iterable[dict]) -> Iterator[str]:
+    """Yield CSV lines one by one: the header then each row of each given iterable"""
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for iterable in rows:
+        for row in iterable:
+            yield writer.writerow(row)